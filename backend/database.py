@@ -2,26 +2,29 @@
 Supabase Database Client for SchoolCRM
 =======================================
 Handles all database operations via Supabase REST API
+
+All methods are coroutines backed by the async Supabase client. Call
+``await init_db()`` once at application startup (e.g. in the FastAPI
+lifespan handler) before awaiting any ``db.*`` method, and ``await close_db()``
+on shutdown to flush queued activity log entries and release the shared
+connection pool.
 """
 
 import os
+import copy
+import uuid
+import asyncio
+import functools
 from datetime import datetime, timezone
-from typing import Optional, List, Dict, Any
-from supabase import create_client, Client
+from typing import Optional, List, Dict, Any, Awaitable, Callable
+import httpx
+from dotenv import load_dotenv
+from cachetools import TTLCache
+from postgrest.types import ReturnMethod
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
 
 # Load environment
-def load_env():
-    """Load environment variables from .env file"""
-    env_path = '/app/backend/.env'
-    if os.path.exists(env_path):
-        with open(env_path) as f:
-            for line in f:
-                line = line.strip()
-                if '=' in line and not line.startswith('#'):
-                    key, value = line.split('=', 1)
-                    os.environ[key] = value
-
-load_env()
+load_dotenv('/app/backend/.env')
 
 # Initialize Supabase client
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
@@ -30,7 +33,281 @@ SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Column projections for list queries (never ship password hashes in lists)
+USER_COLUMNS = 'id,name,email,phone,role,telegram_id,telegram_username,telegram_first_name,telegram_linked_at,created_at'
+CLIENT_COLUMNS = 'id,name,phone,source,status,manager_id,tariff_id,group_id,is_lead,archived,created_at'
+PAYMENT_COLUMNS = 'id,client_id,user_id,amount,currency,status,payment_date,comment,created_at'
+REMINDER_COLUMNS = 'id,client_id,user_id,text,remind_at,is_completed,notified,telegram_sent,created_at'
+ACTIVITY_LOG_COLUMNS = 'id,user_id,user_name,action,entity_type,entity_id,details,created_at'
+NOTIFICATION_COLUMNS = 'id,user_id,type,title,message,entity_type,entity_id,is_read,created_at'
+
+# Keyset pagination: pages are ordered by (column, id) with NULL values of
+# column last, so rows sharing a timestamp are never skipped at a page
+# boundary. A cursor is "<value>|<id>" of the previous page's last row, with
+# the value "null" once the pages have reached the rows where column is NULL.
+MAX_PAGE_SIZE = 200
+NULL_CURSOR_VALUE = 'null'
+
+
+def keyset_paginate(query, column: str, limit: int, cursor: Optional[str] = None, desc: bool = True):
+    """Order by (column, id), seek past `cursor` and take `limit` rows
+
+    Raises ValueError for a malformed cursor.
+    """
+    query = query.order(column, desc=desc, nullsfirst=False).order('id', desc=desc)
+    if cursor:
+        value, _, last_id = cursor.rpartition('|')
+        uuid.UUID(last_id)
+        if not value or any(ch in value for ch in ',()'):
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+        op = 'lt' if desc else 'gt'
+        if value == NULL_CURSOR_VALUE:
+            query = query.is_(column, 'null').filter('id', op, last_id)
+        else:
+            query = query.or_(
+                f"{column}.{op}.{value},and({column}.eq.{value},id.{op}.{last_id}),{column}.is.null"
+            )
+    return query.limit(limit)
+
+
+def page_cursor(row: Dict, column: str) -> str:
+    """Cursor for the page that follows `row`"""
+    value = row[column]
+    if value is None:
+        value = NULL_CURSOR_VALUE
+    return f"{value}|{row['id']}"
+
+
+def _paginate(query, column: str, limit: int, cursor: Optional[str] = None, desc: bool = True):
+    """keyset_paginate() with the page size clamped to 1..MAX_PAGE_SIZE"""
+    return keyset_paginate(query, column, max(1, min(limit, MAX_PAGE_SIZE)), cursor, desc)
+
+
+# TTL cache for read-mostly lookup tables (statuses, groups, tariffs, settings)
+_cache = TTLCache(maxsize=1024, ttl=120)
+_cache_locks: Dict[str, asyncio.Lock] = {}
+
+# System settings are written through on update_settings(); the short TTL only
+# bounds staleness when another worker process changed them
+_settings_cache = TTLCache(maxsize=1, ttl=60)
+
+
+def _cached(prefix: str, cache: TTLCache = _cache):
+    """Cache a lookup coroutine's result under '<prefix>:<args>'"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args):
+            key = ':'.join([prefix, *map(str, args)])
+            if key in cache:
+                return copy.deepcopy(cache[key])
+            # One query per cold key; concurrent callers wait for the first
+            lock = _cache_locks.get(key)
+            if lock is None:
+                lock = _cache_locks[key] = asyncio.Lock()
+            async with lock:
+                try:
+                    if key in cache:
+                        value = cache[key]
+                    else:
+                        value = cache[key] = await func(*args)
+                finally:
+                    # Once filled (or failed) only callers already waiting
+                    # need the lock, so it does not outlive the fill
+                    if _cache_locks.get(key) is lock:
+                        del _cache_locks[key]
+            return copy.deepcopy(value)
+        return wrapper
+    return decorator
+
+
+# In-flight lookups shared by concurrent identical calls
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def _coalesced(prefix: str):
+    """Let concurrent calls with the same arguments await a single query"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args):
+            key = ':'.join([prefix, *map(str, args)])
+            future = _inflight.get(key)
+            if future is None:
+                future = asyncio.ensure_future(func(*args))
+                _inflight[key] = future
+                future.add_done_callback(lambda f: _inflight.pop(key, None) if _inflight.get(key) is f else None)
+            # shield: one caller being cancelled must not cancel the shared query
+            return copy.deepcopy(await asyncio.shield(future))
+        return wrapper
+    return decorator
+
+
+def _invalidate(prefix: str):
+    """Evict every cached entry for a lookup table"""
+    for key in list(_cache.keys()):
+        if key == prefix or key.startswith(f"{prefix}:"):
+            _cache.pop(key, None)
+
+
+class BatchLoader:
+    """Batch by-id lookups made within one event-loop tick into a single query.
+
+    ``await loader.load(id)`` resolves to the row (or None). All ids requested
+    before the loop gets back to the scheduled flush are fetched with one
+    ``.in_('id', ids)`` select. Loaded rows are memoised on the instance, so
+    create loaders per request (see ``Loaders``) rather than sharing them.
+    """
+
+    def __init__(self, table: str, columns: str = '*'):
+        self.table = table
+        self.columns = columns
+        self._cache: Dict[str, asyncio.Future] = {}
+        self._pending: List[tuple] = []
+
+    def load(self, key: str) -> asyncio.Future:
+        """Return a future for the row with this id"""
+        key = str(key)
+        if key in self._cache:
+            return self._cache[key]
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._cache[key] = future
+        if not self._pending:
+            loop.call_soon(lambda: asyncio.ensure_future(self._flush()))
+        self._pending.append((key, future))
+        return future
+
+    async def load_many(self, keys: List[str]) -> List[Optional[Dict]]:
+        """Load several rows at once, in the order of keys"""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    async def _flush(self):
+        pending, self._pending = self._pending, []
+        ids = list({key for key, _ in pending})
+        try:
+            result = await supabase.table(self.table).select(self.columns).in_('id', ids).execute()
+        except Exception as e:
+            for key, future in pending:
+                self._cache.pop(key, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        rows = {str(row['id']): row for row in result.data}
+        for key, future in pending:
+            if not future.done():
+                future.set_result(rows.get(key))
+
+
+class Loaders:
+    """Request-scoped set of BatchLoaders (use as a FastAPI dependency: Depends(Loaders))"""
+
+    def __init__(self):
+        self.users = BatchLoader('users', USER_COLUMNS)
+        self.clients = BatchLoader('clients', CLIENT_COLUMNS)
+        self.statuses = BatchLoader('statuses')
+        self.groups = BatchLoader('groups')
+        self.tariffs = BatchLoader('tariffs')
+
+
+# Activity log entries are buffered and written in batches off the request path
+LOG_BATCH_SIZE = 200
+LOG_FLUSH_INTERVAL = 0.1  # seconds
+LOG_QUEUE_MAXSIZE = 10000
+
+_log_queue: Optional[asyncio.Queue] = None
+_log_flusher_task: Optional[asyncio.Task] = None
+
+
+async def run_log_flusher(queue: asyncio.Queue, write: Callable[[List[Dict]], Awaitable[Any]]):
+    """Drain `queue` in batches, passing each to `write`, until a None sentinel arrives
+
+    The queue is passed in rather than read from a module global: shutdown
+    clears the global (so new entries are written directly) while this task
+    is still draining.
+    """
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        entry = await queue.get()
+        if entry is None:
+            break
+        batch = [entry]
+        deadline = loop.time() + LOG_FLUSH_INTERVAL
+        while len(batch) < LOG_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                entry = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if entry is None:
+                stopping = True
+                break
+            batch.append(entry)
+        try:
+            await write(batch)
+        except Exception as e:
+            print(f"[DB] Failed to flush {len(batch)} activity log entries: {e}")
+
+
+async def stop_log_flusher(queue: asyncio.Queue, task: asyncio.Task, write: Callable[[List[Dict]], Awaitable[Any]]):
+    """Stop a run_log_flusher() task after writing every queued entry"""
+    await queue.put(None)
+    await task
+    # Entries queued behind the sentinel
+    remaining = []
+    while not queue.empty():
+        entry = queue.get_nowait()
+        if entry is not None:
+            remaining.append(entry)
+    if remaining:
+        await write(remaining)
+
+
+async def flush_on_shutdown():
+    """Stop the activity log flusher after writing every queued entry"""
+    global _log_queue, _log_flusher_task
+    queue, task = _log_queue, _log_flusher_task
+    _log_queue = _log_flusher_task = None
+    if task is not None:
+        await stop_log_flusher(queue, task, SupabaseDB.create_activity_logs_bulk)
+
+
+# Async Supabase client, bound at startup by init_db()
+supabase: Optional[AsyncClient] = None
+
+# Keep-alive connection pool shared by every Supabase sub-client
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+async def init_db() -> AsyncClient:
+    """Create the shared async Supabase client and start the log flusher (idempotent)"""
+    global supabase, _http_client, _log_queue, _log_flusher_task
+    if supabase is None:
+        _http_client = httpx.AsyncClient(
+            http2=True,
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        )
+        supabase = await acreate_client(
+            SUPABASE_URL,
+            SUPABASE_KEY,
+            options=AsyncClientOptions(httpx_client=_http_client),
+        )
+    if _log_flusher_task is None:
+        _log_queue = asyncio.Queue(maxsize=LOG_QUEUE_MAXSIZE)
+        _log_flusher_task = asyncio.create_task(run_log_flusher(_log_queue, SupabaseDB.create_activity_logs_bulk))
+    return supabase
+
+
+async def close_db():
+    """Flush queued activity logs and close the shared connection pool (call on application shutdown)"""
+    global supabase, _http_client
+    await flush_on_shutdown()
+    if _http_client is not None:
+        await _http_client.aclose()
+    supabase = None
+    _http_client = None
 
 
 class SupabaseDB:
@@ -39,59 +316,70 @@ class SupabaseDB:
     # ==================== USERS ====================
     
     @staticmethod
-    def get_user_by_email(email: str) -> Optional[Dict]:
+    async def get_user_by_email(email: str) -> Optional[Dict]:
         """Get user by email"""
-        result = supabase.table('users').select('*').eq('email', email).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('users').select('*').eq('email', email).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def get_user_by_id(user_id: str) -> Optional[Dict]:
+    @_coalesced('users')
+    async def get_user_by_id(user_id: str) -> Optional[Dict]:
         """Get user by ID"""
-        result = supabase.table('users').select('*').eq('id', user_id).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('users').select('*').eq('id', user_id).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def get_user_by_telegram_id(telegram_id: str) -> Optional[Dict]:
+    async def get_user_by_telegram_id(telegram_id: str) -> Optional[Dict]:
         """Get user by Telegram ID"""
-        result = supabase.table('users').select('*').eq('telegram_id', str(telegram_id)).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('users').select('*').eq('telegram_id', str(telegram_id)).limit(1).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def get_all_users() -> List[Dict]:
-        """Get all users"""
-        result = supabase.table('users').select('*').order('created_at', desc=True).execute()
+    async def get_all_users(limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
+        """Get a page of users (without password hashes)"""
+        query = supabase.table('users').select(USER_COLUMNS)
+        result = await _paginate(query, 'created_at', limit, cursor).execute()
         return result.data
     
     @staticmethod
-    def create_user(user_data: Dict) -> Dict:
+    async def create_user(user_data: Dict) -> Dict:
         """Create a new user"""
-        result = supabase.table('users').insert(user_data).execute()
+        result = await supabase.table('users').insert(user_data).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def update_user(user_id: str, update_data: Dict) -> Dict:
+    async def update_user(user_id: str, update_data: Dict) -> Dict:
         """Update a user"""
-        result = supabase.table('users').update(update_data).eq('id', user_id).execute()
+        result = await supabase.table('users').update(update_data).eq('id', user_id).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def delete_user(user_id: str) -> bool:
+    async def delete_user(user_id: str) -> bool:
         """Delete a user"""
-        supabase.table('users').delete().eq('id', user_id).execute()
+        await supabase.table('users').delete(returning=ReturnMethod.minimal).eq('id', user_id).execute()
         return True
     
     # ==================== CLIENTS ====================
     
     @staticmethod
-    def get_all_clients(filters: Dict = None, include_archived: bool = False) -> List[Dict]:
-        """Get all clients with optional filters"""
-        query = supabase.table('clients').select('*')
+    async def get_all_clients(filters: Dict = None, include_archived: bool = False,
+                              limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
+        """Get a page of clients with optional filters"""
+        filters = filters or {}
+        if filters.get('search'):
+            # Search term is a bound RPC argument, never spliced into a filter string
+            query = supabase.rpc('search_clients', {
+                'q': filters['search'],
+                'mgr': filters.get('manager_id'),
+            }).select(CLIENT_COLUMNS)
+        else:
+            query = supabase.table('clients').select(CLIENT_COLUMNS)
         
         if not include_archived:
             query = query.eq('archived', False)
         
         if filters:
-            if filters.get('manager_id'):
+            if filters.get('manager_id') and not filters.get('search'):
                 query = query.eq('manager_id', filters['manager_id'])
             if filters.get('status'):
                 query = query.eq('status', filters['status'])
@@ -99,39 +387,37 @@ class SupabaseDB:
                 query = query.eq('is_lead', filters['is_lead'])
             if filters.get('group_id'):
                 query = query.eq('group_id', filters['group_id'])
-            if filters.get('search'):
-                search = filters['search']
-                query = query.or_(f"name.ilike.%{search}%,phone.ilike.%{search}%")
         
-        result = query.order('created_at', desc=True).execute()
+        result = await _paginate(query, 'created_at', limit, cursor).execute()
         return result.data
     
     @staticmethod
-    def get_client_by_id(client_id: str) -> Optional[Dict]:
+    @_coalesced('clients')
+    async def get_client_by_id(client_id: str) -> Optional[Dict]:
         """Get client by ID"""
-        result = supabase.table('clients').select('*').eq('id', client_id).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('clients').select('*').eq('id', client_id).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def create_client(client_data: Dict) -> Dict:
+    async def create_client(client_data: Dict) -> Dict:
         """Create a new client"""
-        result = supabase.table('clients').insert(client_data).execute()
+        result = await supabase.table('clients').insert(client_data).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def update_client(client_id: str, update_data: Dict) -> Dict:
+    async def update_client(client_id: str, update_data: Dict) -> Dict:
         """Update a client"""
-        result = supabase.table('clients').update(update_data).eq('id', client_id).execute()
+        result = await supabase.table('clients').update(update_data).eq('id', client_id).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def delete_client(client_id: str) -> bool:
+    async def delete_client(client_id: str) -> bool:
         """Delete a client"""
-        supabase.table('clients').delete().eq('id', client_id).execute()
+        await supabase.table('clients').delete(returning=ReturnMethod.minimal).eq('id', client_id).execute()
         return True
     
     @staticmethod
-    def count_clients(filters: Dict = None) -> int:
+    async def count_clients(filters: Dict = None) -> int:
         """Count clients"""
         query = supabase.table('clients').select('count', count='exact')
         if filters:
@@ -139,336 +425,392 @@ class SupabaseDB:
                 query = query.eq('manager_id', filters['manager_id'])
             if filters.get('archived') is not None:
                 query = query.eq('archived', filters['archived'])
-        result = query.execute()
+        result = await query.execute()
         return result.count or 0
     
     # ==================== NOTES ====================
     
     @staticmethod
-    def get_notes_by_client(client_id: str) -> List[Dict]:
+    async def get_notes_by_client(client_id: str) -> List[Dict]:
         """Get all notes for a client"""
-        result = supabase.table('notes').select('*').eq('client_id', client_id).order('created_at', desc=True).execute()
+        result = await supabase.table('notes').select('*').eq('client_id', client_id).order('created_at', desc=True).execute()
         return result.data
     
     @staticmethod
-    def get_recent_notes(limit: int = 10) -> List[Dict]:
+    async def get_recent_notes(limit: int = 10) -> List[Dict]:
         """Get recent notes"""
-        result = supabase.table('notes').select('*').order('created_at', desc=True).limit(limit).execute()
+        result = await supabase.table('notes').select('*').order('created_at', desc=True).limit(limit).execute()
         return result.data
     
     @staticmethod
-    def create_note(note_data: Dict) -> Dict:
+    async def create_note(note_data: Dict) -> Dict:
         """Create a new note"""
-        result = supabase.table('notes').insert(note_data).execute()
+        result = await supabase.table('notes').insert(note_data).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def delete_note(note_id: str) -> bool:
+    async def delete_note(note_id: str) -> bool:
         """Delete a note"""
-        supabase.table('notes').delete().eq('id', note_id).execute()
+        await supabase.table('notes').delete(returning=ReturnMethod.minimal).eq('id', note_id).execute()
         return True
     
     # ==================== PAYMENTS ====================
     
     @staticmethod
-    def get_all_payments() -> List[Dict]:
-        """Get all payments"""
-        result = supabase.table('payments').select('*').order('payment_date', desc=True).execute()
+    async def get_all_payments(limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
+        """Get a page of payments"""
+        query = supabase.table('payments').select(PAYMENT_COLUMNS)
+        result = await _paginate(query, 'payment_date', limit, cursor).execute()
         return result.data
     
     @staticmethod
-    def get_payments_by_client(client_id: str) -> List[Dict]:
+    async def get_payments_by_client(client_id: str) -> List[Dict]:
         """Get payments for a client"""
-        result = supabase.table('payments').select('*').eq('client_id', client_id).order('payment_date', desc=True).execute()
+        result = await supabase.table('payments').select('*').eq('client_id', client_id).order('payment_date', desc=True).execute()
         return result.data
     
     @staticmethod
-    def get_payment_by_id(payment_id: str) -> Optional[Dict]:
+    async def get_payment_by_id(payment_id: str) -> Optional[Dict]:
         """Get payment by ID"""
-        result = supabase.table('payments').select('*').eq('id', payment_id).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('payments').select('*').eq('id', payment_id).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def create_payment(payment_data: Dict) -> Dict:
+    async def create_payment(payment_data: Dict) -> Dict:
         """Create a new payment"""
-        result = supabase.table('payments').insert(payment_data).execute()
+        result = await supabase.table('payments').insert(payment_data).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def update_payment(payment_id: str, update_data: Dict) -> Dict:
+    async def update_payment(payment_id: str, update_data: Dict) -> Dict:
         """Update a payment"""
-        result = supabase.table('payments').update(update_data).eq('id', payment_id).execute()
+        result = await supabase.table('payments').update(update_data).eq('id', payment_id).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def delete_payment(payment_id: str) -> bool:
+    async def delete_payment(payment_id: str) -> bool:
         """Delete a payment"""
-        supabase.table('payments').delete().eq('id', payment_id).execute()
+        await supabase.table('payments').delete(returning=ReturnMethod.minimal).eq('id', payment_id).execute()
         return True
     
     @staticmethod
-    def sum_payments(filters: Dict = None) -> float:
-        """Sum all payments (optionally filtered)"""
-        query = supabase.table('payments').select('amount')
-        if filters:
-            if filters.get('status'):
-                query = query.eq('status', filters['status'])
-        result = query.execute()
-        return sum(p.get('amount', 0) for p in result.data) if result.data else 0
+    async def sum_payments(filters: Dict = None) -> float:
+        """Sum all payments (optionally filtered), aggregated in Postgres"""
+        status = filters.get('status') if filters else None
+        result = await supabase.rpc('sum_payments', {'p_status': status}).execute()
+        return float(result.data or 0)
     
     # ==================== REMINDERS ====================
     
     @staticmethod
-    def get_all_reminders(user_id: str = None) -> List[Dict]:
-        """Get all reminders"""
-        query = supabase.table('reminders').select('*')
+    async def get_all_reminders(user_id: str = None, limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
+        """Get a page of reminders, soonest first"""
+        query = supabase.table('reminders').select(REMINDER_COLUMNS)
         if user_id:
             query = query.eq('user_id', user_id)
-        result = query.order('remind_at', desc=False).execute()
+        result = await _paginate(query, 'remind_at', limit, cursor, desc=False).execute()
         return result.data
     
     @staticmethod
-    def get_overdue_reminders(user_id: str = None) -> List[Dict]:
+    async def get_overdue_reminders(user_id: str = None) -> List[Dict]:
         """Get overdue reminders"""
         now = datetime.now(timezone.utc).isoformat()
         query = supabase.table('reminders').select('*').lt('remind_at', now).eq('is_completed', False)
         if user_id:
             query = query.eq('user_id', user_id)
-        result = query.order('remind_at', desc=False).execute()
+        result = await query.order('remind_at', desc=False).execute()
         return result.data
     
     @staticmethod
-    def get_due_reminders_for_telegram() -> List[Dict]:
-        """Get reminders due for Telegram notification"""
+    async def get_due_reminders_for_telegram() -> List[Dict]:
+        """Get reminders due for Telegram notification.
+
+        The recipient user and the client are embedded in each row (``users``
+        and ``clients`` keys), so callers need no per-reminder lookups.
+        Reminders whose user has no linked Telegram account are excluded.
+        """
         now = datetime.now(timezone.utc).isoformat()
-        result = supabase.table('reminders').select('*').lt('remind_at', now).eq('is_completed', False).eq('telegram_sent', False).execute()
+        result = await supabase.table('reminders').select(
+            f'{REMINDER_COLUMNS},users!inner(id,name,telegram_id),clients(id,name,phone)'
+        ).lt('remind_at', now).eq('is_completed', False).eq('telegram_sent', False).not_.is_('users.telegram_id', 'null').execute()
         return result.data
     
     @staticmethod
-    def get_reminder_by_id(reminder_id: str) -> Optional[Dict]:
+    async def get_reminder_by_id(reminder_id: str) -> Optional[Dict]:
         """Get reminder by ID"""
-        result = supabase.table('reminders').select('*').eq('id', reminder_id).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('reminders').select('*').eq('id', reminder_id).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def create_reminder(reminder_data: Dict) -> Dict:
+    async def create_reminder(reminder_data: Dict) -> Dict:
         """Create a new reminder"""
-        result = supabase.table('reminders').insert(reminder_data).execute()
+        result = await supabase.table('reminders').insert(reminder_data).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def update_reminder(reminder_id: str, update_data: Dict) -> Dict:
+    async def update_reminder(reminder_id: str, update_data: Dict) -> Dict:
         """Update a reminder"""
-        result = supabase.table('reminders').update(update_data).eq('id', reminder_id).execute()
+        result = await supabase.table('reminders').update(update_data).eq('id', reminder_id).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def delete_reminder(reminder_id: str) -> bool:
+    async def delete_reminder(reminder_id: str) -> bool:
         """Delete a reminder"""
-        supabase.table('reminders').delete().eq('id', reminder_id).execute()
+        await supabase.table('reminders').delete(returning=ReturnMethod.minimal).eq('id', reminder_id).execute()
         return True
     
     # ==================== STATUSES ====================
     
     @staticmethod
-    def get_all_statuses() -> List[Dict]:
+    @_cached('statuses')
+    async def get_all_statuses() -> List[Dict]:
         """Get all statuses"""
-        result = supabase.table('statuses').select('*').order('sort_order').execute()
+        result = await supabase.table('statuses').select('*').order('sort_order').execute()
         return result.data
     
     @staticmethod
-    def get_status_by_id(status_id: str) -> Optional[Dict]:
+    @_cached('statuses')
+    async def get_status_by_id(status_id: str) -> Optional[Dict]:
         """Get status by ID"""
-        result = supabase.table('statuses').select('*').eq('id', status_id).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('statuses').select('*').eq('id', status_id).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def get_status_by_name(name: str) -> Optional[Dict]:
+    @_cached('statuses:name')
+    async def get_status_by_name(name: str) -> Optional[Dict]:
         """Get status by name"""
-        result = supabase.table('statuses').select('*').eq('name', name).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('statuses').select('*').eq('name', name).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def create_status(status_data: Dict) -> Dict:
+    async def create_status(status_data: Dict) -> Dict:
         """Create a new status"""
-        result = supabase.table('statuses').insert(status_data).execute()
+        result = await supabase.table('statuses').insert(status_data).execute()
+        _invalidate('statuses')
         return result.data[0] if result.data else None
     
     @staticmethod
-    def update_status(status_id: str, update_data: Dict) -> Dict:
+    async def update_status(status_id: str, update_data: Dict) -> Dict:
         """Update a status"""
-        result = supabase.table('statuses').update(update_data).eq('id', status_id).execute()
+        result = await supabase.table('statuses').update(update_data).eq('id', status_id).execute()
+        _invalidate('statuses')
         return result.data[0] if result.data else None
     
     @staticmethod
-    def delete_status(status_id: str) -> bool:
+    async def delete_status(status_id: str) -> bool:
         """Delete a status"""
-        supabase.table('statuses').delete().eq('id', status_id).execute()
+        await supabase.table('statuses').delete(returning=ReturnMethod.minimal).eq('id', status_id).execute()
+        _invalidate('statuses')
         return True
     
     # ==================== GROUPS ====================
     
     @staticmethod
-    def get_all_groups() -> List[Dict]:
+    @_cached('groups')
+    async def get_all_groups() -> List[Dict]:
         """Get all groups"""
-        result = supabase.table('groups').select('*').order('created_at', desc=True).execute()
+        result = await supabase.table('groups').select('*').order('created_at', desc=True).execute()
         return result.data
     
     @staticmethod
-    def get_group_by_id(group_id: str) -> Optional[Dict]:
+    @_cached('groups')
+    async def get_group_by_id(group_id: str) -> Optional[Dict]:
         """Get group by ID"""
-        result = supabase.table('groups').select('*').eq('id', group_id).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('groups').select('*').eq('id', group_id).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def create_group(group_data: Dict) -> Dict:
+    async def create_group(group_data: Dict) -> Dict:
         """Create a new group"""
-        result = supabase.table('groups').insert(group_data).execute()
+        result = await supabase.table('groups').insert(group_data).execute()
+        _invalidate('groups')
         return result.data[0] if result.data else None
     
     @staticmethod
-    def update_group(group_id: str, update_data: Dict) -> Dict:
+    async def update_group(group_id: str, update_data: Dict) -> Dict:
         """Update a group"""
-        result = supabase.table('groups').update(update_data).eq('id', group_id).execute()
+        result = await supabase.table('groups').update(update_data).eq('id', group_id).execute()
+        _invalidate('groups')
         return result.data[0] if result.data else None
     
     @staticmethod
-    def delete_group(group_id: str) -> bool:
+    async def delete_group(group_id: str) -> bool:
         """Delete a group"""
-        supabase.table('groups').delete().eq('id', group_id).execute()
+        await supabase.table('groups').delete(returning=ReturnMethod.minimal).eq('id', group_id).execute()
+        _invalidate('groups')
         return True
     
     # ==================== TARIFFS ====================
     
     @staticmethod
-    def get_all_tariffs() -> List[Dict]:
+    @_cached('tariffs')
+    async def get_all_tariffs() -> List[Dict]:
         """Get all tariffs"""
-        result = supabase.table('tariffs').select('*').order('created_at', desc=True).execute()
+        result = await supabase.table('tariffs').select('*').order('created_at', desc=True).execute()
         return result.data
     
     @staticmethod
-    def get_tariff_by_id(tariff_id: str) -> Optional[Dict]:
+    @_cached('tariffs')
+    async def get_tariff_by_id(tariff_id: str) -> Optional[Dict]:
         """Get tariff by ID"""
-        result = supabase.table('tariffs').select('*').eq('id', tariff_id).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('tariffs').select('*').eq('id', tariff_id).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def create_tariff(tariff_data: Dict) -> Dict:
+    async def create_tariff(tariff_data: Dict) -> Dict:
         """Create a new tariff"""
-        result = supabase.table('tariffs').insert(tariff_data).execute()
+        result = await supabase.table('tariffs').insert(tariff_data).execute()
+        _invalidate('tariffs')
         return result.data[0] if result.data else None
     
     @staticmethod
-    def update_tariff(tariff_id: str, update_data: Dict) -> Dict:
+    async def update_tariff(tariff_id: str, update_data: Dict) -> Dict:
         """Update a tariff"""
-        result = supabase.table('tariffs').update(update_data).eq('id', tariff_id).execute()
+        result = await supabase.table('tariffs').update(update_data).eq('id', tariff_id).execute()
+        _invalidate('tariffs')
         return result.data[0] if result.data else None
     
     @staticmethod
-    def delete_tariff(tariff_id: str) -> bool:
+    async def delete_tariff(tariff_id: str) -> bool:
         """Delete a tariff"""
-        supabase.table('tariffs').delete().eq('id', tariff_id).execute()
+        await supabase.table('tariffs').delete(returning=ReturnMethod.minimal).eq('id', tariff_id).execute()
+        _invalidate('tariffs')
         return True
     
     # ==================== SETTINGS ====================
     
     @staticmethod
-    def get_settings() -> Optional[Dict]:
+    @_cached('settings', _settings_cache)
+    async def get_settings() -> Optional[Dict]:
         """Get system settings"""
-        result = supabase.table('settings').select('*').eq('key', 'system').limit(1).execute()
-        if result.data:
-            return result.data[0].get('data', {})
+        result = await supabase.table('settings').select('*').eq('key', 'system').maybe_single().execute()
+        if result:
+            return result.data.get('data', {})
         return {'currency': 'USD'}
     
     @staticmethod
-    def update_settings(settings_data: Dict) -> Dict:
-        """Update system settings"""
-        # Check if exists
-        existing = supabase.table('settings').select('*').eq('key', 'system').limit(1).execute()
-        if existing.data:
-            result = supabase.table('settings').update({
-                'currency': settings_data.get('currency', 'USD'),
-                'data': settings_data
-            }).eq('key', 'system').execute()
-        else:
-            result = supabase.table('settings').insert({
-                'key': 'system',
-                'currency': settings_data.get('currency', 'USD'),
-                'data': settings_data
-            }).execute()
-        return result.data[0] if result.data else settings_data
+    async def update_settings(settings_data: Dict) -> Dict:
+        """Update system settings (insert-or-update on the unique key)"""
+        result = await supabase.table('settings').upsert({
+            'key': 'system',
+            'currency': settings_data.get('currency', 'USD'),
+            'data': settings_data
+        }, on_conflict='key').execute()
+        row = result.data[0] if result.data else None
+        _settings_cache['settings'] = copy.deepcopy(row.get('data', settings_data) if row else settings_data)
+        return row or settings_data
     
     # ==================== ACTIVITY LOG ====================
     
     @staticmethod
-    def get_activity_log(limit: int = 100) -> List[Dict]:
-        """Get activity log"""
-        result = supabase.table('activity_log').select('*').order('created_at', desc=True).limit(limit).execute()
+    async def get_activity_log(limit: int = 100, cursor: Optional[str] = None) -> List[Dict]:
+        """Get a page of the activity log"""
+        query = supabase.table('activity_log').select(ACTIVITY_LOG_COLUMNS)
+        result = await _paginate(query, 'created_at', limit, cursor).execute()
         return result.data
     
     @staticmethod
-    def create_activity_log(log_data: Dict) -> Dict:
-        """Create activity log entry"""
-        result = supabase.table('activity_log').insert(log_data).execute()
-        return result.data[0] if result.data else None
+    async def create_activity_log(log_data: Dict) -> Dict:
+        """Queue an activity log entry for the background batch writer.
+
+        Falls back to a direct insert when the flusher is not running. The
+        queued entry is returned as-is (without a database-assigned id).
+        """
+        if _log_queue is None:
+            result = await supabase.table('activity_log').insert(log_data).execute()
+            return result.data[0] if result.data else None
+        await _log_queue.put(log_data)
+        return log_data
+    
+    @staticmethod
+    async def create_activity_logs_bulk(logs: List[Dict]) -> int:
+        """Create many activity log entries in a single request"""
+        if not logs:
+            return 0
+        await supabase.table('activity_log').insert(logs, returning=ReturnMethod.minimal).execute()
+        return len(logs)
     
     # ==================== AUDIO FILES ====================
     
     @staticmethod
-    def get_audio_by_client(client_id: str) -> List[Dict]:
+    async def get_audio_by_client(client_id: str) -> List[Dict]:
         """Get audio files for a client"""
-        result = supabase.table('audio_files').select('*').eq('client_id', client_id).order('created_at', desc=True).execute()
+        result = await supabase.table('audio_files').select('*').eq('client_id', client_id).order('created_at', desc=True).execute()
         return result.data
     
     @staticmethod
-    def get_audio_by_id(audio_id: str) -> Optional[Dict]:
+    async def get_audio_by_id(audio_id: str) -> Optional[Dict]:
         """Get audio file by ID"""
-        result = supabase.table('audio_files').select('*').eq('id', audio_id).limit(1).execute()
-        return result.data[0] if result.data else None
+        result = await supabase.table('audio_files').select('*').eq('id', audio_id).maybe_single().execute()
+        return result.data if result else None
     
     @staticmethod
-    def create_audio(audio_data: Dict) -> Dict:
+    async def create_audio(audio_data: Dict) -> Dict:
         """Create audio file record"""
-        result = supabase.table('audio_files').insert(audio_data).execute()
+        result = await supabase.table('audio_files').insert(audio_data).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def delete_audio(audio_id: str) -> bool:
+    async def delete_audio(audio_id: str) -> bool:
         """Delete audio file record"""
-        supabase.table('audio_files').delete().eq('id', audio_id).execute()
+        await supabase.table('audio_files').delete(returning=ReturnMethod.minimal).eq('id', audio_id).execute()
         return True
     
     # ==================== NOTIFICATIONS ====================
     
     @staticmethod
-    def get_notifications(user_id: str) -> List[Dict]:
-        """Get notifications for a user"""
-        result = supabase.table('notifications').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
+    async def get_notifications(user_id: str, limit: int = 50, cursor: Optional[str] = None) -> List[Dict]:
+        """Get a page of notifications for a user"""
+        query = supabase.table('notifications').select(NOTIFICATION_COLUMNS).eq('user_id', user_id)
+        result = await _paginate(query, 'created_at', limit, cursor).execute()
         return result.data
     
     @staticmethod
-    def count_unread_notifications(user_id: str) -> int:
-        """Count unread notifications"""
-        result = supabase.table('notifications').select('count', count='exact').eq('user_id', user_id).eq('is_read', False).execute()
-        return result.count or 0
+    async def count_unread_notifications(user_id: str) -> int:
+        """Count unread notifications (counter maintained by a notifications trigger)"""
+        result = await supabase.table('users').select('unread_notifications').eq('id', user_id).maybe_single().execute()
+        return (result.data.get('unread_notifications') or 0) if result else 0
     
     @staticmethod
-    def create_notification(notification_data: Dict) -> Dict:
+    async def create_notification(notification_data: Dict) -> Dict:
         """Create a notification"""
-        result = supabase.table('notifications').insert(notification_data).execute()
+        result = await supabase.table('notifications').insert(notification_data).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def mark_notification_read(notification_id: str) -> Dict:
+    async def create_notifications_bulk(notifications: List[Dict]) -> int:
+        """Create many notifications in a single request"""
+        if not notifications:
+            return 0
+        await supabase.table('notifications').insert(notifications, returning=ReturnMethod.minimal).execute()
+        return len(notifications)
+    
+    @staticmethod
+    async def mark_notification_read(notification_id: str) -> Dict:
         """Mark notification as read"""
-        result = supabase.table('notifications').update({'is_read': True}).eq('id', notification_id).execute()
+        result = await supabase.table('notifications').update({'is_read': True}).eq('id', notification_id).execute()
         return result.data[0] if result.data else None
     
     @staticmethod
-    def mark_all_notifications_read(user_id: str) -> bool:
+    async def mark_all_notifications_read(user_id: str) -> bool:
         """Mark all notifications as read for a user"""
-        supabase.table('notifications').update({'is_read': True}).eq('user_id', user_id).eq('is_read', False).execute()
+        await supabase.table('notifications').update({'is_read': True}, returning=ReturnMethod.minimal).eq('user_id', user_id).eq('is_read', False).execute()
         return True
+    
+    # ==================== COMPOSITE ====================
+    
+    @staticmethod
+    async def get_client_dashboard(client_id: str) -> Optional[Dict]:
+        """Get client with notes, payments and audio files (queries run concurrently)"""
+        client, notes, payments, audio_files = await asyncio.gather(
+            SupabaseDB.get_client_by_id(client_id),
+            SupabaseDB.get_notes_by_client(client_id),
+            SupabaseDB.get_payments_by_client(client_id),
+            SupabaseDB.get_audio_by_client(client_id),
+        )
+        if not client:
+            return None
+        return {**client, 'notes': notes, 'payments': payments, 'audio_files': audio_files}
 
 
 # Export singleton instance
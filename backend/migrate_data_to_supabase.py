@@ -1,30 +1,57 @@
 """
 SchoolCRM Data Migration: MongoDB Backups to Supabase
 =====================================================
-Uses Supabase REST API (no direct PostgreSQL connection needed)
+Uses Supabase REST API (no direct PostgreSQL connection needed). When
+POSTGRES_HOST is set, the activity log is bulk-loaded over a direct
+connection with COPY instead.
 """
 
 import os
-import json
+import io
+import csv
+import gzip
 import uuid
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Optional
+from itertools import islice
 
-os.chdir('/app/backend')
-with open('.env') as f:
-    for line in f:
-        if '=' in line and not line.startswith('#'):
-            k, v = line.strip().split('=', 1)
-            os.environ[k] = v
+import httpx
+import ijson
+import orjson
+from dotenv import load_dotenv
+from pydantic import BaseModel, Field, ValidationError
+from supabase import create_client, ClientOptions
 
-from supabase import create_client
+# Load backend/.env next to this script (values there take precedence)
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'), override=True)
 
-# Initialize Supabase client
+# Initialize Supabase client on one keep-alive HTTP/2 connection pool, sized
+# for the concurrent collection workers and their in-flight chunk inserts
 url = os.environ.get('SUPABASE_URL')
 key = os.environ.get('SUPABASE_KEY')
-supabase = create_client(url, key)
+http_client = httpx.Client(
+    http2=True,
+    timeout=60.0,
+    limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+)
+supabase = create_client(url, key, options=ClientOptions(httpx_client=http_client))
 
 BACKUP_DIR = '/app/backups/mongodb_backup'
 
+# created_at for documents without one: the time this migration run started
+RUN_TS = datetime.now(timezone.utc).isoformat()
+
+# Rows per insert request
+BATCH_SIZE = 500
+# Concurrent insert requests per collection
+MAX_IN_FLIGHT = 8
+# gzip insert bodies larger than this (opt-in: the endpoint must accept
+# Content-Encoding: gzip, check with curl before enabling)
+GZIP_BODIES = os.environ.get('MIGRATION_GZIP_BODIES') == '1'
+GZIP_MIN_BYTES = 1024
+
 # ID mappings (mongo_id -> uuid)
 user_map = {}
 client_map = {}
@@ -32,377 +59,555 @@ tariff_map = {}
 group_map = {}
 status_map = {}
 
+def load_id_map(table, page_size=1000):
+    """Fetch mongo_id -> id for rows already migrated into a table"""
+    id_map = {}
+    start = 0
+    while True:
+        rows = supabase.table(table).select('id,mongo_id').not_.is_('mongo_id', 'null') \
+            .order('id').range(start, start + page_size - 1).execute().data
+        id_map.update((row['mongo_id'], row['id']) for row in rows)
+        if len(rows) < page_size:
+            return id_map
+        start += page_size
+
+def load_existing(table, id_map=None):
+    """Merge rows a previous (partial) run already migrated into id_map and return it"""
+    id_map = {} if id_map is None else id_map
+    id_map.update(load_id_map(table))
+    if id_map:
+        print(f'  {len(id_map)} {table} already migrated')
+    return id_map
+
 def load_backup(collection_name):
-    """Load JSON backup file"""
-    path = f'{BACKUP_DIR}/{collection_name}.json'
-    if os.path.exists(path):
-        with open(path, 'r') as f:
-            return json.load(f)
-    return []
+    """Stream documents from a backup one at a time.
+
+    Prefers newline-delimited JSON (<name>.ndjson, e.g. from mongoexport
+    without --jsonArray), parsed line by line; falls back to a JSON array
+    (<name>.json) parsed incrementally with ijson.
+    """
+    try:
+        f = open(f'{BACKUP_DIR}/{collection_name}.ndjson', 'rb')
+    except FileNotFoundError:
+        pass
+    else:
+        with f:
+            for line in f:
+                if line.strip():
+                    yield orjson.loads(line)
+        return
+    try:
+        f = open(f'{BACKUP_DIR}/{collection_name}.json', 'rb')
+    except FileNotFoundError:
+        return
+    with f:
+        yield from ijson.items(f, 'item', use_float=True)
+
+def iter_chunks(rows, size):
+    """Yield lists of up to `size` rows without materialising the whole iterable"""
+    it = iter(rows)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+def post_rows(table, rows, on_conflict='mongo_id'):
+    """Upsert rows through PostgREST, skipping ones whose on_conflict key already exists.
+
+    The body is orjson-encoded and the response is minimal, so re-running the
+    migration after a partial failure only adds the missing rows.
+    """
+    body = orjson.dumps(rows)
+    headers = {
+        'Content-Type': 'application/json',
+        'Prefer': 'return=minimal,resolution=ignore-duplicates',
+    }
+    if GZIP_BODIES and len(body) > GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        headers['Content-Encoding'] = 'gzip'
+    response = supabase.postgrest.session.post(
+        table,
+        params={'on_conflict': on_conflict},
+        content=body,
+        headers=headers,
+    )
+    if response.is_error:
+        raise Exception(f'{response.status_code} {response.text}')
+
+def insert_chunk(table, batch, on_conflict='mongo_id'):
+    """Insert one chunk; if it fails, retry its rows one by one. Returns the inserted rows"""
+    try:
+        post_rows(table, batch, on_conflict)
+        return batch
+    except Exception as e:
+        print(f'  ✗ {table} batch error: {e} - retrying row by row')
+    inserted = []
+    for row in batch:
+        try:
+            post_rows(table, row, on_conflict)
+            inserted.append(row)
+        except Exception as e:
+            print(f'  ✗ Error for {row.get("mongo_id") or row.get("key")}: {e}')
+    return inserted
+
+def bulk_insert(table, rows, id_map=None, chunk=BATCH_SIZE, on_conflict='mongo_id'):
+    """Insert an iterable of rows in chunks, up to MAX_IN_FLIGHT requests at once.
+
+    Only MAX_IN_FLIGHT chunks are held in memory. Inserted rows are recorded
+    in id_map (mongo_id -> id) when given. Returns the number of rows inserted.
+    """
+    count = 0
+    pending = deque()
+    
+    def collect(future):
+        nonlocal count
+        done = future.result()
+        count += len(done)
+        if id_map is not None:
+            for row in done:
+                id_map[row['mongo_id']] = row['id']
+        print(f'  ✓ {table}: {count} rows')
+    
+    with ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT) as pool:
+        for batch in iter_chunks(rows, chunk):
+            if len(pending) >= MAX_IN_FLIGHT:
+                collect(pending.popleft())
+            pending.append(pool.submit(insert_chunk, table, batch, on_conflict))
+        while pending:
+            collect(pending.popleft())
+    return count
+
+def run_parallel(*steps):
+    """Run independent migration steps concurrently and wait for all of them"""
+    with ThreadPoolExecutor(max_workers=len(steps)) as pool:
+        for future in [pool.submit(step) for step in steps]:
+            future.result()
 
 def parse_datetime(dt_val):
-    """Convert datetime to ISO string"""
+    """Convert datetime to ISO string (a trailing 'Z' becomes '+00:00')"""
     if not dt_val:
         return None
-    if isinstance(dt_val, str):
-        return dt_val.replace('Z', '+00:00')
+    if type(dt_val) is str and dt_val[-1] == 'Z':
+        return dt_val[:-1] + '+00:00'
     return dt_val
 
+# ==================== ROW BUILDERS ====================
+# One function per collection: raw backup document -> Supabase row (the id is
+# assigned by build_rows). `now` is the run timestamp (RUN_TS), used as the
+# created_at fallback. Foreign-key resolvers are bound once as default
+# arguments; the id maps are only ever mutated in place, never rebound.
+
+def build_user_row(user, now):
+    get = user.get
+    return {
+        'mongo_id': get('_id'),
+        'name': get('name'),
+        'email': get('email'),
+        'phone': get('phone'),
+        'password': get('password'),
+        'role': get('role', 'manager'),
+        'telegram_id': get('telegram_id'),
+        'telegram_username': get('telegram_username'),
+        'telegram_first_name': get('telegram_first_name'),
+        'telegram_linked_at': parse_datetime(get('telegram_linked_at')),
+        'created_at': parse_datetime(get('created_at')) or now
+    }
+
+def build_status_row(status, now):
+    get = status.get
+    return {
+        'mongo_id': get('_id'),
+        'name': get('name'),
+        'color': get('color', '#3B82F6'),
+        'sort_order': get('order', 0),
+        'is_default': get('is_default', False),
+        'created_at': now
+    }
+
+def build_group_row(group, now):
+    get = group.get
+    return {
+        'mongo_id': get('_id'),
+        'name': get('name'),
+        'color': get('color', '#6B7280'),
+        'description': get('description'),
+        'created_at': parse_datetime(get('created_at')) or now
+    }
+
+def build_tariff_row(tariff, now):
+    get = tariff.get
+    return {
+        'mongo_id': get('_id'),
+        'name': get('name'),
+        'price': float(get('price', 0)),
+        'currency': get('currency', 'USD'),
+        'description': get('description'),
+        'created_at': parse_datetime(get('created_at')) or now
+    }
+
+def build_client_row(client, now, _user_id=user_map.get, _tariff_id=tariff_map.get, _group_id=group_map.get):
+    get = client.get
+    return {
+        'mongo_id': get('_id'),
+        'name': get('name'),
+        'phone': get('phone', ''),
+        'source': get('source'),
+        'status': get('status', 'new'),
+        # Map foreign keys
+        'manager_id': _user_id(get('manager_id')),
+        'tariff_id': _tariff_id(get('tariff_id')),
+        'group_id': _group_id(get('group_id')),
+        'is_lead': get('is_lead', False),
+        'archived': get('archived', False),
+        'created_at': parse_datetime(get('created_at')) or now
+    }
+
+def build_payment_row(payment, now, _client_id=client_map.get, _user_id=user_map.get):
+    """Returns None when the payment's client was not migrated"""
+    get = payment.get
+    client_uuid = _client_id(get('client_id'))
+    if not client_uuid:
+        return None
+    return {
+        'mongo_id': get('_id'),
+        'client_id': client_uuid,
+        'user_id': _user_id(get('user_id')),
+        'amount': float(get('amount', 0)),
+        'currency': get('currency', 'USD'),
+        'status': get('status', 'pending'),
+        'payment_date': parse_datetime(get('date')),
+        'comment': get('comment'),
+        'created_at': parse_datetime(get('created_at')) or now
+    }
+
+def build_reminder_row(reminder, now, _client_id=client_map.get, _user_id=user_map.get):
+    """Returns None when the reminder's client was not migrated"""
+    get = reminder.get
+    client_uuid = _client_id(get('client_id'))
+    if not client_uuid:
+        return None
+    return {
+        'mongo_id': get('_id'),
+        'client_id': client_uuid,
+        'user_id': _user_id(get('user_id')),
+        'text': get('text'),
+        'remind_at': parse_datetime(get('remind_at')),
+        'is_completed': get('is_completed', False),
+        'notified': get('notified', False),
+        'telegram_sent': get('telegram_sent', False),
+        'telegram_sent_at': parse_datetime(get('telegram_sent_at')),
+        'telegram_success': get('telegram_success'),
+        'created_at': parse_datetime(get('created_at')) or now
+    }
+
+def build_note_row(note, now, _client_id=client_map.get, _user_id=user_map.get):
+    """Returns None when the note's client was not migrated"""
+    get = note.get
+    client_uuid = _client_id(get('client_id'))
+    if not client_uuid:
+        return None
+    return {
+        'mongo_id': get('_id'),
+        'client_id': client_uuid,
+        'user_id': _user_id(get('user_id')),
+        'text': get('text'),
+        'created_at': parse_datetime(get('created_at')) or now
+    }
+
+def build_audio_file_row(file, now, _client_id=client_map.get, _user_id=user_map.get):
+    """Returns None when the audio file's client was not migrated"""
+    get = file.get
+    client_uuid = _client_id(get('client_id'))
+    if not client_uuid:
+        return None
+    return {
+        'mongo_id': get('_id'),
+        'client_id': client_uuid,
+        'user_id': _user_id(get('user_id')),
+        'filename': get('filename'),
+        'original_name': get('original_name'),
+        'content_type': get('content_type'),
+        'created_at': parse_datetime(get('created_at')) or now
+    }
+
+def build_setting_row(setting, now):
+    return {
+        'key': setting.get('key', 'system'),
+        'currency': setting.get('currency', 'USD'),
+        'data': setting,
+        'created_at': now
+    }
+
+def build_activity_log_row(log, now):
+    get = log.get
+    return {
+        'mongo_id': get('_id'),
+        'user_id': get('user_id'),
+        'user_name': get('user_name'),
+        'action': get('action'),
+        'entity_type': get('entity_type'),
+        'entity_id': get('entity_id'),
+        'details': get('details', {}),
+        'created_at': parse_datetime(get('created_at')) or now
+    }
+
+# ==================== ROW VALIDATION ====================
+# Mirror the NOT NULL / length constraints of supabase_schema.sql so bad rows
+# are rejected locally instead of failing (and retrying) a whole batch.
+
+class UserRow(BaseModel):
+    mongo_id: Optional[str] = Field(None, max_length=24)
+    name: str = Field(max_length=255)
+    email: str = Field(max_length=255)
+    phone: Optional[str] = Field(None, max_length=50)
+    password: str = Field(max_length=255)
+    role: Optional[str] = Field(None, max_length=50)
+    telegram_id: Optional[str] = Field(None, max_length=50)
+
+class StatusRow(BaseModel):
+    mongo_id: Optional[str] = Field(None, max_length=24)
+    name: str = Field(max_length=100)
+    color: Optional[str] = Field(None, max_length=20)
+
+class GroupRow(BaseModel):
+    mongo_id: Optional[str] = Field(None, max_length=24)
+    name: str = Field(max_length=255)
+    color: Optional[str] = Field(None, max_length=20)
+
+class TariffRow(BaseModel):
+    mongo_id: Optional[str] = Field(None, max_length=24)
+    name: str = Field(max_length=255)
+    price: float
+    currency: Optional[str] = Field(None, max_length=10)
+
+class ClientRow(BaseModel):
+    mongo_id: Optional[str] = Field(None, max_length=24)
+    name: str = Field(max_length=255)
+    phone: str = Field(max_length=50)
+    source: Optional[str] = Field(None, max_length=255)
+    status: Optional[str] = Field(None, max_length=100)
+
+class PaymentRow(BaseModel):
+    mongo_id: Optional[str] = Field(None, max_length=24)
+    client_id: str
+    amount: float
+    currency: Optional[str] = Field(None, max_length=10)
+    status: Optional[str] = Field(None, max_length=50)
+
+class ReminderRow(BaseModel):
+    mongo_id: Optional[str] = Field(None, max_length=24)
+    client_id: str
+    text: str
+    remind_at: str
+
+class NoteRow(BaseModel):
+    mongo_id: Optional[str] = Field(None, max_length=24)
+    client_id: str
+    text: str
+
+class AudioFileRow(BaseModel):
+    mongo_id: Optional[str] = Field(None, max_length=24)
+    client_id: str
+    filename: str = Field(max_length=255)
+    original_name: Optional[str] = Field(None, max_length=255)
+    content_type: Optional[str] = Field(None, max_length=100)
+
+class SettingRow(BaseModel):
+    key: str = Field(max_length=100)
+    currency: Optional[str] = Field(None, max_length=10)
+
+class ActivityLogRow(BaseModel):
+    mongo_id: Optional[str] = Field(None, max_length=24)
+    user_id: Optional[str] = Field(None, max_length=50)
+    user_name: Optional[str] = Field(None, max_length=255)
+    action: str = Field(max_length=100)
+    entity_type: Optional[str] = Field(None, max_length=100)
+    entity_id: Optional[str] = Field(None, max_length=50)
+
+ROW_MODELS = {
+    'users': UserRow,
+    'statuses': StatusRow,
+    'groups': GroupRow,
+    'tariffs': TariffRow,
+    'clients': ClientRow,
+    'payments': PaymentRow,
+    'reminders': ReminderRow,
+    'notes': NoteRow,
+    'audio_files': AudioFileRow,
+    'settings': SettingRow,
+    'activity_log': ActivityLogRow,
+}
+
+def gen_uuids(n):
+    """Generate n random (version 4) UUID strings from a single os.urandom read"""
+    buf = os.urandom(16 * n)
+    return [str(uuid.UUID(bytes=buf[i:i+16], version=4)) for i in range(0, 16 * n, 16)]
+
+def iter_uuids(n=BATCH_SIZE):
+    """Endless supply of UUID strings, generated n at a time"""
+    while True:
+        yield from gen_uuids(n)
+
+def build_rows(collection_name, build_row, id_map=None):
+    """Lazily map a backup collection through its row builder and assign ids.
+
+    This is the single streaming stage between the backup reader and
+    bulk_insert's chunking. Documents already present in id_map were migrated
+    by an earlier run and are not sent again, so the map keeps pointing at
+    their stored ids. Rows a builder rejects (None) or that fail validation
+    against ROW_MODELS are dropped here.
+    """
+    model = ROW_MODELS[collection_name]
+    ids = iter_uuids()
+    skipped = 0
+    for doc in load_backup(collection_name):
+        if id_map is not None and doc.get('_id') in id_map:
+            continue
+        row = build_row(doc, RUN_TS)
+        if row is None:
+            skipped += 1
+            continue
+        try:
+            model.model_validate(row)
+        except ValidationError as e:
+            fields = ', '.join('.'.join(map(str, err['loc'])) for err in e.errors())
+            print(f'  ✗ Invalid {collection_name} row {row.get("mongo_id") or row.get("key")}: {fields}')
+            continue
+        row['id'] = next(ids)
+        yield row
+    if skipped:
+        print(f'  ⚠ Skipped {skipped} {collection_name} - client not found')
+
+# ==================== MIGRATIONS ====================
+
 def migrate_users():
     """Migrate users collection"""
     print('\n=== Migrating Users ===')
-    users = load_backup('users')
-    
-    for user in users:
-        mongo_id = user.get('_id')
-        new_uuid = str(uuid.uuid4())
-        
-        data = {
-            'id': new_uuid,
-            'mongo_id': mongo_id,
-            'name': user.get('name'),
-            'email': user.get('email'),
-            'phone': user.get('phone'),
-            'password': user.get('password'),
-            'role': user.get('role', 'manager'),
-            'telegram_id': user.get('telegram_id'),
-            'telegram_username': user.get('telegram_username'),
-            'telegram_first_name': user.get('telegram_first_name'),
-            'telegram_linked_at': parse_datetime(user.get('telegram_linked_at')),
-            'created_at': parse_datetime(user.get('created_at')) or datetime.now().isoformat()
-        }
-        
-        try:
-            supabase.table('users').insert(data).execute()
-            user_map[mongo_id] = new_uuid
-            print(f'  ✓ {user.get("name")} ({user.get("email")})')
-        except Exception as e:
-            print(f'  ✗ Error: {e}')
-    
+    load_existing('users', user_map)
+    bulk_insert('users', build_rows('users', build_user_row, user_map), id_map=user_map)
     print(f'Migrated {len(user_map)} users')
 
 def migrate_statuses():
     """Migrate statuses collection"""
     print('\n=== Migrating Statuses ===')
-    statuses = load_backup('statuses')
-    
-    for status in statuses:
-        mongo_id = status.get('_id')
-        new_uuid = str(uuid.uuid4())
-        
-        data = {
-            'id': new_uuid,
-            'mongo_id': mongo_id,
-            'name': status.get('name'),
-            'color': status.get('color', '#3B82F6'),
-            'sort_order': status.get('order', 0),
-            'is_default': status.get('is_default', False),
-            'created_at': datetime.now().isoformat()
-        }
-        
-        try:
-            supabase.table('statuses').insert(data).execute()
-            status_map[mongo_id] = new_uuid
-            print(f'  ✓ {status.get("name")}')
-        except Exception as e:
-            print(f'  ✗ Error: {e}')
-    
+    load_existing('statuses', status_map)
+    bulk_insert('statuses', build_rows('statuses', build_status_row, status_map), id_map=status_map)
     print(f'Migrated {len(status_map)} statuses')
 
 def migrate_groups():
     """Migrate groups collection"""
     print('\n=== Migrating Groups ===')
-    groups = load_backup('groups')
-    
-    for group in groups:
-        mongo_id = group.get('_id')
-        new_uuid = str(uuid.uuid4())
-        
-        data = {
-            'id': new_uuid,
-            'mongo_id': mongo_id,
-            'name': group.get('name'),
-            'color': group.get('color', '#6B7280'),
-            'description': group.get('description'),
-            'created_at': parse_datetime(group.get('created_at')) or datetime.now().isoformat()
-        }
-        
-        try:
-            supabase.table('groups').insert(data).execute()
-            group_map[mongo_id] = new_uuid
-            print(f'  ✓ {group.get("name")}')
-        except Exception as e:
-            print(f'  ✗ Error: {e}')
-    
+    load_existing('groups', group_map)
+    bulk_insert('groups', build_rows('groups', build_group_row, group_map), id_map=group_map)
     print(f'Migrated {len(group_map)} groups')
 
 def migrate_tariffs():
     """Migrate tariffs collection"""
     print('\n=== Migrating Tariffs ===')
-    tariffs = load_backup('tariffs')
-    
-    for tariff in tariffs:
-        mongo_id = tariff.get('_id')
-        new_uuid = str(uuid.uuid4())
-        
-        data = {
-            'id': new_uuid,
-            'mongo_id': mongo_id,
-            'name': tariff.get('name'),
-            'price': float(tariff.get('price', 0)),
-            'currency': tariff.get('currency', 'USD'),
-            'description': tariff.get('description'),
-            'created_at': parse_datetime(tariff.get('created_at')) or datetime.now().isoformat()
-        }
-        
-        try:
-            supabase.table('tariffs').insert(data).execute()
-            tariff_map[mongo_id] = new_uuid
-            print(f'  ✓ {tariff.get("name")}')
-        except Exception as e:
-            print(f'  ✗ Error: {e}')
-    
+    load_existing('tariffs', tariff_map)
+    bulk_insert('tariffs', build_rows('tariffs', build_tariff_row, tariff_map), id_map=tariff_map)
     print(f'Migrated {len(tariff_map)} tariffs')
 
 def migrate_clients():
     """Migrate clients collection"""
     print('\n=== Migrating Clients ===')
-    clients = load_backup('clients')
-    
-    for client in clients:
-        mongo_id = client.get('_id')
-        new_uuid = str(uuid.uuid4())
-        
-        # Map foreign keys
-        manager_uuid = user_map.get(client.get('manager_id'))
-        tariff_uuid = tariff_map.get(client.get('tariff_id'))
-        group_uuid = group_map.get(client.get('group_id'))
-        
-        data = {
-            'id': new_uuid,
-            'mongo_id': mongo_id,
-            'name': client.get('name'),
-            'phone': client.get('phone', ''),
-            'source': client.get('source'),
-            'status': client.get('status', 'new'),
-            'manager_id': manager_uuid,
-            'tariff_id': tariff_uuid,
-            'group_id': group_uuid,
-            'is_lead': client.get('is_lead', False),
-            'archived': client.get('archived', False),
-            'created_at': parse_datetime(client.get('created_at')) or datetime.now().isoformat()
-        }
-        
-        try:
-            supabase.table('clients').insert(data).execute()
-            client_map[mongo_id] = new_uuid
-            print(f'  ✓ {client.get("name")} ({client.get("phone")})')
-        except Exception as e:
-            print(f'  ✗ Error for {client.get("name")}: {e}')
-    
+    load_existing('clients', client_map)
+    bulk_insert('clients', build_rows('clients', build_client_row, client_map), id_map=client_map)
     print(f'Migrated {len(client_map)} clients')
 
 def migrate_payments():
     """Migrate payments collection"""
     print('\n=== Migrating Payments ===')
-    payments = load_backup('payments')
-    count = 0
-    
-    for payment in payments:
-        mongo_id = payment.get('_id')
-        client_uuid = client_map.get(payment.get('client_id'))
-        user_uuid = user_map.get(payment.get('user_id'))
-        
-        if not client_uuid:
-            print(f'  ⚠ Skipping payment - client not found')
-            continue
-        
-        data = {
-            'id': str(uuid.uuid4()),
-            'mongo_id': mongo_id,
-            'client_id': client_uuid,
-            'user_id': user_uuid,
-            'amount': float(payment.get('amount', 0)),
-            'currency': payment.get('currency', 'USD'),
-            'status': payment.get('status', 'pending'),
-            'payment_date': parse_datetime(payment.get('date')),
-            'comment': payment.get('comment'),
-            'created_at': parse_datetime(payment.get('created_at')) or datetime.now().isoformat()
-        }
-        
-        try:
-            supabase.table('payments').insert(data).execute()
-            count += 1
-            print(f'  ✓ Payment ${payment.get("amount")}')
-        except Exception as e:
-            print(f'  ✗ Error: {e}')
-    
+    existing = load_existing('payments')
+    count = bulk_insert('payments', build_rows('payments', build_payment_row, existing))
     print(f'Migrated {count} payments')
 
 def migrate_reminders():
     """Migrate reminders collection"""
     print('\n=== Migrating Reminders ===')
-    reminders = load_backup('reminders')
-    count = 0
-    
-    for reminder in reminders:
-        mongo_id = reminder.get('_id')
-        client_uuid = client_map.get(reminder.get('client_id'))
-        user_uuid = user_map.get(reminder.get('user_id'))
-        
-        if not client_uuid:
-            print(f'  ⚠ Skipping reminder - client not found')
-            continue
-        
-        data = {
-            'id': str(uuid.uuid4()),
-            'mongo_id': mongo_id,
-            'client_id': client_uuid,
-            'user_id': user_uuid,
-            'text': reminder.get('text'),
-            'remind_at': parse_datetime(reminder.get('remind_at')),
-            'is_completed': reminder.get('is_completed', False),
-            'notified': reminder.get('notified', False),
-            'telegram_sent': reminder.get('telegram_sent', False),
-            'telegram_sent_at': parse_datetime(reminder.get('telegram_sent_at')),
-            'telegram_success': reminder.get('telegram_success'),
-            'created_at': parse_datetime(reminder.get('created_at')) or datetime.now().isoformat()
-        }
-        
-        try:
-            supabase.table('reminders').insert(data).execute()
-            count += 1
-            print(f'  ✓ Reminder: {reminder.get("text")[:30]}...')
-        except Exception as e:
-            print(f'  ✗ Error: {e}')
-    
+    existing = load_existing('reminders')
+    count = bulk_insert('reminders', build_rows('reminders', build_reminder_row, existing))
     print(f'Migrated {count} reminders')
 
 def migrate_notes():
     """Migrate notes collection"""
     print('\n=== Migrating Notes ===')
-    notes = load_backup('notes')
-    count = 0
-    
-    for note in notes:
-        mongo_id = note.get('_id')
-        client_uuid = client_map.get(note.get('client_id'))
-        user_uuid = user_map.get(note.get('user_id'))
-        
-        if not client_uuid:
-            print(f'  ⚠ Skipping note - client not found')
-            continue
-        
-        data = {
-            'id': str(uuid.uuid4()),
-            'mongo_id': mongo_id,
-            'client_id': client_uuid,
-            'user_id': user_uuid,
-            'text': note.get('text'),
-            'created_at': parse_datetime(note.get('created_at')) or datetime.now().isoformat()
-        }
-        
-        try:
-            supabase.table('notes').insert(data).execute()
-            count += 1
-            print(f'  ✓ Note: {note.get("text")[:30]}...')
-        except Exception as e:
-            print(f'  ✗ Error: {e}')
-    
+    existing = load_existing('notes')
+    count = bulk_insert('notes', build_rows('notes', build_note_row, existing))
     print(f'Migrated {count} notes')
 
 def migrate_audio_files():
     """Migrate audio files collection"""
     print('\n=== Migrating Audio Files ===')
-    files = load_backup('audio_files')
-    count = 0
-    
-    for file in files:
-        mongo_id = file.get('_id')
-        client_uuid = client_map.get(file.get('client_id'))
-        user_uuid = user_map.get(file.get('user_id'))
-        
-        if not client_uuid:
-            print(f'  ⚠ Skipping audio - client not found')
-            continue
-        
-        data = {
-            'id': str(uuid.uuid4()),
-            'mongo_id': mongo_id,
-            'client_id': client_uuid,
-            'user_id': user_uuid,
-            'filename': file.get('filename'),
-            'original_name': file.get('original_name'),
-            'content_type': file.get('content_type'),
-            'created_at': parse_datetime(file.get('created_at')) or datetime.now().isoformat()
-        }
-        
-        try:
-            supabase.table('audio_files').insert(data).execute()
-            count += 1
-            print(f'  ✓ Audio: {file.get("original_name")}')
-        except Exception as e:
-            print(f'  ✗ Error: {e}')
-    
+    existing = load_existing('audio_files')
+    count = bulk_insert('audio_files', build_rows('audio_files', build_audio_file_row, existing))
     print(f'Migrated {count} audio files')
 
 def migrate_settings():
     """Migrate settings collection"""
     print('\n=== Migrating Settings ===')
-    settings = load_backup('settings')
-    count = 0
-    
-    for setting in settings:
-        data = {
-            'id': str(uuid.uuid4()),
-            'key': setting.get('key', 'system'),
-            'currency': setting.get('currency', 'USD'),
-            'data': setting,
-            'created_at': datetime.now().isoformat()
-        }
-        
-        try:
-            supabase.table('settings').insert(data).execute()
-            count += 1
-            print(f'  ✓ Setting: {setting.get("key", "system")}')
-        except Exception as e:
-            print(f'  ✗ Error: {e}')
-    
+    count = bulk_insert('settings', build_rows('settings', build_setting_row), on_conflict='key')
     print(f'Migrated {count} settings')
 
+ACTIVITY_LOG_COPY_COLUMNS = ('id', 'mongo_id', 'user_id', 'user_name', 'action',
+                             'entity_type', 'entity_id', 'details', 'created_at')
+
+def copy_activity_log(rows):
+    """Stream activity_log rows over a direct PostgreSQL connection with COPY (CSV)"""
+    import psycopg2
+    
+    conn = psycopg2.connect(
+        host=os.environ.get('POSTGRES_HOST'),
+        port=os.environ.get('POSTGRES_PORT', 5432),
+        database=os.environ.get('POSTGRES_DB', 'postgres'),
+        user=os.environ.get('POSTGRES_USER', 'postgres'),
+        password=os.environ.get('POSTGRES_PASSWORD'),
+        sslmode='require'
+    )
+    columns = ', '.join(ACTIVITY_LOG_COPY_COLUMNS)
+    # COPY has no ON CONFLICT: load into a staging table, then insert new rows only.
+    # None is written as \N, so empty strings stay empty strings as on the REST path
+    sql = f"COPY activity_log_stage ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    count = 0
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("CREATE TEMP TABLE activity_log_stage (LIKE activity_log INCLUDING DEFAULTS) ON COMMIT DROP")
+            for batch in iter_chunks(rows, BATCH_SIZE * 20):
+                buf = io.StringIO()
+                writer = csv.writer(buf)
+                for row in batch:
+                    values = {**row, 'details': orjson.dumps(row['details']).decode()}
+                    writer.writerow(
+                        r"\N" if values[col] is None else values[col] for col in ACTIVITY_LOG_COPY_COLUMNS
+                    )
+                buf.seek(0)
+                cursor.copy_expert(sql, buf)
+                count += len(batch)
+                print(f'  ✓ activity_log: {count} rows staged')
+            cursor.execute(f"""
+                INSERT INTO activity_log ({columns})
+                SELECT {columns} FROM activity_log_stage
+                ON CONFLICT (mongo_id) DO NOTHING
+            """)
+            count = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return count
+
 def migrate_activity_log():
-    """Migrate activity log collection (batch)"""
+    """Migrate activity log collection (COPY when POSTGRES_HOST is set, REST otherwise)"""
     print('\n=== Migrating Activity Log ===')
-    logs = load_backup('activity_log')
-    count = 0
-    
-    # Process in batches
-    batch_size = 20
-    for i in range(0, len(logs), batch_size):
-        batch = logs[i:i+batch_size]
-        batch_data = []
-        
-        for log in batch:
-            data = {
-                'id': str(uuid.uuid4()),
-                'mongo_id': log.get('_id'),
-                'user_id': log.get('user_id'),
-                'user_name': log.get('user_name'),
-                'action': log.get('action'),
-                'entity_type': log.get('entity_type'),
-                'entity_id': log.get('entity_id'),
-                'details': log.get('details', {}),
-                'created_at': parse_datetime(log.get('created_at')) or datetime.now().isoformat()
-            }
-            batch_data.append(data)
-        
-        try:
-            supabase.table('activity_log').insert(batch_data).execute()
-            count += len(batch_data)
-            print(f'  ✓ Batch {i//batch_size + 1}: {len(batch_data)} logs')
-        except Exception as e:
-            print(f'  ✗ Batch error: {e}')
-    
+    existing = load_existing('activity_log')
+    rows = build_rows('activity_log', build_activity_log_row, existing)
+    if os.environ.get('POSTGRES_HOST'):
+        count = copy_activity_log(rows)
+    else:
+        count = bulk_insert('activity_log', rows)
     print(f'Migrated {count} activity logs')
 
 def verify_migration():
@@ -426,18 +631,10 @@ def main():
     print('SchoolCRM Data Migration to Supabase')
     print('='*60)
     
-    # Migrate in order (respecting foreign keys)
-    migrate_users()
-    migrate_statuses()
-    migrate_groups()
-    migrate_tariffs()
+    # Migrate in order (respecting foreign keys); steps within a stage are independent
+    run_parallel(migrate_users, migrate_statuses, migrate_groups, migrate_tariffs, migrate_settings)
     migrate_clients()
-    migrate_payments()
-    migrate_reminders()
-    migrate_notes()
-    migrate_audio_files()
-    migrate_settings()
-    migrate_activity_log()
+    run_parallel(migrate_payments, migrate_reminders, migrate_notes, migrate_audio_files, migrate_activity_log)
     
     verify_migration()
     
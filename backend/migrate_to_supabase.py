@@ -4,7 +4,11 @@ SchoolCRM Migration Script: MongoDB to Supabase PostgreSQL
 This script safely migrates all data from MongoDB to Supabase.
 
 Usage:
-    python migrate_to_supabase.py
+    python migrate_to_supabase.py [--fresh | --resume]
+
+    --fresh   (default) target tables are empty; plain INSERT/COPY, no upserts
+    --resume  re-run over a partially migrated database; conflicting rows
+              are updated (or skipped) by mongo_id
 
 Steps:
 1. Creates PostgreSQL schema in Supabase
@@ -14,28 +18,99 @@ Steps:
 """
 
 import os
-import json
-import psycopg2
-from psycopg2.extras import execute_values
+import argparse
+import sys
+import io
+import csv
+import ijson
+import orjson
+from itertools import islice
+from psycopg2.extras import register_uuid
+from psycopg2.pool import ThreadedConnectionPool
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
 
 load_dotenv()
 
+# Pass uuid.UUID values (client-side generated ids) straight to PostgreSQL
+register_uuid()
+
+# Rows per INSERT ... SELECT FROM unnest(...) statement
+PAGE_SIZE = 1000
+
+# Rows buffered in memory per COPY into a staging table
+COPY_CHUNK_SIZE = 10000
+
+# Rows fetched per round trip when streaming foreign-key maps
+ID_MAP_ITERSIZE = 10000
+
+# Connections (and worker threads) used to migrate independent tables at once
+POOL_SIZE = 6
+
+# Set from --resume: upsert into tables that may already hold rows from an
+# earlier run. The default (--fresh) assumes empty tables and skips conflict
+# handling, so COPY and plain INSERT can go straight into the target tables.
+RESUME = False
+
+# Bulk-load settings for the migration's own sessions, sent as startup options
+# so every pooled connection has them without an extra round trip. They do
+# not affect other clients. Not waiting for the WAL flush is safe here: after
+# a crash the migration is simply re-run from the JSON backups.
+SESSION_SETTINGS = {
+    "synchronous_commit": "off",
+    "work_mem": "256MB",
+    "maintenance_work_mem": "1GB",  # deferred CREATE INDEX / FK validation
+    "client_min_messages": "warning",
+}
+
+# Fallback created_at for documents without one, taken once per run
+NOW = datetime.now(timezone.utc)
+
 # PostgreSQL connection
-def get_pg_connection():
-    return psycopg2.connect(
+def pg_connect_kwargs():
+    return dict(
         host=os.environ.get("POSTGRES_HOST"),
         port=os.environ.get("POSTGRES_PORT", 5432),
         database=os.environ.get("POSTGRES_DB", "postgres"),
         user=os.environ.get("POSTGRES_USER", "postgres"),
         password=os.environ.get("POSTGRES_PASSWORD"),
-        sslmode="require"
+        sslmode="require",
+        options=" ".join(f"-c {name}={value}" for name, value in SESSION_SETTINGS.items())
     )
 
-# SQL Schema for Supabase
-SCHEMA_SQL = """
+def get_pg_pool():
+    return ThreadedConnectionPool(1, POOL_SIZE, **pg_connect_kwargs())
+
+def run_in_pool(pool, func, *args):
+    """Run func(conn, *args) in its own transaction on a pooled connection"""
+    conn = pool.getconn()
+    failed = True
+    try:
+        with conn:
+            result = func(conn, *args)
+        failed = False
+        return result
+    finally:
+        # A failed task may leave session state behind (e.g. a prepared
+        # statement), so its connection is discarded rather than reused
+        pool.putconn(conn, close=failed)
+
+def run_parallel(pool, *tasks):
+    """Run (func, *args) tasks concurrently, one pooled connection each.
+
+    Returns their results in order; the first failure is re-raised once
+    every task has finished.
+    """
+    with ThreadPoolExecutor(max_workers=POOL_SIZE) as executor:
+        futures = [executor.submit(run_in_pool, pool, func, *args) for func, *args in tasks]
+    return [future.result() for future in futures]
+
+# SQL Schema for Supabase: tables, primary keys and unique keys only.
+# Secondary indexes and foreign keys are in SCHEMA_INDEXES_SQL, applied after
+# the data is loaded so rows are not checked and indexed one by one.
+SCHEMA_TABLES_SQL = """
 -- Enable UUID extension
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
@@ -95,9 +170,9 @@ CREATE TABLE IF NOT EXISTS clients (
     phone VARCHAR(50) NOT NULL,
     source VARCHAR(255),
     status VARCHAR(100) DEFAULT 'new',
-    manager_id UUID REFERENCES users(id) ON DELETE SET NULL,
-    tariff_id UUID REFERENCES tariffs(id) ON DELETE SET NULL,
-    group_id UUID REFERENCES groups(id) ON DELETE SET NULL,
+    manager_id UUID,
+    tariff_id UUID,
+    group_id UUID,
     is_lead BOOLEAN DEFAULT FALSE,
     archived BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
@@ -107,8 +182,8 @@ CREATE TABLE IF NOT EXISTS clients (
 CREATE TABLE IF NOT EXISTS payments (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     mongo_id VARCHAR(24) UNIQUE,
-    client_id UUID NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
-    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+    client_id UUID NOT NULL,
+    user_id UUID,
     amount DECIMAL(12, 2) NOT NULL,
     currency VARCHAR(10) DEFAULT 'USD',
     status VARCHAR(50) DEFAULT 'pending',
@@ -121,8 +196,8 @@ CREATE TABLE IF NOT EXISTS payments (
 CREATE TABLE IF NOT EXISTS reminders (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     mongo_id VARCHAR(24) UNIQUE,
-    client_id UUID NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
-    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+    client_id UUID NOT NULL,
+    user_id UUID,
     text TEXT NOT NULL,
     remind_at TIMESTAMP WITH TIME ZONE NOT NULL,
     is_completed BOOLEAN DEFAULT FALSE,
@@ -137,8 +212,8 @@ CREATE TABLE IF NOT EXISTS reminders (
 CREATE TABLE IF NOT EXISTS notes (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     mongo_id VARCHAR(24) UNIQUE,
-    client_id UUID NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
-    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+    client_id UUID NOT NULL,
+    user_id UUID,
     text TEXT NOT NULL,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -147,8 +222,8 @@ CREATE TABLE IF NOT EXISTS notes (
 CREATE TABLE IF NOT EXISTS audio_files (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     mongo_id VARCHAR(24) UNIQUE,
-    client_id UUID NOT NULL REFERENCES clients(id) ON DELETE CASCADE,
-    user_id UUID REFERENCES users(id) ON DELETE SET NULL,
+    client_id UUID NOT NULL,
+    user_id UUID,
     filename VARCHAR(255) NOT NULL,
     original_name VARCHAR(255),
     content_type VARCHAR(100),
@@ -181,7 +256,7 @@ CREATE TABLE IF NOT EXISTS activity_log (
 CREATE TABLE IF NOT EXISTS notifications (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     mongo_id VARCHAR(24) UNIQUE,
-    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    user_id UUID,
     type VARCHAR(100),
     title VARCHAR(255),
     message TEXT,
@@ -190,6 +265,39 @@ CREATE TABLE IF NOT EXISTS notifications (
     is_read BOOLEAN DEFAULT FALSE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
+"""
+
+SCHEMA_INDEXES_SQL = """
+-- Foreign keys: added NOT VALID (no per-row check while adding), then
+-- validated in a single pass over the loaded table
+DO $$
+DECLARE
+    fk RECORD;
+    fk_name TEXT;
+BEGIN
+    FOR fk IN SELECT * FROM (VALUES
+        ('clients', 'manager_id', 'users', 'SET NULL'),
+        ('clients', 'tariff_id', 'tariffs', 'SET NULL'),
+        ('clients', 'group_id', 'groups', 'SET NULL'),
+        ('payments', 'client_id', 'clients', 'CASCADE'),
+        ('payments', 'user_id', 'users', 'SET NULL'),
+        ('reminders', 'client_id', 'clients', 'CASCADE'),
+        ('reminders', 'user_id', 'users', 'SET NULL'),
+        ('notes', 'client_id', 'clients', 'CASCADE'),
+        ('notes', 'user_id', 'users', 'SET NULL'),
+        ('audio_files', 'client_id', 'clients', 'CASCADE'),
+        ('audio_files', 'user_id', 'users', 'SET NULL'),
+        ('notifications', 'user_id', 'users', 'CASCADE')
+    ) AS t(tbl, col, ref, on_delete)
+    LOOP
+        fk_name := fk.tbl || '_' || fk.col || '_fkey';
+        IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = fk_name) THEN
+            EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I FOREIGN KEY (%I) REFERENCES %I(id) ON DELETE %s NOT VALID',
+                           fk.tbl, fk_name, fk.col, fk.ref, fk.on_delete);
+            EXECUTE format('ALTER TABLE %I VALIDATE CONSTRAINT %I', fk.tbl, fk_name);
+        END IF;
+    END LOOP;
+END $$;
 
 -- Create indexes for performance
 CREATE INDEX IF NOT EXISTS idx_clients_manager ON clients(manager_id);
@@ -201,62 +309,310 @@ CREATE INDEX IF NOT EXISTS idx_reminders_remind_at ON reminders(remind_at);
 CREATE INDEX IF NOT EXISTS idx_notes_client ON notes(client_id);
 CREATE INDEX IF NOT EXISTS idx_activity_log_user ON activity_log(user_id);
 CREATE INDEX IF NOT EXISTS idx_activity_log_created ON activity_log(created_at);
-CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
+CREATE INDEX IF NOT EXISTS idx_clients_tariff ON clients(tariff_id);
+CREATE INDEX IF NOT EXISTS idx_clients_group ON clients(group_id);
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+ALTER TABLE clients ADD COLUMN IF NOT EXISTS phone_norm TEXT
+    GENERATED ALWAYS AS (regexp_replace(phone, '\\D', '', 'g')) STORED;
+CREATE INDEX IF NOT EXISTS idx_clients_name_trgm ON clients USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_clients_phone_norm_trgm ON clients USING gin (phone_norm gin_trgm_ops);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_telegram_id_unique ON users(telegram_id) WHERE telegram_id IS NOT NULL;
 """
 
 def create_schema(conn):
     """Create all tables in Supabase"""
     print("\n=== Creating Schema ===")
-    cursor = conn.cursor()
-    
-    # Execute schema
-    cursor.execute(SCHEMA_SQL)
-    conn.commit()
-    
-    print("✓ Schema created successfully")
-    cursor.close()
+    with conn.cursor() as cursor:
+        # Execute schema
+        cursor.execute(SCHEMA_TABLES_SQL)
+        conn.commit()
+        
+        print("✓ Schema created successfully")
 
-def load_backup_data(collection_name):
-    """Load data from backup JSON files"""
+def create_indexes(conn):
+    """Add foreign keys and secondary indexes once the data is loaded"""
+    print("\n=== Creating Indexes and Foreign Keys ===")
+    with conn.cursor() as cursor:
+        cursor.execute(SCHEMA_INDEXES_SQL)
+        conn.commit()
+        
+        print("✓ Indexes and foreign keys created")
+
+def iter_backup_data(collection_name):
+    """Stream documents one by one from a backup JSON file (a top-level array)"""
     backup_path = f"/app/backups/mongodb_backup/{collection_name}.json"
-    if os.path.exists(backup_path):
-        with open(backup_path, "r") as f:
-            return json.load(f)
-    return []
+    if not os.path.exists(backup_path):
+        return
+    with open(backup_path, "rb") as f:
+        yield from ijson.items(f, "item", use_float=True)
+
+def iter_chunks(rows, size):
+    """Split an iterable of rows into lists of at most `size` rows"""
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+def unnest_insert_sql(table, columns):
+    """Build the unnest INSERT for (name, type) columns.
+
+    Returns (sql, args): sql is INSERT ... SELECT * FROM unnest($1::type[], ...)
+    and args the matching EXECUTE argument list (%s::type[], ...). The casts
+    are needed on both sides: psycopg2 sends a list of str as text[], and
+    EXECUTE only applies assignment casts, which do not turn text[] into
+    jsonb[].
+    """
+    names = ", ".join(name for name, _ in columns)
+    arrays = ", ".join(f"${i}::{pg_type}[]" for i, (_, pg_type) in enumerate(columns, 1))
+    args = ", ".join(f"%s::{pg_type}[]" for _, pg_type in columns)
+    return f"INSERT INTO {table} ({names}) SELECT * FROM unnest({arrays})", args
+
+def insert_arrays(cursor, table, insert, rows, conflict_sql):
+    """Insert `rows` PAGE_SIZE at a time as one array per column; returns the row count.
+
+    `insert` comes from unnest_insert_sql, so each chunk is one statement with
+    a single row shape for the planner instead of PAGE_SIZE VALUES tuples.
+    It is PREPAREd once and EXECUTEd per chunk, so the server parses and
+    plans it only once per table.
+    `conflict_sql` is only appended in --resume mode; a fresh run inserts
+    into empty tables and skips the conflict check entirely.
+    """
+    sql, args = insert
+    if RESUME:
+        sql += conflict_sql
+    name = f"insert_{table}"
+    cursor.execute(f"PREPARE {name} AS {sql}")
+    count = 0
+    for chunk in iter_chunks(rows, PAGE_SIZE):
+        arrays = [list(column) for column in zip(*chunk)]
+        cursor.execute(f"EXECUTE {name} ({args})", arrays)
+        count += len(chunk)
+    # Prepared statements outlive the transaction; pooled connections are reused
+    cursor.execute(f"DEALLOCATE {name}")
+    return count
+
+def copy_rows(cursor, table, columns, rows, conflict_sql):
+    """Bulk-load rows into `table` with COPY; returns the number of rows loaded.
+
+    A fresh run copies straight into the (empty) table. In --resume mode COPY
+    cannot resolve conflicts, so rows land in a temporary copy of the table
+    first and are merged with INSERT ... SELECT plus `conflict_sql`.
+    Rows are copied in chunks, so only one chunk is held in memory at a time.
+    """
+    cols = ", ".join(columns)
+    target = table
+    if RESUME:
+        target = f"{table}_stage"
+        cursor.execute(f"CREATE TEMP TABLE {target} (LIKE {table} INCLUDING DEFAULTS)")
+    
+    count = 0
+    for chunk in iter_chunks(rows, COPY_CHUNK_SIZE):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for row in chunk:
+            writer.writerow(r"\N" if value is None else value for value in row)
+        buf.seek(0)
+        cursor.copy_expert(f"COPY {target} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+        count += len(chunk)
+    
+    if RESUME:
+        cursor.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {target} {conflict_sql}")
+        cursor.execute(f"DROP TABLE {target}")
+    return count
+
+def assign_id(id_map, mongo_id):
+    """Return the UUID for `mongo_id`, generating and recording a new one if needed.
+
+    Ids are generated here rather than by uuid_generate_v4(), so the maps
+    foreign keys are resolved from are filled while the rows are built
+    instead of being read back from the database afterwards.
+    """
+    if mongo_id is None:
+        return uuid.uuid4()
+    new_id = id_map.get(mongo_id)
+    if new_id is None:
+        new_id = id_map[mongo_id] = uuid.uuid4()
+    return new_id
+
+def load_id_map(conn, table):
+    """Map mongo_id -> UUID for every row already in `table`.
+
+    Uses a named (server-side) cursor so rows arrive ID_MAP_ITERSIZE at a
+    time instead of the whole result set being buffered client-side.
+    """
+    with conn.cursor(name=f"{table}_id_map") as cursor:
+        cursor.itersize = ID_MAP_ITERSIZE
+        cursor.execute(f"SELECT mongo_id, id FROM {table}")
+        return dict(cursor)
+
+if sys.version_info >= (3, 11):
+    # fromisoformat accepts a trailing 'Z' natively since 3.11
+    _fromisoformat = datetime.fromisoformat
+else:
+    def _fromisoformat(dt_str):
+        return datetime.fromisoformat(dt_str.replace('Z', '+00:00'))
 
 def parse_datetime(dt_str):
     """Parse datetime string to Python datetime"""
     if not dt_str:
         return None
-    try:
-        # Handle ISO format
-        if isinstance(dt_str, str):
-            dt_str = dt_str.replace('Z', '+00:00')
-            return datetime.fromisoformat(dt_str)
+    if not isinstance(dt_str, str):
         return dt_str
-    except:
+    try:
+        return _fromisoformat(dt_str)
+    except ValueError:
         return None
 
-def migrate_users(conn):
+# table -> (migrate function, tables it references); filled by @register
+MIGRATIONS = {}
+
+# Tables whose mongo_id -> id maps are shared with the tables that reference them
+ID_MAP_TABLES = ("users", "groups", "tariffs", "clients")
+
+def register(table, deps=()):
+    """Register a migrate_* function for `table`, run after every table in `deps`"""
+    def decorator(func):
+        MIGRATIONS[table] = (func, tuple(deps))
+        return func
+    return decorator
+
+def migration_levels():
+    """Group registered tables into levels with Kahn's algorithm.
+
+    Every table's dependencies are in earlier levels, so the tables within
+    one level can be migrated concurrently.
+    """
+    remaining = {table: set(deps) for table, (_, deps) in MIGRATIONS.items()}
+    levels = []
+    while remaining:
+        level = sorted(table for table, deps in remaining.items() if not deps)
+        if not level:
+            raise ValueError(f"Circular table dependencies: {', '.join(sorted(remaining))}")
+        levels.append(level)
+        for table in level:
+            del remaining[table]
+        for deps in remaining.values():
+            deps.difference_update(level)
+    return levels
+
+# Load statements, one set per table: the INSERT (or COPY column list) and
+# the ON CONFLICT clause applied in --resume mode
+USERS_INSERT_SQL = unnest_insert_sql("users", (
+    ("id", "uuid"), ("mongo_id", "varchar"), ("name", "varchar"),
+    ("email", "varchar"), ("phone", "varchar"), ("password", "varchar"),
+    ("role", "varchar"), ("telegram_id", "varchar"),
+    ("telegram_username", "varchar"), ("telegram_first_name", "varchar"),
+    ("telegram_linked_at", "timestamptz"), ("created_at", "timestamptz")
+))
+USERS_CONFLICT_SQL = """
+    ON CONFLICT (mongo_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        email = EXCLUDED.email,
+        phone = EXCLUDED.phone,
+        telegram_id = EXCLUDED.telegram_id,
+        telegram_username = EXCLUDED.telegram_username
+"""
+
+STATUSES_INSERT_SQL = unnest_insert_sql("statuses", (
+    ("mongo_id", "varchar"), ("name", "varchar"), ("color", "varchar"),
+    ('"order"', "integer"), ("is_default", "boolean")
+))
+STATUSES_CONFLICT_SQL = """
+    ON CONFLICT (mongo_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        color = EXCLUDED.color
+"""
+
+GROUPS_INSERT_SQL = unnest_insert_sql("groups", (
+    ("id", "uuid"), ("mongo_id", "varchar"), ("name", "varchar"),
+    ("color", "varchar"), ("description", "text"), ("created_at", "timestamptz")
+))
+GROUPS_CONFLICT_SQL = """
+    ON CONFLICT (mongo_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        color = EXCLUDED.color
+"""
+
+TARIFFS_INSERT_SQL = unnest_insert_sql("tariffs", (
+    ("id", "uuid"), ("mongo_id", "varchar"), ("name", "varchar"),
+    ("price", "numeric"), ("currency", "varchar"), ("description", "text"),
+    ("created_at", "timestamptz")
+))
+TARIFFS_CONFLICT_SQL = """
+    ON CONFLICT (mongo_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        price = EXCLUDED.price
+"""
+
+CLIENTS_COLUMNS = (
+    "id", "mongo_id", "name", "phone", "source", "status", "manager_id",
+    "tariff_id", "group_id", "is_lead", "archived", "created_at"
+)
+CLIENTS_CONFLICT_SQL = """
+    ON CONFLICT (mongo_id) DO UPDATE SET
+        name = EXCLUDED.name,
+        phone = EXCLUDED.phone,
+        status = EXCLUDED.status
+"""
+
+PAYMENTS_COLUMNS = (
+    "mongo_id", "client_id", "user_id", "amount", "currency",
+    "status", "date", "comment", "created_at"
+)
+PAYMENTS_CONFLICT_SQL = """
+    ON CONFLICT (mongo_id) DO UPDATE SET
+        amount = EXCLUDED.amount,
+        status = EXCLUDED.status
+"""
+
+REMINDERS_COLUMNS = (
+    "mongo_id", "client_id", "user_id", "text", "remind_at",
+    "is_completed", "notified", "telegram_sent",
+    "telegram_sent_at", "telegram_success", "created_at"
+)
+REMINDERS_CONFLICT_SQL = """
+    ON CONFLICT (mongo_id) DO UPDATE SET
+        text = EXCLUDED.text,
+        is_completed = EXCLUDED.is_completed
+"""
+
+NOTES_COLUMNS = (
+    "mongo_id", "client_id", "user_id", "text", "created_at"
+)
+NOTES_CONFLICT_SQL = """
+    ON CONFLICT (mongo_id) DO UPDATE SET
+        text = EXCLUDED.text
+"""
+
+SETTINGS_INSERT_SQL = unnest_insert_sql("settings", (
+    ("key", "varchar"), ("currency", "varchar"), ("data", "jsonb"),
+    ("created_at", "timestamptz")
+))
+SETTINGS_CONFLICT_SQL = """
+    ON CONFLICT (key) DO UPDATE SET
+        currency = EXCLUDED.currency
+"""
+
+ACTIVITY_LOG_COLUMNS = (
+    "mongo_id", "user_id", "user_name", "action",
+    "entity_type", "entity_id", "details", "created_at"
+)
+ACTIVITY_LOG_CONFLICT_SQL = "ON CONFLICT (mongo_id) DO NOTHING"
+
+AUDIO_FILES_COLUMNS = (
+    "mongo_id", "client_id", "user_id", "filename",
+    "original_name", "content_type", "created_at"
+)
+AUDIO_FILES_CONFLICT_SQL = "ON CONFLICT (mongo_id) DO NOTHING"
+
+@register("users")
+def migrate_users(conn, id_maps):
     """Migrate users collection"""
     print("\n=== Migrating Users ===")
-    cursor = conn.cursor()
-    users = load_backup_data("users")
-    
-    for user in users:
-        cursor.execute("""
-            INSERT INTO users (mongo_id, name, email, phone, password, role, 
-                             telegram_id, telegram_username, telegram_first_name, 
-                             telegram_linked_at, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (mongo_id) DO UPDATE SET
-                name = EXCLUDED.name,
-                email = EXCLUDED.email,
-                phone = EXCLUDED.phone,
-                telegram_id = EXCLUDED.telegram_id,
-                telegram_username = EXCLUDED.telegram_username
-        """, (
+    with conn.cursor() as cursor:
+        user_map = id_maps["users"]
+        
+        rows = ((
+            assign_id(user_map, user.get("_id")),
             user.get("_id"),
             user.get("name"),
             user.get("email"),
@@ -267,402 +623,324 @@ def migrate_users(conn):
             user.get("telegram_username"),
             user.get("telegram_first_name"),
             parse_datetime(user.get("telegram_linked_at")),
-            parse_datetime(user.get("created_at")) or datetime.now()
-        ))
-    
-    conn.commit()
-    print(f"✓ Migrated {len(users)} users")
-    cursor.close()
+            parse_datetime(user.get("created_at")) or NOW
+        ) for user in iter_backup_data("users"))
+        
+        count = insert_arrays(cursor, "users", USERS_INSERT_SQL, rows, USERS_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} users")
 
-def migrate_statuses(conn):
+@register("statuses")
+def migrate_statuses(conn, id_maps):
     """Migrate statuses collection"""
     print("\n=== Migrating Statuses ===")
-    cursor = conn.cursor()
-    statuses = load_backup_data("statuses")
-    
-    for status in statuses:
-        cursor.execute("""
-            INSERT INTO statuses (mongo_id, name, color, "order", is_default)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (mongo_id) DO UPDATE SET
-                name = EXCLUDED.name,
-                color = EXCLUDED.color
-        """, (
+    with conn.cursor() as cursor:
+        
+        rows = ((
             status.get("_id"),
             status.get("name"),
             status.get("color", "#3B82F6"),
             status.get("order", 0),
             status.get("is_default", False)
-        ))
-    
-    conn.commit()
-    print(f"✓ Migrated {len(statuses)} statuses")
-    cursor.close()
+        ) for status in iter_backup_data("statuses"))
+        
+        count = insert_arrays(cursor, "statuses", STATUSES_INSERT_SQL, rows, STATUSES_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} statuses")
 
-def migrate_groups(conn):
+@register("groups")
+def migrate_groups(conn, id_maps):
     """Migrate groups collection"""
     print("\n=== Migrating Groups ===")
-    cursor = conn.cursor()
-    groups = load_backup_data("groups")
-    
-    for group in groups:
-        cursor.execute("""
-            INSERT INTO groups (mongo_id, name, color, description, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (mongo_id) DO UPDATE SET
-                name = EXCLUDED.name,
-                color = EXCLUDED.color
-        """, (
+    with conn.cursor() as cursor:
+        group_map = id_maps["groups"]
+        
+        rows = ((
+            assign_id(group_map, group.get("_id")),
             group.get("_id"),
             group.get("name"),
             group.get("color", "#6B7280"),
             group.get("description"),
-            parse_datetime(group.get("created_at")) or datetime.now()
-        ))
-    
-    conn.commit()
-    print(f"✓ Migrated {len(groups)} groups")
-    cursor.close()
+            parse_datetime(group.get("created_at")) or NOW
+        ) for group in iter_backup_data("groups"))
+        
+        count = insert_arrays(cursor, "groups", GROUPS_INSERT_SQL, rows, GROUPS_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} groups")
 
-def migrate_tariffs(conn):
+@register("tariffs")
+def migrate_tariffs(conn, id_maps):
     """Migrate tariffs collection"""
     print("\n=== Migrating Tariffs ===")
-    cursor = conn.cursor()
-    tariffs = load_backup_data("tariffs")
-    
-    for tariff in tariffs:
-        cursor.execute("""
-            INSERT INTO tariffs (mongo_id, name, price, currency, description, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            ON CONFLICT (mongo_id) DO UPDATE SET
-                name = EXCLUDED.name,
-                price = EXCLUDED.price
-        """, (
+    with conn.cursor() as cursor:
+        tariff_map = id_maps["tariffs"]
+        
+        rows = ((
+            assign_id(tariff_map, tariff.get("_id")),
             tariff.get("_id"),
             tariff.get("name"),
             tariff.get("price", 0),
             tariff.get("currency", "USD"),
             tariff.get("description"),
-            parse_datetime(tariff.get("created_at")) or datetime.now()
-        ))
-    
-    conn.commit()
-    print(f"✓ Migrated {len(tariffs)} tariffs")
-    cursor.close()
+            parse_datetime(tariff.get("created_at")) or NOW
+        ) for tariff in iter_backup_data("tariffs"))
+        
+        count = insert_arrays(cursor, "tariffs", TARIFFS_INSERT_SQL, rows, TARIFFS_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} tariffs")
 
-def migrate_clients(conn):
+@register("clients", deps=["users", "tariffs", "groups"])
+def migrate_clients(conn, id_maps):
     """Migrate clients collection"""
     print("\n=== Migrating Clients ===")
-    cursor = conn.cursor()
-    clients = load_backup_data("clients")
-    
-    # First, get ID mappings for foreign keys
-    cursor.execute("SELECT id, mongo_id FROM users")
-    user_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    cursor.execute("SELECT id, mongo_id FROM tariffs")
-    tariff_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    cursor.execute("SELECT id, mongo_id FROM groups")
-    group_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    for client in clients:
-        manager_uuid = user_map.get(client.get("manager_id"))
-        tariff_uuid = tariff_map.get(client.get("tariff_id"))
-        group_uuid = group_map.get(client.get("group_id"))
-        
-        cursor.execute("""
-            INSERT INTO clients (mongo_id, name, phone, source, status, manager_id, 
-                               tariff_id, group_id, is_lead, archived, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (mongo_id) DO UPDATE SET
-                name = EXCLUDED.name,
-                phone = EXCLUDED.phone,
-                status = EXCLUDED.status
-        """, (
+    with conn.cursor() as cursor:
+        client_map, user_map = id_maps["clients"], id_maps["users"]
+        tariff_map, group_map = id_maps["tariffs"], id_maps["groups"]
+        
+        rows = ((
+            assign_id(client_map, client.get("_id")),
             client.get("_id"),
             client.get("name"),
             client.get("phone"),
             client.get("source"),
             client.get("status", "new"),
-            manager_uuid,
-            tariff_uuid,
-            group_uuid,
+            user_map.get(client.get("manager_id")),
+            tariff_map.get(client.get("tariff_id")),
+            group_map.get(client.get("group_id")),
             client.get("is_lead", False),
             client.get("archived", False),
-            parse_datetime(client.get("created_at")) or datetime.now()
-        ))
-    
-    conn.commit()
-    print(f"✓ Migrated {len(clients)} clients")
-    cursor.close()
+            parse_datetime(client.get("created_at")) or NOW
+        ) for client in iter_backup_data("clients"))
+        
+        count = copy_rows(cursor, "clients", CLIENTS_COLUMNS, rows, CLIENTS_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} clients")
 
-def migrate_payments(conn):
+@register("payments", deps=["clients", "users"])
+def migrate_payments(conn, id_maps):
     """Migrate payments collection"""
     print("\n=== Migrating Payments ===")
-    cursor = conn.cursor()
-    payments = load_backup_data("payments")
-    
-    # Get ID mappings
-    cursor.execute("SELECT id, mongo_id FROM clients")
-    client_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    cursor.execute("SELECT id, mongo_id FROM users")
-    user_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    for payment in payments:
-        client_uuid = client_map.get(payment.get("client_id"))
-        user_uuid = user_map.get(payment.get("user_id"))
-        
-        if not client_uuid:
-            print(f"  ⚠ Skipping payment - client not found: {payment.get('client_id')}")
-            continue
-            
-        cursor.execute("""
-            INSERT INTO payments (mongo_id, client_id, user_id, amount, currency, 
-                                status, date, comment, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (mongo_id) DO UPDATE SET
-                amount = EXCLUDED.amount,
-                status = EXCLUDED.status
-        """, (
-            payment.get("_id"),
-            client_uuid,
-            user_uuid,
-            payment.get("amount", 0),
-            payment.get("currency", "USD"),
-            payment.get("status", "pending"),
-            parse_datetime(payment.get("date")),
-            payment.get("comment"),
-            parse_datetime(payment.get("created_at")) or datetime.now()
-        ))
-    
-    conn.commit()
-    print(f"✓ Migrated {len(payments)} payments")
-    cursor.close()
+    with conn.cursor() as cursor:
+        client_map, user_map = id_maps["clients"], id_maps["users"]
+        
+        def build_rows():
+            for payment in iter_backup_data("payments"):
+                client_uuid = client_map.get(payment.get("client_id"))
+                if not client_uuid:
+                    print(f"  ⚠ Skipping payment - client not found: {payment.get('client_id')}")
+                    continue
+                
+                yield (
+                    payment.get("_id"),
+                    client_uuid,
+                    user_map.get(payment.get("user_id")),
+                    payment.get("amount", 0),
+                    payment.get("currency", "USD"),
+                    payment.get("status", "pending"),
+                    parse_datetime(payment.get("date")),
+                    payment.get("comment"),
+                    parse_datetime(payment.get("created_at")) or NOW
+                )
+        
+        rows = build_rows()
+        
+        count = copy_rows(cursor, "payments", PAYMENTS_COLUMNS, rows, PAYMENTS_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} payments")
 
-def migrate_reminders(conn):
+@register("reminders", deps=["clients", "users"])
+def migrate_reminders(conn, id_maps):
     """Migrate reminders collection"""
     print("\n=== Migrating Reminders ===")
-    cursor = conn.cursor()
-    reminders = load_backup_data("reminders")
-    
-    cursor.execute("SELECT id, mongo_id FROM clients")
-    client_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    cursor.execute("SELECT id, mongo_id FROM users")
-    user_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    for reminder in reminders:
-        client_uuid = client_map.get(reminder.get("client_id"))
-        user_uuid = user_map.get(reminder.get("user_id"))
-        
-        if not client_uuid:
-            print(f"  ⚠ Skipping reminder - client not found: {reminder.get('client_id')}")
-            continue
-            
-        cursor.execute("""
-            INSERT INTO reminders (mongo_id, client_id, user_id, text, remind_at, 
-                                 is_completed, notified, telegram_sent, 
-                                 telegram_sent_at, telegram_success, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (mongo_id) DO UPDATE SET
-                text = EXCLUDED.text,
-                is_completed = EXCLUDED.is_completed
-        """, (
-            reminder.get("_id"),
-            client_uuid,
-            user_uuid,
-            reminder.get("text"),
-            parse_datetime(reminder.get("remind_at")),
-            reminder.get("is_completed", False),
-            reminder.get("notified", False),
-            reminder.get("telegram_sent", False),
-            parse_datetime(reminder.get("telegram_sent_at")),
-            reminder.get("telegram_success"),
-            parse_datetime(reminder.get("created_at")) or datetime.now()
-        ))
-    
-    conn.commit()
-    print(f"✓ Migrated {len(reminders)} reminders")
-    cursor.close()
+    with conn.cursor() as cursor:
+        client_map, user_map = id_maps["clients"], id_maps["users"]
+        
+        def build_rows():
+            for reminder in iter_backup_data("reminders"):
+                client_uuid = client_map.get(reminder.get("client_id"))
+                if not client_uuid:
+                    print(f"  ⚠ Skipping reminder - client not found: {reminder.get('client_id')}")
+                    continue
+                
+                yield (
+                    reminder.get("_id"),
+                    client_uuid,
+                    user_map.get(reminder.get("user_id")),
+                    reminder.get("text"),
+                    parse_datetime(reminder.get("remind_at")),
+                    reminder.get("is_completed", False),
+                    reminder.get("notified", False),
+                    reminder.get("telegram_sent", False),
+                    parse_datetime(reminder.get("telegram_sent_at")),
+                    reminder.get("telegram_success"),
+                    parse_datetime(reminder.get("created_at")) or NOW
+                )
+        
+        rows = build_rows()
+        
+        count = copy_rows(cursor, "reminders", REMINDERS_COLUMNS, rows, REMINDERS_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} reminders")
 
-def migrate_notes(conn):
+@register("notes", deps=["clients", "users"])
+def migrate_notes(conn, id_maps):
     """Migrate notes collection"""
     print("\n=== Migrating Notes ===")
-    cursor = conn.cursor()
-    notes = load_backup_data("notes")
-    
-    cursor.execute("SELECT id, mongo_id FROM clients")
-    client_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    cursor.execute("SELECT id, mongo_id FROM users")
-    user_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    for note in notes:
-        client_uuid = client_map.get(note.get("client_id"))
-        user_uuid = user_map.get(note.get("user_id"))
-        
-        if not client_uuid:
-            print(f"  ⚠ Skipping note - client not found: {note.get('client_id')}")
-            continue
-            
-        cursor.execute("""
-            INSERT INTO notes (mongo_id, client_id, user_id, text, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-            ON CONFLICT (mongo_id) DO UPDATE SET
-                text = EXCLUDED.text
-        """, (
-            note.get("_id"),
-            client_uuid,
-            user_uuid,
-            note.get("text"),
-            parse_datetime(note.get("created_at")) or datetime.now()
-        ))
-    
-    conn.commit()
-    print(f"✓ Migrated {len(notes)} notes")
-    cursor.close()
+    with conn.cursor() as cursor:
+        client_map, user_map = id_maps["clients"], id_maps["users"]
+        
+        def build_rows():
+            for note in iter_backup_data("notes"):
+                client_uuid = client_map.get(note.get("client_id"))
+                if not client_uuid:
+                    print(f"  ⚠ Skipping note - client not found: {note.get('client_id')}")
+                    continue
+                
+                yield (
+                    note.get("_id"),
+                    client_uuid,
+                    user_map.get(note.get("user_id")),
+                    note.get("text"),
+                    parse_datetime(note.get("created_at")) or NOW
+                )
+        
+        rows = build_rows()
+        
+        count = copy_rows(cursor, "notes", NOTES_COLUMNS, rows, NOTES_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} notes")
 
-def migrate_settings(conn):
+@register("settings")
+def migrate_settings(conn, id_maps):
     """Migrate settings collection"""
     print("\n=== Migrating Settings ===")
-    cursor = conn.cursor()
-    settings = load_backup_data("settings")
-    
-    for setting in settings:
-        cursor.execute("""
-            INSERT INTO settings (key, currency, data, created_at)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (key) DO UPDATE SET
-                currency = EXCLUDED.currency
-        """, (
+    with conn.cursor() as cursor:
+        
+        rows = ((
             setting.get("key", "system"),
             setting.get("currency", "USD"),
-            json.dumps(setting),
-            parse_datetime(setting.get("created_at")) or datetime.now()
-        ))
-    
-    conn.commit()
-    print(f"✓ Migrated {len(settings)} settings")
-    cursor.close()
+            orjson.dumps(setting).decode(),
+            parse_datetime(setting.get("created_at")) or NOW
+        ) for setting in iter_backup_data("settings"))
+        
+        count = insert_arrays(cursor, "settings", SETTINGS_INSERT_SQL, rows, SETTINGS_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} settings")
 
-def migrate_activity_log(conn):
+@register("activity_log")
+def migrate_activity_log(conn, id_maps):
     """Migrate activity log collection"""
     print("\n=== Migrating Activity Log ===")
-    cursor = conn.cursor()
-    logs = load_backup_data("activity_log")
-    
-    batch_size = 50
-    for i in range(0, len(logs), batch_size):
-        batch = logs[i:i+batch_size]
-        for log in batch:
-            cursor.execute("""
-                INSERT INTO activity_log (mongo_id, user_id, user_name, action, 
-                                        entity_type, entity_id, details, created_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (mongo_id) DO NOTHING
-            """, (
-                log.get("_id"),
-                log.get("user_id"),
-                log.get("user_name"),
-                log.get("action"),
-                log.get("entity_type"),
-                log.get("entity_id"),
-                json.dumps(log.get("details", {})),
-                parse_datetime(log.get("created_at")) or datetime.now()
-            ))
-        conn.commit()
-        print(f"  Processed {min(i+batch_size, len(logs))}/{len(logs)} logs")
-    
-    print(f"✓ Migrated {len(logs)} activity logs")
-    cursor.close()
+    with conn.cursor() as cursor:
+        
+        rows = ((
+            log.get("_id"),
+            log.get("user_id"),
+            log.get("user_name"),
+            log.get("action"),
+            log.get("entity_type"),
+            log.get("entity_id"),
+            # Written into the COPY text by orjson; no Jsonb adapter applies to COPY
+            orjson.dumps(log.get("details", {})).decode(),
+            parse_datetime(log.get("created_at")) or NOW
+        ) for log in iter_backup_data("activity_log"))
+        
+        count = copy_rows(cursor, "activity_log", ACTIVITY_LOG_COLUMNS, rows, ACTIVITY_LOG_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} activity logs")
 
-def migrate_audio_files(conn):
+@register("audio_files", deps=["clients", "users"])
+def migrate_audio_files(conn, id_maps):
     """Migrate audio files collection"""
     print("\n=== Migrating Audio Files ===")
-    cursor = conn.cursor()
-    files = load_backup_data("audio_files")
-    
-    cursor.execute("SELECT id, mongo_id FROM clients")
-    client_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    cursor.execute("SELECT id, mongo_id FROM users")
-    user_map = {row[1]: row[0] for row in cursor.fetchall()}
-    
-    for file in files:
-        client_uuid = client_map.get(file.get("client_id"))
-        user_uuid = user_map.get(file.get("user_id"))
-        
-        if not client_uuid:
-            print(f"  ⚠ Skipping audio - client not found: {file.get('client_id')}")
-            continue
-            
-        cursor.execute("""
-            INSERT INTO audio_files (mongo_id, client_id, user_id, filename, 
-                                   original_name, content_type, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (mongo_id) DO NOTHING
-        """, (
-            file.get("_id"),
-            client_uuid,
-            user_uuid,
-            file.get("filename"),
-            file.get("original_name"),
-            file.get("content_type"),
-            parse_datetime(file.get("created_at")) or datetime.now()
-        ))
-    
-    conn.commit()
-    print(f"✓ Migrated {len(files)} audio files")
-    cursor.close()
+    with conn.cursor() as cursor:
+        client_map, user_map = id_maps["clients"], id_maps["users"]
+        
+        def build_rows():
+            for file in iter_backup_data("audio_files"):
+                client_uuid = client_map.get(file.get("client_id"))
+                if not client_uuid:
+                    print(f"  ⚠ Skipping audio - client not found: {file.get('client_id')}")
+                    continue
+                
+                yield (
+                    file.get("_id"),
+                    client_uuid,
+                    user_map.get(file.get("user_id")),
+                    file.get("filename"),
+                    file.get("original_name"),
+                    file.get("content_type"),
+                    parse_datetime(file.get("created_at")) or NOW
+                )
+        
+        rows = build_rows()
+        
+        count = copy_rows(cursor, "audio_files", AUDIO_FILES_COLUMNS, rows, AUDIO_FILES_CONFLICT_SQL)
+        
+        print(f"✓ Migrated {count} audio files")
 
 def verify_migration(conn):
     """Verify migration was successful"""
     print("\n=== Verifying Migration ===")
-    cursor = conn.cursor()
-    
-    tables = ["users", "clients", "payments", "reminders", "notes", 
-              "statuses", "groups", "tariffs", "settings", "activity_log"]
-    
-    results = {}
-    for table in tables:
-        cursor.execute(f"SELECT COUNT(*) FROM {table}")
-        count = cursor.fetchone()[0]
-        results[table] = count
-        print(f"  {table}: {count} records")
-    
-    cursor.close()
+    with conn.cursor() as cursor:
+        
+        tables = ["users", "clients", "payments", "reminders", "notes", 
+                  "statuses", "groups", "tariffs", "settings", "activity_log"]
+        
+        # Exact counts for every table in a single round trip
+        cursor.execute(" UNION ALL ".join(
+            f"SELECT '{table}', COUNT(*) FROM {table}" for table in tables
+        ))
+        results = dict(cursor)
+        for table, count in results.items():
+            print(f"  {table}: {count} records")
     return results
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migrate MongoDB backups to Supabase PostgreSQL")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--fresh", dest="resume", action="store_false",
+                      help="load into empty tables without conflict handling (default)")
+    mode.add_argument("--resume", dest="resume", action="store_true",
+                      help="upsert by mongo_id into tables that may already hold rows")
+    return parser.parse_args()
+
 def main():
+    global RESUME
+    RESUME = parse_args().resume
+    
     print("=" * 60)
     print("SchoolCRM Migration: MongoDB → Supabase PostgreSQL")
     print("=" * 60)
     
     try:
         print("\n[1/3] Connecting to Supabase...")
-        conn = get_pg_connection()
+        pool = get_pg_pool()
         print("✓ Connected to Supabase PostgreSQL")
         
         print("\n[2/3] Running Migration...")
-        create_schema(conn)
-        
-        # Migrate in order (respecting foreign keys)
-        migrate_users(conn)
-        migrate_statuses(conn)
-        migrate_groups(conn)
-        migrate_tariffs(conn)
-        migrate_clients(conn)
-        migrate_payments(conn)
-        migrate_reminders(conn)
-        migrate_notes(conn)
-        migrate_settings(conn)
-        migrate_activity_log(conn)
-        migrate_audio_files(conn)
+        run_in_pool(pool, create_schema)
+        
+        # Ids are generated client-side and recorded in these maps as rows
+        # are built. A resumed run starts from the ids already in the
+        # database so that existing rows keep theirs.
+        if RESUME:
+            id_maps = dict(zip(ID_MAP_TABLES, run_parallel(pool, *(
+                (load_id_map, table) for table in ID_MAP_TABLES
+            ))))
+        else:
+            id_maps = {table: {} for table in ID_MAP_TABLES}
+        
+        # Migrate level by level (respecting foreign keys). Tables within a
+        # level are independent, so each runs concurrently on its own pooled
+        # connection and commits as its own transaction.
+        for level in migration_levels():
+            run_parallel(pool, *((MIGRATIONS[table][0], id_maps) for table in level))
+        
+        run_in_pool(pool, create_indexes)
         
         print("\n[3/3] Verification...")
-        results = verify_migration(conn)
+        results = run_in_pool(pool, verify_migration)
         
         print("\n" + "=" * 60)
         print("✅ MIGRATION COMPLETE")
@@ -673,13 +951,15 @@ def main():
         print("3. Verify the application works")
         print("4. Keep MongoDB backup at /app/backups/mongodb_backup/")
         
-        conn.close()
+        pool.closeall()
         return True
-        
+    
     except Exception as e:
         print(f"\n❌ MIGRATION FAILED: {e}")
         print("\nRollback: Your MongoDB data is safe and unchanged.")
         print("Backup location: /app/backups/mongodb_backup/")
+        if not RESUME:
+            print("Tables committed before the failure keep their rows; re-run with --resume.")
         raise
 
 if __name__ == "__main__":
@@ -4,34 +4,83 @@ SchoolCRM Backend API - Supabase Version
 FastAPI backend with Supabase PostgreSQL database
 """
 
-from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, status, UploadFile, File, Form, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+import bcrypt
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
+from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
 import os
 import io
 import csv
+import shutil
 import json
+import orjson
 import hmac
 import hashlib
-from urllib.parse import parse_qs
+from urllib.parse import parse_qsl
 import time
 import asyncio
 import httpx
 import uuid
+from contextlib import asynccontextmanager
+from cachetools import TTLCache
+from aiolimiter import AsyncLimiter
 
 # Load environment variables
 load_dotenv()
 
+# Imported after load_dotenv(): database reads SUPABASE_URL/SUPABASE_KEY on import
+from database import (
+    LOG_QUEUE_MAXSIZE, MAX_PAGE_SIZE, keyset_paginate, page_cursor, run_log_flusher, stop_log_flusher,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Shared HTTP client and background tasks for the lifetime of the app"""
+    # One pooled client for all outgoing calls (Telegram, CBU), so requests
+    # reuse kept-alive TLS connections instead of opening one each time.
+    # HTTP/2 multiplexes concurrent reminder sends over a single connection;
+    # retries=1 only retries failed connection attempts, never a sent request.
+    app.state.http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(10.0, connect=3.0),
+        transport=httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=60.0),
+            retries=1,
+        ),
+    )
+    global _log_queue
+    _log_queue = asyncio.Queue(maxsize=LOG_QUEUE_MAXSIZE)
+    log_flusher_task = asyncio.create_task(run_log_flusher(_log_queue, write_activity_logs))
+    print("[App] Starting reminder scheduler...")
+    reminder_task = asyncio.create_task(reminder_scheduler_loop())
+    print("[App] Starting exchange rate scheduler...")
+    exchange_rate_task = asyncio.create_task(exchange_rate_scheduler_loop())
+    try:
+        yield
+    finally:
+        reminder_task.cancel()
+        exchange_rate_task.cancel()
+        # Write every queued activity log entry before shutting down; entries
+        # logged meanwhile are written directly
+        queue, _log_queue = _log_queue, None
+        await stop_log_flusher(queue, log_flusher_task, write_activity_logs)
+        await app.state.http_client.aclose()
+        supabase_http_client.close()
+
 # App initialization
-app = FastAPI(title="SchoolCRM API", version="4.0.0")
+app = FastAPI(title="SchoolCRM API", version="4.0.0", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -39,23 +88,66 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Add cache control middleware to prevent caching
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 
+# Polled GET endpoints answer with an ETag of the body; the browser always
+# revalidates (no-cache) and an unchanged payload comes back as a bodiless 304,
+# so writes are picked up immediately without any server-side invalidation
+ETAG_PATHS = {
+    "/api/clients",
+    "/api/settings",
+    "/api/statuses",
+    "/api/notifications",
+    "/api/notifications/unread-count",
+    "/api/notifications/telegram-status",
+}
+
+# Headers that describe a body and so are dropped from a bodiless 304
+BODY_HEADERS = {b"content-length", b"content-type", b"content-encoding"}
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header value against an ETag"""
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
 class NoCacheMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
         response = await call_next(request)
-        if request.url.path.startswith("/api/"):
-            response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
-            response.headers["Pragma"] = "no-cache"
-            response.headers["Expires"] = "0"
+        path = request.url.path
+        if not path.startswith("/api/"):
+            return response
+        if request.method == "GET" and path in ETAG_PATHS and response.status_code == 200:
+            body = b"".join([chunk async for chunk in response.body_iterator])
+            # Weak: GZipMiddleware (outside this one) may send the same
+            # payload gzipped or as-is, which are not byte-identical
+            etag = 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+            # Keep every header set further in (CORS, Vary, X-Next-Cursor)
+            raw_headers = response.raw_headers
+            if etag_matches(request.headers.get("if-none-match", ""), etag):
+                response = Response(status_code=304)
+                response.raw_headers = [(k, v) for k, v in raw_headers if k not in BODY_HEADERS]
+            else:
+                response = Response(content=body, status_code=200)
+                response.raw_headers = raw_headers
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        response.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+        response.headers["Pragma"] = "no-cache"
+        response.headers["Expires"] = "0"
         return response
 
 app.add_middleware(NoCacheMiddleware)
 
+# Added last so it is the outermost layer: ETags above are computed on the
+# uncompressed body, and large lists (clients, payments) go out gzipped
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Environment variables
 JWT_SECRET = os.environ.get("JWT_SECRET", "crm_secure_jwt_secret_key_2024")
 JWT_ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
@@ -73,6 +165,13 @@ TELEGRAM_BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
 WEBAPP_URL = os.environ.get("WEBAPP_URL", "https://school-crm-telegram.preview.emergentagent.com")
 # Telegram Mini App URL - should be the URL configured in BotFather
 TELEGRAM_MINIAPP_URL = os.environ.get("TELEGRAM_MINIAPP_URL", WEBAPP_URL)
+# WebApp initData signing key; depends only on the bot token, so derive it once
+TELEGRAM_WEBAPP_SECRET = hmac.new(b"WebAppData", TELEGRAM_BOT_TOKEN.encode(), hashlib.sha256).digest() if TELEGRAM_BOT_TOKEN else None
+# Maximum Telegram sendMessage requests in flight per scheduler run
+TELEGRAM_SEND_CONCURRENCY = 20
+# Bot API limits are ~30 messages/s per bot and 1 message/s per chat; pacing
+# sends below them avoids 429 responses and their Retry-After stalls
+TELEGRAM_MESSAGES_PER_SECOND = 28
 
 # Environment mode
 APP_ENV = os.environ.get("APP_ENV", "development").lower()
@@ -86,19 +185,69 @@ SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# One keep-alive pool for every PostgREST call. db_execute() issues queries
+# from the default thread pool, so the pool allows that many connections
+# and keeps idle ones long enough to be reused between requests. A failed
+# connection attempt is retried once, as for the outgoing HTTP client.
+supabase_http_client = httpx.Client(
+    timeout=httpx.Timeout(30.0, connect=5.0),
+    transport=httpx.HTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=50, keepalive_expiry=60.0),
+        retries=1,
+    ),
+    follow_redirects=True,
+)
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY, options=ClientOptions(httpx_client=supabase_http_client))
+
+async def db_execute(query):
+    """Execute a Supabase query in a worker thread.
+
+    The supabase client is synchronous; running .execute() directly inside an
+    async endpoint would block the event loop for the whole round-trip.
+    """
+    return await asyncio.to_thread(query.execute)
+
+# Keyset pagination for list endpoints (see database.keyset_paginate).
+# Passing ?limit= opts in: the cursor for the next page is returned in the
+# X-Next-Cursor header, so the body stays a plain list for existing callers.
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def paginate_query(query, column: str, limit: Optional[int], cursor: Optional[str], desc: bool = True):
+    """Order a query by (column, id) and, when limit is set, seek past cursor"""
+    if limit is None:
+        return query.order(column, desc=desc).order('id', desc=desc)
+    try:
+        # One look-ahead row tells paginate_rows whether a next page exists
+        return keyset_paginate(query, column, limit + 1, cursor, desc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def paginate_rows(rows: list, column: str, limit: Optional[int], response: Response) -> list:
+    """Trim the look-ahead row and expose the next cursor, if any"""
+    if limit is None or len(rows) <= limit:
+        return rows
+    response.headers[NEXT_CURSOR_HEADER] = page_cursor(rows[limit - 1], column)
+    return rows[:limit]
 
 print(f"[App] Environment: {APP_ENV}")
 print(f"[App] Database: Supabase PostgreSQL")
 print(f"[App] Seeding disabled: {DISABLE_SEED}")
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# New hashes use argon2id; existing bcrypt hashes still verify and are
+# re-hashed to argon2 on the user's next successful login
+password_hasher = PasswordHasher(
+    time_cost=2,
+    memory_cost=19456,  # KiB (19 MiB)
+    parallelism=1,
+)
 security = HTTPBearer()
 
 # Upload directory
 UPLOAD_DIR = "/app/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+AUDIO_COPY_CHUNK_SIZE = 1024 * 1024
 
 # Static files directory for PWA icons
 STATIC_DIR = "/app/backend/static"
@@ -235,11 +384,46 @@ class AdminTelegramLink(BaseModel):
 
 # ==================== HELPER FUNCTIONS ====================
 
+# Postgres SQLSTATE reported by PostgREST when a unique index rejects a write
+UNIQUE_VIOLATION = '23505'
+
+# Columns returned for a user; the password hash is only selected where it is checked
+USER_COLUMNS = 'id,name,email,phone,role,telegram_id,telegram_username,telegram_first_name,telegram_linked_at,created_at'
+
+def is_bcrypt_hash(hashed_password: str) -> bool:
+    return hashed_password.startswith('$2')
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    if is_bcrypt_hash(hashed_password):
+        try:
+            # bcrypt only uses the first 72 bytes, as passlib did
+            return bcrypt.checkpw(plain_password.encode()[:72], hashed_password.encode())
+        except ValueError:
+            return False
+    try:
+        return password_hasher.verify(hashed_password, plain_password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def verify_login_password(user: dict, plain_password: str) -> bool:
+    """Verify a login password, upgrading the stored hash if it is bcrypt or uses old argon2 parameters"""
+    hashed_password = user["password"]
+    if not verify_password(plain_password, hashed_password):
+        return False
+    if is_bcrypt_hash(hashed_password) or password_hasher.check_needs_rehash(hashed_password):
+        supabase.table('users').update({'password': get_password_hash(plain_password)}).eq('id', user["id"]).execute()
+    return True
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return password_hasher.hash(password)
+
+# Hashing is deliberately slow CPU work; async endpoints run it in a worker
+# thread so it does not stall the event loop
+async def averify_login_password(user: dict, plain_password: str) -> bool:
+    return await asyncio.to_thread(verify_login_password, user, plain_password)
+
+async def aget_password_hash(password: str) -> str:
+    return await asyncio.to_thread(get_password_hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -250,8 +434,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 def new_uuid() -> str:
     return str(uuid.uuid4())
 
+# Authenticated users by raw bearer token. An entry lives at most
+# TOKEN_CACHE_TTL seconds and never past the token's own exp; changes to a
+# user drop their entries through invalidate_user_tokens().
+TOKEN_CACHE_TTL = 60
+_token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL)
+
+def invalidate_user_tokens(user_id: str):
+    """Forget cached authentications of a user whose record has changed"""
+    for token, entry in list(_token_cache.items()):
+        if entry['user']['id'] == user_id:
+            _token_cache.pop(token, None)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
+    cached = _token_cache.get(token)
+    if cached and cached['exp'] > time.time():
+        return dict(cached['user'])
+    
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
         user_id = payload.get("sub")
@@ -260,17 +460,30 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    result = supabase.table('users').select('*').eq('id', user_id).limit(1).execute()
+    result = await db_execute(supabase.table('users').select(USER_COLUMNS).eq('id', user_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=401, detail="User not found")
     
     user = result.data[0]
-    del user['password']
-    return user
+    _token_cache[token] = {'exp': payload.get('exp', 0), 'user': user}
+    return dict(user)
+
+# Activity log entries are buffered and written in batches off the request
+# path by database.run_log_flusher (started in lifespan)
+_log_queue: Optional[asyncio.Queue] = None
+
+def insert_activity_logs(entries: list):
+    """Write activity log entries in a single request"""
+    if entries:
+        supabase.table('activity_log').insert(entries).execute()
 
-def log_activity(user_id: str, user_name: str, action: str, entity_type: str, entity_id: str, details: dict = None):
-    """Log activity for audit trail"""
-    supabase.table('activity_log').insert({
+async def write_activity_logs(entries: list):
+    """insert_activity_logs() in a worker thread"""
+    await asyncio.to_thread(insert_activity_logs, entries)
+
+async def log_activity(user_id: str, user_name: str, action: str, entity_type: str, entity_id: str, details: dict = None):
+    """Log activity for audit trail (queued for the background batch writer)"""
+    entry = {
         'id': new_uuid(),
         'user_id': user_id,
         'user_name': user_name,
@@ -279,38 +492,78 @@ def log_activity(user_id: str, user_name: str, action: str, entity_type: str, en
         'entity_id': entity_id,
         'details': details or {},
         'created_at': datetime.now(timezone.utc).isoformat()
-    }).execute()
-
-def get_system_currency():
+    }
+    if _log_queue is not None:
+        try:
+            _log_queue.put_nowait(entry)
+            return
+        except asyncio.QueueFull:
+            pass
+    # Flusher not running (or backed up): write directly, off the event loop
+    await write_activity_logs([entry])
+
+# The system settings `data` JSON. Every settings write in this process calls
+# invalidate_settings_cache(); the TTL bounds staleness across workers.
+SETTINGS_CACHE_TTL = 60
+_settings_cache = TTLCache(maxsize=1, ttl=SETTINGS_CACHE_TTL)
+
+def invalidate_settings_cache():
+    _settings_cache.clear()
+
+async def get_system_settings_data() -> dict:
+    """Get the `data` JSON of the system settings row"""
+    data = _settings_cache.get('data')
+    if data is None:
+        result = await db_execute(supabase.table('settings').select('data').eq('key', 'system').limit(1))
+        data = result.data[0].get('data') if result.data else None
+        if not isinstance(data, dict):
+            data = {}
+        _settings_cache['data'] = data
+    return data
+
+# Small, rarely written tables read by many endpoints. Each handler that
+# writes one of them calls invalidate_catalog() for that table.
+CATALOG_CACHE_TTL = 30
+_catalog_cache = TTLCache(maxsize=8, ttl=CATALOG_CACHE_TTL)
+CATALOG_QUERIES = {
+    'tariffs': lambda: supabase.table('tariffs').select('*').order('created_at', desc=True),
+    'groups': lambda: supabase.table('groups').select('*').order('name'),
+    'statuses': lambda: supabase.table('statuses').select('*').order('sort_order'),
+    'users': lambda: supabase.table('users').select(USER_COLUMNS).order('created_at', desc=True),
+}
+
+async def get_catalog(table: str) -> list:
+    """Cached rows of a catalog table; the rows are shared, copy before modifying"""
+    rows = _catalog_cache.get(table)
+    if rows is None:
+        rows = (await db_execute(CATALOG_QUERIES[table]())).data or []
+        _catalog_cache[table] = rows
+    return rows
+
+def invalidate_catalog(table: str):
+    _catalog_cache.pop(table, None)
+
+async def get_system_currency():
     """Get the system currency setting"""
-    result = supabase.table('settings').select('*').eq('key', 'system').limit(1).execute()
-    if result.data:
-        data = result.data[0].get('data', {})
-        return data.get('currency', 'USD') if isinstance(data, dict) else 'USD'
-    return "USD"
+    return (await get_system_settings_data()).get('currency', 'USD')
 
-def get_exchange_rates():
+async def get_exchange_rates():
     """Get exchange rates from settings"""
-    result = supabase.table('settings').select('*').eq('key', 'system').limit(1).execute()
-    if result.data:
-        data = result.data[0].get('data', {})
-        if isinstance(data, dict):
-            return data.get('exchange_rates', {'USD': 12500, 'EUR': 13500})
-    return {'USD': 12500, 'EUR': 13500}  # Default rates
+    rates = (await get_system_settings_data()).get('exchange_rates', {'USD': 12500, 'EUR': 13500})  # Default rates
+    # Copy so callers cannot mutate the cached value
+    return dict(rates)
 
-def convert_to_uzs(amount: float, currency: str) -> float:
-    """Convert amount from given currency to UZS"""
+def convert_to_uzs(amount: float, currency: str, rates: dict) -> float:
+    """Convert amount from given currency to UZS using rates from get_exchange_rates()"""
     if currency == 'UZS':
         return amount
-    rates = get_exchange_rates()
     rate = rates.get(currency, 1)
     return amount * rate
 
-def convert_from_uzs(amount: float, target_currency: str) -> float:
-    """Convert amount from UZS to target currency"""
+def convert_from_uzs(amount: float, target_currency: str, rates: dict) -> float:
+    """Convert amount from UZS to target currency using rates from get_exchange_rates()"""
     if target_currency == 'UZS':
         return amount
-    rates = get_exchange_rates()
     rate = rates.get(target_currency, 1)
     if rate == 0:
         return amount
@@ -328,6 +581,16 @@ def format_currency(amount: float, currency: str = 'UZS') -> str:
 
 # ==================== TELEGRAM NOTIFICATION SYSTEM ====================
 
+_telegram_limiter = AsyncLimiter(TELEGRAM_MESSAGES_PER_SECOND, 1)
+# Per-chat limiters; idle chats are dropped after a minute
+_telegram_chat_limiters = TTLCache(maxsize=10_000, ttl=60)
+
+def get_telegram_chat_limiter(chat_id: str) -> AsyncLimiter:
+    limiter = _telegram_chat_limiters.get(chat_id)
+    if limiter is None:
+        limiter = _telegram_chat_limiters[chat_id] = AsyncLimiter(1, 1)
+    return limiter
+
 async def send_telegram_message(chat_id: str, text: str, reply_markup: dict = None):
     """Send a message via Telegram Bot API"""
     if not TELEGRAM_BOT_TOKEN:
@@ -337,25 +600,29 @@ async def send_telegram_message(chat_id: str, text: str, reply_markup: dict = No
     url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
     if reply_markup:
-        payload["reply_markup"] = json.dumps(reply_markup)
+        # A JSON body can carry reply_markup as a nested object
+        payload["reply_markup"] = reply_markup
     
+    body = orjson.dumps(payload)
+    chat_limiter = get_telegram_chat_limiter(chat_id)
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, timeout=10.0)
-            return response.status_code == 200
+        for attempt in range(2):
+            # Wait for the chat's slot before taking one from the bot-wide budget
+            async with chat_limiter, _telegram_limiter:
+                response = await app.state.http_client.post(
+                    url, content=body, headers={"Content-Type": "application/json"}
+                )
+            if response.status_code != 429 or attempt:
+                break
+            # Rate limited anyway: wait as long as Telegram asks, then retry once
+            retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+            await asyncio.sleep(retry_after)
+        return response.status_code == 200
     except Exception as e:
         print(f"Error sending Telegram message: {e}")
         return False
 
-def format_reminder_message(client_name: str, client_phone: str, reminder_text: str, remind_at: str, client_id: str) -> tuple:
-    """Format reminder message for Telegram with Mini App button"""
-    try:
-        dt = datetime.fromisoformat(remind_at.replace('Z', '+00:00'))
-        formatted_time = dt.strftime("%d.%m.%Y %H:%M")
-    except:
-        formatted_time = remind_at
-    
-    message = f"""🔔 <b>Eslatma!</b>
+REMINDER_MESSAGE_TEMPLATE = """🔔 <b>Eslatma!</b>
 
 👤 <b>Mijoz:</b> {client_name}
 📞 <b>Telefon:</b> <code>{client_phone}</code>
@@ -363,16 +630,34 @@ def format_reminder_message(client_name: str, client_phone: str, reminder_text:
 ⏰ <b>Vaqt:</b> {formatted_time}
 
 <i>Telefon raqamini bosib nusxalang va qo'ng'iroq qiling</i>"""
+
+# Mini App deep link prefix; the client id is appended per reminder
+MINIAPP_CLIENT_URL_PREFIX = f"{TELEGRAM_MINIAPP_URL}/clients/"
+
+def format_reminder_message(client_name: str, client_phone: str, reminder_text: str, remind_at: str, client_id: str) -> tuple:
+    """Format reminder message for Telegram with Mini App button"""
+    try:
+        # Supabase returns +00:00 offsets; only a trailing Z needs rewriting
+        if remind_at.endswith('Z'):
+            remind_at = remind_at[:-1] + '+00:00'
+        formatted_time = datetime.fromisoformat(remind_at).strftime("%d.%m.%Y %H:%M")
+    except:
+        formatted_time = remind_at
+    
+    message = REMINDER_MESSAGE_TEMPLATE.format_map({
+        "client_name": client_name,
+        "client_phone": client_phone,
+        "reminder_text": reminder_text,
+        "formatted_time": formatted_time,
+    })
     
     # Use web_app button to open Mini App inside Telegram
     # Pass client_id as URL parameter for deep linking
-    miniapp_url = f"{TELEGRAM_MINIAPP_URL}/clients/{client_id}"
-    
     reply_markup = {
         "inline_keyboard": [[
             {
                 "text": "📱 CRM da ochish",
-                "web_app": {"url": miniapp_url}
+                "web_app": {"url": MINIAPP_CLIENT_URL_PREFIX + client_id}
             }
         ]]
     }
@@ -385,32 +670,45 @@ async def check_and_send_telegram_reminders():
     now = datetime.now(timezone.utc).isoformat()
     
     # Find due reminders that haven't been sent
-    result = supabase.table('reminders').select('*').lt('remind_at', now).eq('is_completed', False).eq('telegram_sent', False).execute()
+    result = await db_execute(supabase.table('reminders').select('id,user_id,client_id,text,remind_at').lt('remind_at', now).eq('is_completed', False).eq('telegram_sent', False))
     due_reminders = result.data or []
+    if not due_reminders:
+        return 0
+    
+    # Load every referenced user and client in one query each
+    user_ids = list({r['user_id'] for r in due_reminders if r.get('user_id')})
+    client_ids = list({r['client_id'] for r in due_reminders if r.get('client_id')})
+    users_by_id = {}
+    if user_ids:
+        users_result = await db_execute(supabase.table('users').select('id,name,telegram_id').in_('id', user_ids))
+        users_by_id = {u['id']: u for u in users_result.data or []}
+    clients_by_id = {}
+    if client_ids:
+        clients_result = await db_execute(supabase.table('clients').select('id,name,phone').in_('id', client_ids))
+        clients_by_id = {c['id']: c for c in clients_result.data or []}
     
-    sent_count = 0
+    # Reminders whose user has no linked Telegram account are closed without sending
+    skipped_ids = []
+    eligible = []
     for reminder in due_reminders:
-        # Get user
-        user_result = supabase.table('users').select('*').eq('id', reminder['user_id']).limit(1).execute()
-        if not user_result.data:
+        user = users_by_id.get(reminder['user_id'])
+        if not user:
             continue
-        user = user_result.data[0]
         
-        telegram_id = user.get('telegram_id')
-        if not telegram_id:
-            supabase.table('reminders').update({
-                'telegram_sent': True,
-                'telegram_sent_at': now,
-                'telegram_success': False
-            }).eq('id', reminder['id']).execute()
+        if not user.get('telegram_id'):
+            skipped_ids.append(reminder['id'])
             continue
         
-        # Get client
-        client_result = supabase.table('clients').select('*').eq('id', reminder['client_id']).limit(1).execute()
-        if not client_result.data:
+        client = clients_by_id.get(reminder['client_id'])
+        if not client:
             continue
-        client = client_result.data[0]
-        
+        eligible.append((reminder, user, client))
+    
+    # Send concurrently over the shared keep-alive pool, at most
+    # TELEGRAM_SEND_CONCURRENCY requests in flight
+    semaphore = asyncio.Semaphore(TELEGRAM_SEND_CONCURRENCY)
+    
+    async def send(reminder, user, client):
         message, reply_markup = format_reminder_message(
             client.get('name', 'Unknown'),
             client.get('phone', 'N/A'),
@@ -418,18 +716,32 @@ async def check_and_send_telegram_reminders():
             reminder.get('remind_at', ''),
             client['id']
         )
-        
-        success = await send_telegram_message(telegram_id, message, reply_markup)
-        
-        supabase.table('reminders').update({
-            'telegram_sent': True,
-            'telegram_sent_at': datetime.now(timezone.utc).isoformat(),
-            'telegram_success': success
-        }).eq('id', reminder['id']).execute()
-        
+        async with semaphore:
+            success = await send_telegram_message(user['telegram_id'], message, reply_markup)
         if success:
-            sent_count += 1
             print(f"  ✓ Sent reminder to {user.get('name')}")
+        return success
+    
+    results = await asyncio.gather(*(send(*item) for item in eligible), return_exceptions=True)
+    success_ids = []
+    failure_ids = []
+    for (reminder, _, _), success in zip(eligible, results):
+        (success_ids if success is True else failure_ids).append(reminder['id'])
+    sent_count = len(success_ids)
+    
+    # One IN-list update per outcome instead of one update per reminder
+    sent_at = datetime.now(timezone.utc).isoformat()
+    for ids, sent_ts, success in (
+        (skipped_ids, now, False),
+        (success_ids, sent_at, True),
+        (failure_ids, sent_at, False),
+    ):
+        if ids:
+            await db_execute(supabase.table('reminders').update({
+                'telegram_sent': True,
+                'telegram_sent_at': sent_ts,
+                'telegram_success': success
+            }).in_('id', ids))
     
     if sent_count > 0:
         print(f"[{datetime.now().isoformat()}] Sent {sent_count} Telegram reminder(s)")
@@ -437,40 +749,91 @@ async def check_and_send_telegram_reminders():
 
 # Background scheduler
 reminder_scheduler_running = False
+# Upper bound between scans; catches reminders written by other processes
+REMINDER_SAFETY_POLL_SECONDS = 300
+# Earliest known due time the scheduler sleeps until: set from the database
+# after each scan and only ever lowered in between, so it is one value rather
+# than an entry per reminder or per scan
+_reminder_next_due: Optional[float] = None
+_reminder_wake = None
+
+def iso_to_timestamp(value: str) -> Optional[float]:
+    """Parse an ISO 8601 string to a POSIX timestamp; naive values are UTC"""
+    try:
+        if value.endswith('Z'):
+            value = value[:-1] + '+00:00'
+        dt = datetime.fromisoformat(value)
+    except (AttributeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+def schedule_reminder_wakeup(remind_at: str):
+    """Make the scheduler wake up when a created or rescheduled reminder is due"""
+    global _reminder_next_due
+    due = iso_to_timestamp(remind_at)
+    if due is None or (_reminder_next_due is not None and _reminder_next_due <= due):
+        return
+    _reminder_next_due = due
+    if _reminder_wake is not None:
+        _reminder_wake.set()
+
+def get_next_reminder_due(after: str) -> Optional[float]:
+    """Timestamp of the earliest unsent reminder due after `after`"""
+    result = supabase.table('reminders').select('remind_at').gte('remind_at', after).eq('is_completed', False).eq('telegram_sent', False).order('remind_at').limit(1).execute()
+    return iso_to_timestamp(result.data[0]['remind_at']) if result.data else None
 
 async def reminder_scheduler_loop():
-    """Background loop that checks reminders every minute"""
-    global reminder_scheduler_running
+    """Background loop that sends reminders as they become due"""
+    global reminder_scheduler_running, _reminder_wake, _reminder_next_due
     reminder_scheduler_running = True
+    _reminder_wake = asyncio.Event()
     print("[Reminder Scheduler] Started")
     
+    next_scan = 0.0
     while reminder_scheduler_running:
+        now = time.time()
+        if now >= next_scan or (_reminder_next_due is not None and _reminder_next_due <= now):
+            # A scan sends everything due; reminders scheduled while it runs
+            # lower _reminder_next_due again and are kept below
+            _reminder_next_due = None
+            try:
+                await check_and_send_telegram_reminders()
+                next_due = await asyncio.to_thread(get_next_reminder_due, datetime.fromtimestamp(now, timezone.utc).isoformat())
+                if next_due is not None and (_reminder_next_due is None or next_due < _reminder_next_due):
+                    _reminder_next_due = next_due
+            except Exception as e:
+                print(f"[Reminder Scheduler] Error: {e}")
+            next_scan = time.time() + REMINDER_SAFETY_POLL_SECONDS
+        
+        # Sleep until the next known due time, the safety poll, or a new reminder
+        wake_at = min(next_scan, _reminder_next_due) if _reminder_next_due is not None else next_scan
+        _reminder_wake.clear()
         try:
-            await check_and_send_telegram_reminders()
-        except Exception as e:
-            print(f"[Reminder Scheduler] Error: {e}")
-        await asyncio.sleep(60)
+            await asyncio.wait_for(_reminder_wake.wait(), timeout=max(wake_at - time.time(), 0))
+        except asyncio.TimeoutError:
+            pass
 
 # ==================== EXCHANGE RATE SCHEDULER ====================
 
 async def fetch_exchange_rate_from_cbu():
     """Fetch USD→UZS rate from Central Bank of Uzbekistan"""
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get("https://cbu.uz/uz/arkhiv-kursov-valyut/json/")
-            if response.status_code == 200:
-                data = response.json()
-                # Find USD rate
-                for currency in data:
-                    if currency.get('Ccy') == 'USD':
-                        rate = float(currency.get('Rate', 0))
-                        if rate > 0:
-                            return {
-                                'rate': rate,
-                                'source': 'CBU',
-                                'date': currency.get('Date'),
-                                'nominal': int(currency.get('Nominal', 1))
-                            }
+        response = await app.state.http_client.get("https://cbu.uz/uz/arkhiv-kursov-valyut/json/")
+        if response.status_code == 200:
+            data = response.json()
+            # Find USD rate
+            for currency in data:
+                if currency.get('Ccy') == 'USD':
+                    rate = float(currency.get('Rate', 0))
+                    if rate > 0:
+                        return {
+                            'rate': rate,
+                            'source': 'CBU',
+                            'date': currency.get('Date'),
+                            'nominal': int(currency.get('Nominal', 1))
+                        }
         return None
     except Exception as e:
         print(f"[Exchange Rate] CBU API error: {e}")
@@ -486,7 +849,7 @@ async def fetch_and_save_exchange_rate():
             rate = rate_data['rate']
             
             # Get current settings
-            settings = supabase.table('settings').select('*').eq('key', 'system').limit(1).execute()
+            settings = await db_execute(supabase.table('settings').select('*').eq('key', 'system').limit(1))
             
             if settings.data:
                 current_data = settings.data[0].get('data', {})
@@ -496,15 +859,16 @@ async def fetch_and_save_exchange_rate():
                 exchange_rates['source'] = rate_data['source']
                 
                 # Update settings - use 'data' column which is JSONB
-                supabase.table('settings').update({
+                await db_execute(supabase.table('settings').update({
                     'data': {**current_data, 'exchange_rates': exchange_rates}
-                }).eq('key', 'system').execute()
+                }).eq('key', 'system'))
                 
+                invalidate_settings_cache()
                 print(f"[Exchange Rate] Updated: 1 USD = {rate} UZS (source: {rate_data['source']})")
                 return rate
             else:
                 # Create settings if not exists
-                supabase.table('settings').insert({
+                await db_execute(supabase.table('settings').insert({
                     'id': new_uuid(),
                     'key': 'system',
                     'currency': 'UZS',
@@ -515,7 +879,8 @@ async def fetch_and_save_exchange_rate():
                             'source': rate_data['source']
                         }
                     }
-                }).execute()
+                }))
+                invalidate_settings_cache()
                 print(f"[Exchange Rate] Created settings with rate: 1 USD = {rate} UZS")
                 return rate
         else:
@@ -544,14 +909,6 @@ async def exchange_rate_scheduler_loop():
             print(f"[Exchange Rate Scheduler] Error: {e}")
             await asyncio.sleep(3600)  # Retry in 1 hour on error
 
-@app.on_event("startup")
-async def startup_event():
-    """Start background tasks on app startup"""
-    print("[App] Starting reminder scheduler...")
-    asyncio.create_task(reminder_scheduler_loop())
-    print("[App] Starting exchange rate scheduler...")
-    asyncio.create_task(exchange_rate_scheduler_loop())
-
 # ==================== TELEGRAM AUTH ====================
 
 def validate_telegram_init_data(init_data: str, bot_token: str) -> dict:
@@ -560,8 +917,7 @@ def validate_telegram_init_data(init_data: str, bot_token: str) -> dict:
         raise ValueError("TELEGRAM_BOT_TOKEN not configured")
     
     try:
-        parsed = dict(parse_qs(init_data, keep_blank_values=True))
-        parsed = {k: v[0] for k, v in parsed.items()}
+        parsed = dict(parse_qsl(init_data, keep_blank_values=True))
     except Exception:
         raise ValueError("Invalid initData format")
     
@@ -569,17 +925,24 @@ def validate_telegram_init_data(init_data: str, bot_token: str) -> dict:
     if not received_hash:
         raise ValueError("Hash not found")
     
+    # Reject stale data before spending an HMAC on it
+    try:
+        auth_date = int(parsed.get('auth_date', 0))
+    except ValueError:
+        raise ValueError("Invalid auth_date")
+    if time.time() - auth_date > 86400:
+        raise ValueError("Auth data expired")
+    
     data_check_string = '\n'.join(f"{k}={v}" for k, v in sorted(parsed.items()))
-    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    if bot_token == TELEGRAM_BOT_TOKEN:
+        secret_key = TELEGRAM_WEBAPP_SECRET
+    else:
+        secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
     calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
     
     if not hmac.compare_digest(calculated_hash, received_hash):
         raise ValueError("Invalid hash")
     
-    auth_date = int(parsed.get('auth_date', 0))
-    if time.time() - auth_date > 86400:
-        raise ValueError("Auth data expired")
-    
     user_json = parsed.get('user', '{}')
     try:
         user_data = json.loads(user_json)
@@ -607,10 +970,8 @@ async def database_status(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    counts = {}
-    for table in ['users', 'clients', 'payments', 'reminders', 'notes', 'statuses', 'groups', 'tariffs']:
-        result = supabase.table(table).select('count', count='exact').execute()
-        counts[table] = result.count or 0
+    # All table counts in a single round trip
+    counts = (await db_execute(supabase.rpc('get_table_counts'))).data or {}
     
     return {
         "environment": APP_ENV,
@@ -625,12 +986,12 @@ async def database_status(current_user: dict = Depends(get_current_user)):
 
 @app.post("/api/auth/login")
 async def login(data: UserLogin):
-    result = supabase.table('users').select('*').eq('email', data.email).limit(1).execute()
+    result = await db_execute(supabase.table('users').select(f'{USER_COLUMNS},password').eq('email', data.email).limit(1))
     if not result.data:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     user = result.data[0]
-    if not verify_password(data.password, user["password"]):
+    if not await averify_login_password(user, data.password):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     token = create_access_token({"sub": user["id"], "role": user["role"]})
@@ -645,14 +1006,16 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 async def update_profile(data: UserUpdate, current_user: dict = Depends(get_current_user)):
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     if "password" in update_data:
-        update_data["password"] = get_password_hash(update_data["password"])
+        update_data["password"] = await aget_password_hash(update_data["password"])
     if update_data:
-        supabase.table('users').update(update_data).eq('id', current_user["id"]).execute()
-        log_activity(current_user["id"], current_user["name"], "update", "user", current_user["id"], {"fields": list(update_data.keys())})
-    
-    result = supabase.table('users').select('*').eq('id', current_user["id"]).limit(1).execute()
+        result = await db_execute(supabase.table('users').update(update_data).eq('id', current_user["id"]))
+        invalidate_user_tokens(current_user["id"])
+        invalidate_catalog('users')
+        await log_activity(current_user["id"], current_user["name"], "update", "user", current_user["id"], {"fields": list(update_data.keys())})
+    else:
+        result = await db_execute(supabase.table('users').select(USER_COLUMNS).eq('id', current_user["id"]).limit(1))
     user = result.data[0]
-    del user["password"]
+    user.pop("password", None)
     return user
 
 @app.post("/api/auth/telegram")
@@ -667,7 +1030,7 @@ async def telegram_auth(data: TelegramAuthRequest):
     if not telegram_id:
         raise HTTPException(status_code=401, detail="No Telegram user ID")
     
-    result = supabase.table('users').select('*').eq('telegram_id', telegram_id).limit(1).execute()
+    result = await db_execute(supabase.table('users').select(USER_COLUMNS).eq('telegram_id', telegram_id).limit(1))
     
     if not result.data:
         return {
@@ -683,7 +1046,6 @@ async def telegram_auth(data: TelegramAuthRequest):
     
     user = result.data[0]
     token = create_access_token({"sub": user["id"], "role": user["role"]})
-    del user["password"]
     
     return {"status": "success", "token": token, "user": user}
 
@@ -697,30 +1059,32 @@ async def link_telegram_account(data: TelegramLinkRequest):
     
     telegram_id = str(tg_user.get('id'))
     
-    result = supabase.table('users').select('*').eq('email', data.email).limit(1).execute()
-    if not result.data or not verify_password(data.password, result.data[0]["password"]):
+    result = await db_execute(supabase.table('users').select('id,role,password').eq('email', data.email).limit(1))
+    if not result.data or not await averify_login_password(result.data[0], data.password):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
-    user = result.data[0]
-    
-    existing = supabase.table('users').select('*').eq('telegram_id', telegram_id).limit(1).execute()
-    if existing.data and existing.data[0]["id"] != user["id"]:
-        raise HTTPException(status_code=400, detail="Telegram account already linked to another user")
-    
-    supabase.table('users').update({
-        'telegram_id': telegram_id,
-        'telegram_username': tg_user.get('username', ''),
-        'telegram_first_name': tg_user.get('first_name', ''),
-        'telegram_linked_at': datetime.now(timezone.utc).isoformat()
-    }).eq('id', user["id"]).execute()
+    user_id = result.data[0]["id"]
     
-    token = create_access_token({"sub": user["id"], "role": user["role"]})
+    # The unique index on telegram_id rejects an account linked to another user
+    try:
+        result = await db_execute(supabase.table('users').update({
+            'telegram_id': telegram_id,
+            'telegram_username': tg_user.get('username', ''),
+            'telegram_first_name': tg_user.get('first_name', ''),
+            'telegram_linked_at': datetime.now(timezone.utc).isoformat()
+        }).eq('id', user_id))
+    except APIError as e:
+        if e.code == UNIQUE_VIOLATION:
+            raise HTTPException(status_code=400, detail="Telegram account already linked to another user")
+        raise
+    invalidate_user_tokens(user_id)
+    invalidate_catalog('users')
     
-    result = supabase.table('users').select('*').eq('id', user["id"]).limit(1).execute()
     user = result.data[0]
-    del user["password"]
+    user.pop("password", None)
+    token = create_access_token({"sub": user["id"], "role": user["role"]})
     
-    log_activity(user["id"], user["name"], "link_telegram", "user", user["id"], {"telegram_id": telegram_id})
+    await log_activity(user["id"], user["name"], "link_telegram", "user", user["id"], {"telegram_id": telegram_id})
     
     return {"status": "success", "token": token, "user": user}
 
@@ -730,7 +1094,7 @@ async def admin_unlink_telegram(user_id: str, current_user: dict = Depends(get_c
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    result = supabase.table('users').select('*').eq('id', user_id).limit(1).execute()
+    result = await db_execute(supabase.table('users').select('id,name,telegram_id').eq('id', user_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -740,14 +1104,16 @@ async def admin_unlink_telegram(user_id: str, current_user: dict = Depends(get_c
     
     old_telegram_id = user.get("telegram_id")
     
-    supabase.table('users').update({
+    await db_execute(supabase.table('users').update({
         'telegram_id': None,
         'telegram_username': None,
         'telegram_first_name': None,
         'telegram_linked_at': None
-    }).eq('id', user_id).execute()
+    }).eq('id', user_id))
+    invalidate_user_tokens(user_id)
+    invalidate_catalog('users')
     
-    log_activity(current_user["id"], current_user["name"], "unlink_telegram", "user", user_id,
+    await log_activity(current_user["id"], current_user["name"], "unlink_telegram", "user", user_id,
                 {"telegram_id": old_telegram_id, "user_name": user.get("name")})
     
     return {"message": f"Telegram account unlinked from {user.get('name')}"}
@@ -758,21 +1124,25 @@ async def admin_link_telegram(user_id: str, data: AdminTelegramLink, current_use
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    result = supabase.table('users').select('*').eq('id', user_id).limit(1).execute()
+    try:
+        result = await db_execute(supabase.table('users').update({
+            'telegram_id': data.telegram_id,
+            'telegram_username': data.telegram_username,
+            'telegram_linked_at': datetime.now(timezone.utc).isoformat()
+        }).eq('id', user_id))
+    except APIError as e:
+        if e.code != UNIQUE_VIOLATION:
+            raise
+        # Only the conflict path needs to know who holds the Telegram ID
+        existing = await db_execute(supabase.table('users').select('name').eq('telegram_id', data.telegram_id).limit(1))
+        holder = existing.data[0].get('name') if existing.data else None
+        raise HTTPException(status_code=400, detail=f"Telegram ID already linked to: {holder}")
     if not result.data:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_user_tokens(user_id)
+    invalidate_catalog('users')
     
-    existing = supabase.table('users').select('*').eq('telegram_id', data.telegram_id).limit(1).execute()
-    if existing.data and existing.data[0]["id"] != user_id:
-        raise HTTPException(status_code=400, detail=f"Telegram ID already linked to: {existing.data[0].get('name')}")
-    
-    supabase.table('users').update({
-        'telegram_id': data.telegram_id,
-        'telegram_username': data.telegram_username,
-        'telegram_linked_at': datetime.now(timezone.utc).isoformat()
-    }).eq('id', user_id).execute()
-    
-    log_activity(current_user["id"], current_user["name"], "admin_link_telegram", "user", user_id,
+    await log_activity(current_user["id"], current_user["name"], "admin_link_telegram", "user", user_id,
                 {"telegram_id": data.telegram_id})
     
     return {"message": f"Telegram account linked to {result.data[0].get('name')}"}
@@ -784,19 +1154,14 @@ async def get_users(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    result = supabase.table('users').select('*').order('created_at', desc=True).execute()
-    users = []
-    for u in result.data:
-        del u['password']
-        users.append(u)
-    return users
+    return await get_catalog('users')
 
 @app.post("/api/users")
 async def create_user(data: UserCreate, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    existing = supabase.table('users').select('*').eq('email', data.email).limit(1).execute()
+    existing = await db_execute(supabase.table('users').select('id').eq('email', data.email).limit(1))
     if existing.data:
         raise HTTPException(status_code=400, detail="Email already exists")
     
@@ -806,14 +1171,14 @@ async def create_user(data: UserCreate, current_user: dict = Depends(get_current
         'name': data.name,
         'email': data.email,
         'phone': data.phone,
-        'password': get_password_hash(data.password),
+        'password': await aget_password_hash(data.password),
         'role': data.role,
         'created_at': datetime.now(timezone.utc).isoformat()
     }
-    supabase.table('users').insert(user_doc).execute()
-    log_activity(current_user["id"], current_user["name"], "create", "user", user_id, {"email": data.email})
+    result = await db_execute(supabase.table('users').insert(user_doc))
+    invalidate_catalog('users')
+    await log_activity(current_user["id"], current_user["name"], "create", "user", user_id, {"email": data.email})
     
-    result = supabase.table('users').select('*').eq('id', user_id).limit(1).execute()
     user = result.data[0]
     del user['password']
     return user
@@ -825,16 +1190,18 @@ async def update_user(user_id: str, data: UserUpdate, current_user: dict = Depen
     
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     if "password" in update_data:
-        update_data["password"] = get_password_hash(update_data["password"])
+        update_data["password"] = await aget_password_hash(update_data["password"])
     if update_data:
-        supabase.table('users').update(update_data).eq('id', user_id).execute()
-        log_activity(current_user["id"], current_user["name"], "update", "user", user_id, {"fields": list(update_data.keys())})
-    
-    result = supabase.table('users').select('*').eq('id', user_id).limit(1).execute()
+        result = await db_execute(supabase.table('users').update(update_data).eq('id', user_id))
+        invalidate_user_tokens(user_id)
+        invalidate_catalog('users')
+        await log_activity(current_user["id"], current_user["name"], "update", "user", user_id, {"fields": list(update_data.keys())})
+    else:
+        result = await db_execute(supabase.table('users').select(USER_COLUMNS).eq('id', user_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=404, detail="User not found")
     user = result.data[0]
-    del user['password']
+    user.pop('password', None)
     return user
 
 @app.delete("/api/users/{user_id}")
@@ -844,26 +1211,27 @@ async def delete_user(user_id: str, current_user: dict = Depends(get_current_use
     if user_id == current_user["id"]:
         raise HTTPException(status_code=400, detail="Cannot delete yourself")
     
-    result = supabase.table('users').select('*').eq('id', user_id).limit(1).execute()
+    result = await db_execute(supabase.table('users').delete().eq('id', user_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="User not found")
     
-    supabase.table('users').delete().eq('id', user_id).execute()
-    log_activity(current_user["id"], current_user["name"], "delete", "user", user_id, {})
+    invalidate_user_tokens(user_id)
+    invalidate_catalog('users')
+    await log_activity(current_user["id"], current_user["name"], "delete", "user", user_id, {})
     return {"message": "User deleted"}
 
 # ==================== TARIFFS ENDPOINTS ====================
 
 @app.get("/api/tariffs")
 async def get_tariffs(current_user: dict = Depends(get_current_user)):
-    result = supabase.table('tariffs').select('*').order('created_at', desc=True).execute()
-    tariffs = result.data or []
+    tariffs = [dict(tariff) for tariff in await get_catalog('tariffs')]
+    rates = await get_exchange_rates()
     
     # Add converted price in UZS for each tariff
     for tariff in tariffs:
         original_price = tariff.get('price', 0)
         original_currency = tariff.get('currency', 'UZS')
-        tariff['price_uzs'] = convert_to_uzs(original_price, original_currency)
+        tariff['price_uzs'] = convert_to_uzs(original_price, original_currency, rates)
         tariff['price_formatted'] = format_currency(original_price, original_currency)
         tariff['price_uzs_formatted'] = format_currency(tariff['price_uzs'], 'UZS')
     
@@ -883,10 +1251,10 @@ async def create_tariff(data: TariffCreate, current_user: dict = Depends(get_cur
         'description': data.description,
         'created_at': datetime.now(timezone.utc).isoformat()
     }
-    supabase.table('tariffs').insert(tariff_doc).execute()
-    log_activity(current_user["id"], current_user["name"], "create", "tariff", tariff_id, {"name": data.name})
+    result = await db_execute(supabase.table('tariffs').insert(tariff_doc))
+    invalidate_catalog('tariffs')
+    await log_activity(current_user["id"], current_user["name"], "create", "tariff", tariff_id, {"name": data.name})
     
-    result = supabase.table('tariffs').select('*').eq('id', tariff_id).limit(1).execute()
     return result.data[0]
 
 @app.put("/api/tariffs/{tariff_id}")
@@ -896,10 +1264,11 @@ async def update_tariff(tariff_id: str, data: TariffUpdate, current_user: dict =
     
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     if update_data:
-        supabase.table('tariffs').update(update_data).eq('id', tariff_id).execute()
-        log_activity(current_user["id"], current_user["name"], "update", "tariff", tariff_id, update_data)
-    
-    result = supabase.table('tariffs').select('*').eq('id', tariff_id).limit(1).execute()
+        result = await db_execute(supabase.table('tariffs').update(update_data).eq('id', tariff_id))
+        invalidate_catalog('tariffs')
+        await log_activity(current_user["id"], current_user["name"], "update", "tariff", tariff_id, update_data)
+    else:
+        result = await db_execute(supabase.table('tariffs').select('*').eq('id', tariff_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=404, detail="Tariff not found")
     return result.data[0]
@@ -910,31 +1279,29 @@ async def delete_tariff(tariff_id: str, current_user: dict = Depends(get_current
         raise HTTPException(status_code=403, detail="Admin access required")
     
     # Check if in use
-    clients = supabase.table('clients').select('count', count='exact').eq('tariff_id', tariff_id).execute()
+    clients = await db_execute(supabase.table('clients').select('count', count='exact').eq('tariff_id', tariff_id))
     if clients.count > 0:
         raise HTTPException(status_code=400, detail="Tariff is in use by clients")
     
-    result = supabase.table('tariffs').select('*').eq('id', tariff_id).limit(1).execute()
+    result = await db_execute(supabase.table('tariffs').delete().eq('id', tariff_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Tariff not found")
-    
-    supabase.table('tariffs').delete().eq('id', tariff_id).execute()
-    log_activity(current_user["id"], current_user["name"], "delete", "tariff", tariff_id, {})
+    invalidate_catalog('tariffs')
+    await log_activity(current_user["id"], current_user["name"], "delete", "tariff", tariff_id, {})
     return {"message": "Tariff deleted"}
 
 # ==================== GROUPS ENDPOINTS ====================
 
 @app.get("/api/groups")
 async def get_groups(current_user: dict = Depends(get_current_user)):
-    result = supabase.table('groups').select('*').order('name').execute()
-    return result.data
+    return await get_catalog('groups')
 
 @app.post("/api/groups")
 async def create_group(data: GroupCreate, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    existing = supabase.table('groups').select('*').eq('name', data.name).limit(1).execute()
+    existing = await db_execute(supabase.table('groups').select('*').eq('name', data.name).limit(1))
     if existing.data:
         raise HTTPException(status_code=400, detail="Group with this name already exists")
     
@@ -946,10 +1313,10 @@ async def create_group(data: GroupCreate, current_user: dict = Depends(get_curre
         'description': data.description or "",
         'created_at': datetime.now(timezone.utc).isoformat()
     }
-    supabase.table('groups').insert(group_doc).execute()
-    log_activity(current_user["id"], current_user["name"], "create", "group", group_id, {"name": data.name})
+    result = await db_execute(supabase.table('groups').insert(group_doc))
+    invalidate_catalog('groups')
+    await log_activity(current_user["id"], current_user["name"], "create", "group", group_id, {"name": data.name})
     
-    result = supabase.table('groups').select('*').eq('id', group_id).limit(1).execute()
     return result.data[0]
 
 @app.put("/api/groups/{group_id}")
@@ -959,10 +1326,11 @@ async def update_group(group_id: str, data: GroupUpdate, current_user: dict = De
     
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     if update_data:
-        supabase.table('groups').update(update_data).eq('id', group_id).execute()
-        log_activity(current_user["id"], current_user["name"], "update", "group", group_id, update_data)
-    
-    result = supabase.table('groups').select('*').eq('id', group_id).limit(1).execute()
+        result = await db_execute(supabase.table('groups').update(update_data).eq('id', group_id))
+        invalidate_catalog('groups')
+        await log_activity(current_user["id"], current_user["name"], "update", "group", group_id, update_data)
+    else:
+        result = await db_execute(supabase.table('groups').select('*').eq('id', group_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=404, detail="Group not found")
     return result.data[0]
@@ -972,29 +1340,25 @@ async def delete_group(group_id: str, current_user: dict = Depends(get_current_u
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    clients = supabase.table('clients').select('count', count='exact').eq('group_id', group_id).execute()
+    clients = await db_execute(supabase.table('clients').select('count', count='exact').eq('group_id', group_id))
     if clients.count > 0:
         raise HTTPException(status_code=400, detail=f"Cannot delete group: {clients.count} clients are using it")
     
-    result = supabase.table('groups').select('*').eq('id', group_id).limit(1).execute()
+    result = await db_execute(supabase.table('groups').delete().eq('id', group_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Group not found")
-    
-    supabase.table('groups').delete().eq('id', group_id).execute()
-    log_activity(current_user["id"], current_user["name"], "delete", "group", group_id, {})
+    invalidate_catalog('groups')
+    await log_activity(current_user["id"], current_user["name"], "delete", "group", group_id, {})
     return {"message": "Group deleted"}
 
 # ==================== SETTINGS ENDPOINTS ====================
 
 @app.get("/api/settings")
 async def get_settings(current_user: dict = Depends(get_current_user)):
-    result = supabase.table('settings').select('*').eq('key', 'system').limit(1).execute()
-    if result.data:
-        data = result.data[0].get('data', {})
-        # Ensure exchange_rates exists with defaults
-        if 'exchange_rates' not in data:
-            data['exchange_rates'] = {'USD': 12500, 'EUR': 13500}
-        return data
+    data = await get_system_settings_data()
+    if data:
+        # Copy the cached dict; ensure exchange_rates exists with defaults
+        return {'exchange_rates': {'USD': 12500, 'EUR': 13500}, **data}
     return {"currency": "UZS", "exchange_rates": {"USD": 12500, "EUR": 13500}}
 
 @app.put("/api/settings")
@@ -1003,7 +1367,7 @@ async def update_settings(data: SettingsUpdate, current_user: dict = Depends(get
         raise HTTPException(status_code=403, detail="Admin access required")
     
     # Get existing data
-    existing = supabase.table('settings').select('*').eq('key', 'system').limit(1).execute()
+    existing = await db_execute(supabase.table('settings').select('data').eq('key', 'system').limit(1))
     existing_data = existing.data[0].get('data', {}) if existing.data else {}
     
     # Merge update data
@@ -1015,21 +1379,21 @@ async def update_settings(data: SettingsUpdate, current_user: dict = Depends(get
         merged_data['exchange_rates'] = {'USD': 12500, 'EUR': 13500}
     
     if existing.data:
-        supabase.table('settings').update({
+        result = await db_execute(supabase.table('settings').update({
             'currency': merged_data.get('currency', 'UZS'),
             'data': merged_data
-        }).eq('key', 'system').execute()
+        }).eq('key', 'system'))
     else:
-        supabase.table('settings').insert({
+        result = await db_execute(supabase.table('settings').insert({
             'id': new_uuid(),
             'key': 'system',
             'currency': merged_data.get('currency', 'UZS'),
             'data': merged_data
-        }).execute()
+        }))
+    invalidate_settings_cache()
     
-    log_activity(current_user["id"], current_user["name"], "update", "settings", "system", update_data)
+    await log_activity(current_user["id"], current_user["name"], "update", "settings", "system", update_data)
     
-    result = supabase.table('settings').select('*').eq('key', 'system').limit(1).execute()
     return result.data[0].get('data', {'currency': 'UZS'}) if result.data else {'currency': 'UZS'}
 
 @app.put("/api/settings/exchange-rate")
@@ -1039,7 +1403,7 @@ async def update_exchange_rate(data: ExchangeRateUpdate, current_user: dict = De
         raise HTTPException(status_code=403, detail="Admin access required")
     
     # Get existing settings
-    existing = supabase.table('settings').select('*').eq('key', 'system').limit(1).execute()
+    existing = await db_execute(supabase.table('settings').select('*').eq('key', 'system').limit(1))
     existing_data = existing.data[0].get('data', {}) if existing.data else {}
     
     # Update exchange rate
@@ -1048,16 +1412,17 @@ async def update_exchange_rate(data: ExchangeRateUpdate, current_user: dict = De
     existing_data['exchange_rates'] = exchange_rates
     
     if existing.data:
-        supabase.table('settings').update({'data': existing_data}).eq('key', 'system').execute()
+        await db_execute(supabase.table('settings').update({'data': existing_data}).eq('key', 'system'))
     else:
-        supabase.table('settings').insert({
+        await db_execute(supabase.table('settings').insert({
             'id': new_uuid(),
             'key': 'system',
             'currency': 'UZS',
             'data': existing_data
-        }).execute()
+        }))
+    invalidate_settings_cache()
     
-    log_activity(current_user["id"], current_user["name"], "update", "exchange_rate", data.currency_code, 
+    await log_activity(current_user["id"], current_user["name"], "update", "exchange_rate", data.currency_code, 
                 {"rate": data.rate_to_uzs})
     
     return {"message": f"Exchange rate updated: 1 {data.currency_code} = {data.rate_to_uzs} UZS"}
@@ -1065,7 +1430,7 @@ async def update_exchange_rate(data: ExchangeRateUpdate, current_user: dict = De
 @app.get("/api/settings/exchange-rates")
 async def get_exchange_rates_endpoint(current_user: dict = Depends(get_current_user)):
     """Get all exchange rates"""
-    return get_exchange_rates()
+    return await get_exchange_rates()
 
 @app.post("/api/settings/exchange-rates/refresh")
 async def refresh_exchange_rates(current_user: dict = Depends(get_current_user)):
@@ -1078,13 +1443,46 @@ async def refresh_exchange_rates(current_user: dict = Depends(get_current_user))
         return {"message": f"Exchange rate updated: 1 USD = {rate} UZS", "rate": rate, "source": "CBU"}
     else:
         # Return last saved rate
-        rates = get_exchange_rates()
+        rates = await get_exchange_rates()
         return {"message": "Failed to fetch new rate, using last saved", "rate": rates.get('USD', 12500), "source": "cached"}
 
 # ==================== CLIENTS ENDPOINTS ====================
 
+# Clients with their tariff, group and manager embedded by PostgREST through
+# the foreign keys, so enrichment needs no extra queries
+CLIENT_WITH_RELATIONS = '*,tariff:tariffs(name,price),client_group:groups(name,color),manager:users!manager_id(name)'
+
+def flatten_client_relations(client: dict) -> dict:
+    """Replace embedded relations with the flat tariff_/group_/manager_ fields"""
+    tariff = client.pop('tariff', None)
+    if tariff:
+        client['tariff_name'] = tariff['name']
+        client['tariff_price'] = tariff['price']
+    group = client.pop('client_group', None)
+    if group:
+        client['group_name'] = group['name']
+        client['group_color'] = group['color']
+    manager = client.pop('manager', None)
+    if manager:
+        client['manager_name'] = manager['name']
+    return client
+
+def scope_to_manager(query, current_user: dict):
+    """Restrict a clients query to the caller's own clients unless they are an admin"""
+    if current_user["role"] != "admin":
+        query = query.eq('manager_id', current_user["id"])
+    return query
+
+async def client_write_error(client_id: str) -> HTTPException:
+    """Why a manager-scoped client write matched no row"""
+    result = await db_execute(supabase.table('clients').select('id').eq('id', client_id).limit(1))
+    if result.data:
+        return HTTPException(status_code=403, detail="Access denied")
+    return HTTPException(status_code=404, detail="Client not found")
+
 @app.get("/api/clients")
 async def get_clients(
+    response: Response,
     search: Optional[str] = None,
     status: Optional[str] = None,
     group_id: Optional[str] = None,
@@ -1092,9 +1490,11 @@ async def get_clients(
     date_to: Optional[str] = None,
     is_archived: Optional[bool] = False,
     exclude_sold: Optional[bool] = False,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    query = supabase.table('clients').select('*')
+    query = supabase.table('clients').select(CLIENT_WITH_RELATIONS)
     
     if is_archived:
         query = query.eq('archived', True)
@@ -1105,7 +1505,11 @@ async def get_clients(
         query = query.eq('manager_id', current_user["id"])
     
     if search:
-        query = query.or_(f"name.ilike.%{search}%,phone.ilike.%{search}%")
+        conditions = [f"name.ilike.%{search}%", f"phone.ilike.%{search}%"]
+        digits = ''.join(ch for ch in search if ch.isdigit())
+        if digits:
+            conditions.append(f"phone_norm.like.%{digits}%")
+        query = query.or_(','.join(conditions))
     
     if status:
         query = query.eq('status', status)
@@ -1120,43 +1524,21 @@ async def get_clients(
     if date_to:
         query = query.lte('created_at', date_to)
     
-    result = query.order('created_at', desc=True).execute()
-    clients = result.data or []
-    
-    # Enrich with related data
-    tariffs = {t['id']: t for t in supabase.table('tariffs').select('*').execute().data}
-    groups = {g['id']: g for g in supabase.table('groups').select('*').execute().data}
-    users = {u['id']: u for u in supabase.table('users').select('id,name').execute().data}
-    
-    for client in clients:
-        if client.get('tariff_id') and client['tariff_id'] in tariffs:
-            client['tariff_name'] = tariffs[client['tariff_id']]['name']
-            client['tariff_price'] = tariffs[client['tariff_id']]['price']
-        if client.get('group_id') and client['group_id'] in groups:
-            client['group_name'] = groups[client['group_id']]['name']
-            client['group_color'] = groups[client['group_id']]['color']
-        if client.get('manager_id') and client['manager_id'] in users:
-            client['manager_name'] = users[client['manager_id']]['name']
-    
-    return clients
+    result = await db_execute(paginate_query(query, 'created_at', limit, cursor))
+    rows = paginate_rows(result.data or [], 'created_at', limit, response)
+    return [flatten_client_relations(client) for client in rows]
 
 @app.get("/api/clients/{client_id}")
 async def get_client(client_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('clients').select('*').eq('id', client_id).limit(1).execute()
+    result = await db_execute(supabase.table('clients').select(CLIENT_WITH_RELATIONS).eq('id', client_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=404, detail="Client not found")
     
-    client = result.data[0]
+    client = flatten_client_relations(result.data[0])
     
     if current_user["role"] != "admin" and client.get("manager_id") != current_user["id"]:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    if client.get('tariff_id'):
-        tariff = supabase.table('tariffs').select('*').eq('id', client['tariff_id']).limit(1).execute()
-        if tariff.data:
-            client['tariff_name'] = tariff.data[0]['name']
-            client['tariff_price'] = tariff.data[0]['price']
-    
     return client
 
 @app.post("/api/clients")
@@ -1176,22 +1558,22 @@ async def create_client(data: ClientCreate, current_user: dict = Depends(get_cur
         'created_at': datetime.now(timezone.utc).isoformat()
     }
     
-    supabase.table('clients').insert(client_doc).execute()
+    created = await db_execute(supabase.table('clients').insert(client_doc))
     
     # Create initial comment
     if data.initial_comment:
-        supabase.table('notes').insert({
+        await db_execute(supabase.table('notes').insert({
             'id': new_uuid(),
             'client_id': client_id,
             'user_id': current_user["id"],
             'text': data.initial_comment,
             'created_at': datetime.now(timezone.utc).isoformat()
-        }).execute()
+        }))
     
     # Create reminder
     if data.reminder_text and data.reminder_at:
         manager_id = data.manager_id or current_user["id"]
-        supabase.table('reminders').insert({
+        await db_execute(supabase.table('reminders').insert({
             'id': new_uuid(),
             'client_id': client_id,
             'user_id': manager_id,
@@ -1200,160 +1582,169 @@ async def create_client(data: ClientCreate, current_user: dict = Depends(get_cur
             'is_completed': False,
             'telegram_sent': False,
             'created_at': datetime.now(timezone.utc).isoformat()
-        }).execute()
+        }))
+        schedule_reminder_wakeup(data.reminder_at)
     
-    log_activity(current_user["id"], current_user["name"], "create", "client", client_id, {"name": data.name})
+    await log_activity(current_user["id"], current_user["name"], "create", "client", client_id, {"name": data.name})
     
-    result = supabase.table('clients').select('*').eq('id', client_id).limit(1).execute()
-    return result.data[0]
+    return created.data[0]
 
 @app.put("/api/clients/{client_id}")
 async def update_client(client_id: str, data: ClientUpdate, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('clients').select('*').eq('id', client_id).limit(1).execute()
-    if not result.data:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
-    client = result.data[0]
-    
-    if current_user["role"] != "admin" and client.get("manager_id") != current_user["id"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     # Map is_archived to archived
     if 'is_archived' in update_data:
         update_data['archived'] = update_data.pop('is_archived')
     
-    old_status = client.get("status")
-    
-    if update_data:
-        supabase.table('clients').update(update_data).eq('id', client_id).execute()
-        log_activity(current_user["id"], current_user["name"], "update", "client", client_id,
-                    {"fields": list(update_data.keys()), "old_status": old_status, "new_status": update_data.get("status")})
-    
-    result = supabase.table('clients').select('*').eq('id', client_id).limit(1).execute()
+    if not update_data or 'status' in update_data:
+        # Nothing to write, or the status it replaces is logged: read the row first
+        result = await db_execute(supabase.table('clients').select('*').eq('id', client_id).limit(1))
+        if not result.data:
+            raise HTTPException(status_code=404, detail="Client not found")
+        client = result.data[0]
+        if current_user["role"] != "admin" and client.get("manager_id") != current_user["id"]:
+            raise HTTPException(status_code=403, detail="Access denied")
+        if not update_data:
+            return client
+        old_status = client.get("status")
+    
+    result = await db_execute(scope_to_manager(supabase.table('clients').update(update_data).eq('id', client_id), current_user))
+    if not result.data:
+        raise await client_write_error(client_id)
+    if 'status' not in update_data:
+        # Not written by this update, so the returned row still has it
+        old_status = result.data[0].get("status")
+    await log_activity(current_user["id"], current_user["name"], "update", "client", client_id,
+                {"fields": list(update_data.keys()), "old_status": old_status, "new_status": update_data.get("status")})
     return result.data[0]
 
 @app.delete("/api/clients/{client_id}")
 async def delete_client(client_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('clients').select('*').eq('id', client_id).limit(1).execute()
+    # Notes, payments, reminders and audio files go with the client through
+    # their ON DELETE CASCADE foreign keys, in the same statement
+    result = await db_execute(scope_to_manager(supabase.table('clients').delete().eq('id', client_id), current_user))
     if not result.data:
-        raise HTTPException(status_code=404, detail="Client not found")
+        raise await client_write_error(client_id)
     
     client = result.data[0]
-    
-    if current_user["role"] != "admin" and client.get("manager_id") != current_user["id"]:
-        raise HTTPException(status_code=403, detail="Access denied")
-    
-    # Delete related records
-    supabase.table('notes').delete().eq('client_id', client_id).execute()
-    supabase.table('payments').delete().eq('client_id', client_id).execute()
-    supabase.table('reminders').delete().eq('client_id', client_id).execute()
-    supabase.table('clients').delete().eq('id', client_id).execute()
-    
-    log_activity(current_user["id"], current_user["name"], "delete", "client", client_id, {"name": client.get("name")})
+    await log_activity(current_user["id"], current_user["name"], "delete", "client", client_id, {"name": client.get("name")})
     return {"message": "Client deleted"}
 
 @app.post("/api/clients/{client_id}/archive")
 async def archive_client(client_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('clients').select('*').eq('id', client_id).limit(1).execute()
-    if not result.data:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
-    supabase.table('clients').update({
+    result = await db_execute(supabase.table('clients').update({
         'archived': True,
         'archived_at': datetime.now(timezone.utc).isoformat()
-    }).eq('id', client_id).execute()
+    }).eq('id', client_id))
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Client not found")
     
-    log_activity(current_user["id"], current_user["name"], "archive", "client", client_id, {"name": result.data[0].get("name")})
+    await log_activity(current_user["id"], current_user["name"], "archive", "client", client_id, {"name": result.data[0].get("name")})
     return {"message": "Client archived"}
 
 @app.post("/api/clients/{client_id}/restore")
 async def restore_client(client_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('clients').select('*').eq('id', client_id).limit(1).execute()
-    if not result.data:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
-    supabase.table('clients').update({
+    result = await db_execute(supabase.table('clients').update({
         'archived': False,
         'archived_at': None
-    }).eq('id', client_id).execute()
+    }).eq('id', client_id))
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Client not found")
     
-    log_activity(current_user["id"], current_user["name"], "restore", "client", client_id, {"name": result.data[0].get("name")})
+    await log_activity(current_user["id"], current_user["name"], "restore", "client", client_id, {"name": result.data[0].get("name")})
     return {"message": "Client restored"}
 
 @app.post("/api/clients/{client_id}/convert-to-lead")
 async def convert_to_lead(client_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('clients').select('*').eq('id', client_id).limit(1).execute()
-    if not result.data:
-        raise HTTPException(status_code=404, detail="Client not found")
-    
-    supabase.table('clients').update({
+    result = await db_execute(supabase.table('clients').update({
         'is_lead': True,
         'status': 'new'
-    }).eq('id', client_id).execute()
+    }).eq('id', client_id))
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Client not found")
     
-    log_activity(current_user["id"], current_user["name"], "convert_to_lead", "client", client_id, {"name": result.data[0].get("name")})
+    await log_activity(current_user["id"], current_user["name"], "convert_to_lead", "client", client_id, {"name": result.data[0].get("name")})
     return {"message": "Client converted to lead"}
 
 # ==================== IMPORT ENDPOINTS ====================
 
+def parse_import_csv(content: bytes) -> tuple:
+    """Parse an uploaded client CSV into (rows, errors)"""
+    rows = []
+    errors = []
+    reader = csv.DictReader(io.StringIO(content.decode('utf-8')))
+    for i, row in enumerate(reader):
+        if not row.get('name') or not row.get('phone'):
+            errors.append(f"Row {i+1}: Missing name or phone")
+            continue
+        rows.append({
+            "name": row.get('name', '').strip(),
+            "phone": row.get('phone', '').strip(),
+            "source": row.get('source', '').strip(),
+            "status": row.get('status', 'new').strip()
+        })
+    return rows, errors
+
 @app.post("/api/import/preview")
 async def import_preview(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
     """Preview import data"""
     content = await file.read()
-    rows = []
-    errors = []
     
+    # Decoding and parsing a large file is CPU-bound; keep it off the event loop
     try:
-        decoded = content.decode('utf-8')
-        reader = csv.DictReader(io.StringIO(decoded))
-        for i, row in enumerate(reader):
-            if not row.get('name') or not row.get('phone'):
-                errors.append(f"Row {i+1}: Missing name or phone")
-                continue
-            rows.append({
-                "name": row.get('name', '').strip(),
-                "phone": row.get('phone', '').strip(),
-                "source": row.get('source', '').strip(),
-                "status": row.get('status', 'new').strip()
-            })
+        rows, errors = await asyncio.to_thread(parse_import_csv, content)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error parsing file: {str(e)}")
     
     return {"rows": rows, "errors": errors, "total": len(rows)}
 
+# Rows per multi-row INSERT when saving an import
+IMPORT_BATCH_SIZE = 500
+
 @app.post("/api/import/save")
 async def import_save(rows: List[dict], current_user: dict = Depends(get_current_user)):
     """Save imported data"""
     created = 0
     errors = []
     
-    for i, row in enumerate(rows):
-        try:
-            client_id = new_uuid()
-            supabase.table('clients').insert({
-                'id': client_id,
-                'name': row.get('name'),
-                'phone': row.get('phone'),
-                'source': row.get('source', ''),
-                'status': row.get('status', 'new'),
-                'manager_id': row.get('manager_id') or current_user["id"],
-                'is_lead': True,
-                'archived': False,
-                'created_at': datetime.now(timezone.utc).isoformat()
-            }).execute()
-            created += 1
-        except Exception as e:
-            errors.append(f"Row {i+1}: {str(e)}")
+    created_at = datetime.now(timezone.utc).isoformat()
+    docs = [{
+        'id': new_uuid(),
+        'name': row.get('name'),
+        'phone': row.get('phone'),
+        'source': row.get('source', ''),
+        'status': row.get('status', 'new'),
+        'manager_id': row.get('manager_id') or current_user["id"],
+        'is_lead': True,
+        'archived': False,
+        'created_at': created_at
+    } for row in rows]
     
-    log_activity(current_user["id"], current_user["name"], "import", "client", "batch", {"created": created})
+    # One multi-row INSERT per chunk; a chunk that fails is retried row by
+    # row so the remaining rows are still saved and the bad ones reported
+    for start in range(0, len(docs), IMPORT_BATCH_SIZE):
+        chunk = docs[start:start + IMPORT_BATCH_SIZE]
+        try:
+            await db_execute(supabase.table('clients').insert(chunk, returning=ReturnMethod.minimal))
+            created += len(chunk)
+            continue
+        except Exception:
+            pass
+        for i, doc in enumerate(chunk, start):
+            try:
+                await db_execute(supabase.table('clients').insert(doc, returning=ReturnMethod.minimal))
+                created += 1
+            except Exception as e:
+                errors.append(f"Row {i+1}: {str(e)}")
+    
+    await log_activity(current_user["id"], current_user["name"], "import", "client", "batch", {"created": created})
     return {"created": created, "errors": errors}
 
 # ==================== NOTES ENDPOINTS ====================
 
 @app.get("/api/notes/{client_id}")
 async def get_notes(client_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('notes').select('*').eq('client_id', client_id).order('created_at', desc=True).execute()
+    result = await db_execute(supabase.table('notes').select('*').eq('client_id', client_id).order('created_at', desc=True))
     return result.data
 
 @app.post("/api/notes")
@@ -1366,32 +1757,36 @@ async def create_note(data: NoteCreate, current_user: dict = Depends(get_current
         'text': data.text,
         'created_at': datetime.now(timezone.utc).isoformat()
     }
-    supabase.table('notes').insert(note_doc).execute()
-    log_activity(current_user["id"], current_user["name"], "create", "note", note_id, {"client_id": data.client_id})
+    result = await db_execute(supabase.table('notes').insert(note_doc))
+    await log_activity(current_user["id"], current_user["name"], "create", "note", note_id, {"client_id": data.client_id})
     
-    result = supabase.table('notes').select('*').eq('id', note_id).limit(1).execute()
     return result.data[0]
 
 @app.delete("/api/notes/{note_id}")
 async def delete_note(note_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('notes').select('*').eq('id', note_id).limit(1).execute()
+    result = await db_execute(supabase.table('notes').delete().eq('id', note_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Note not found")
     
-    supabase.table('notes').delete().eq('id', note_id).execute()
-    log_activity(current_user["id"], current_user["name"], "delete", "note", note_id, {})
+    await log_activity(current_user["id"], current_user["name"], "delete", "note", note_id, {})
     return {"message": "Note deleted"}
 
 # ==================== PAYMENTS ENDPOINTS ====================
 
 @app.get("/api/payments")
-async def get_payments(current_user: dict = Depends(get_current_user)):
-    result = supabase.table('payments').select('*').order('payment_date', desc=True).execute()
-    return result.data
+async def get_payments(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    query = paginate_query(supabase.table('payments').select('*'), 'payment_date', limit, cursor)
+    result = await db_execute(query)
+    return paginate_rows(result.data, 'payment_date', limit, response)
 
 @app.get("/api/payments/client/{client_id}")
 async def get_client_payments(client_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('payments').select('*').eq('client_id', client_id).order('payment_date', desc=True).execute()
+    result = await db_execute(supabase.table('payments').select('*').eq('client_id', client_id).order('payment_date', desc=True))
     return result.data
 
 @app.post("/api/payments")
@@ -1408,10 +1803,9 @@ async def create_payment(data: PaymentCreate, current_user: dict = Depends(get_c
         'comment': data.comment,
         'created_at': datetime.now(timezone.utc).isoformat()
     }
-    supabase.table('payments').insert(payment_doc).execute()
-    log_activity(current_user["id"], current_user["name"], "create", "payment", payment_id, {"amount": data.amount, "client_id": data.client_id})
+    result = await db_execute(supabase.table('payments').insert(payment_doc))
+    await log_activity(current_user["id"], current_user["name"], "create", "payment", payment_id, {"amount": data.amount, "client_id": data.client_id})
     
-    result = supabase.table('payments').select('*').eq('id', payment_id).limit(1).execute()
     return result.data[0]
 
 @app.put("/api/payments/{payment_id}")
@@ -1421,33 +1815,37 @@ async def update_payment(payment_id: str, data: PaymentUpdate, current_user: dic
         update_data['payment_date'] = update_data.pop('date')
     
     if update_data:
-        supabase.table('payments').update(update_data).eq('id', payment_id).execute()
-        log_activity(current_user["id"], current_user["name"], "update", "payment", payment_id, update_data)
-    
-    result = supabase.table('payments').select('*').eq('id', payment_id).limit(1).execute()
+        result = await db_execute(supabase.table('payments').update(update_data).eq('id', payment_id))
+        await log_activity(current_user["id"], current_user["name"], "update", "payment", payment_id, update_data)
+    else:
+        result = await db_execute(supabase.table('payments').select('*').eq('id', payment_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=404, detail="Payment not found")
     return result.data[0]
 
 @app.delete("/api/payments/{payment_id}")
 async def delete_payment(payment_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('payments').select('*').eq('id', payment_id).limit(1).execute()
+    result = await db_execute(supabase.table('payments').delete().eq('id', payment_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Payment not found")
     
-    supabase.table('payments').delete().eq('id', payment_id).execute()
-    log_activity(current_user["id"], current_user["name"], "delete", "payment", payment_id, {})
+    await log_activity(current_user["id"], current_user["name"], "delete", "payment", payment_id, {})
     return {"message": "Payment deleted"}
 
 # ==================== REMINDERS ENDPOINTS ====================
 
 @app.get("/api/reminders")
-async def get_reminders(current_user: dict = Depends(get_current_user)):
+async def get_reminders(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     query = supabase.table('reminders').select('*')
     if current_user["role"] != "admin":
         query = query.eq('user_id', current_user["id"])
-    result = query.order('remind_at').execute()
-    return result.data
+    result = await db_execute(paginate_query(query, 'remind_at', limit, cursor, desc=False))
+    return paginate_rows(result.data, 'remind_at', limit, response)
 
 @app.get("/api/reminders/overdue")
 async def get_overdue_reminders(current_user: dict = Depends(get_current_user)):
@@ -1455,7 +1853,7 @@ async def get_overdue_reminders(current_user: dict = Depends(get_current_user)):
     query = supabase.table('reminders').select('*').lt('remind_at', now).eq('is_completed', False)
     if current_user["role"] != "admin":
         query = query.eq('user_id', current_user["id"])
-    result = query.order('remind_at').execute()
+    result = await db_execute(query.order('remind_at'))
     return result.data
 
 @app.post("/api/reminders")
@@ -1471,82 +1869,68 @@ async def create_reminder(data: ReminderCreate, current_user: dict = Depends(get
         'telegram_sent': False,
         'created_at': datetime.now(timezone.utc).isoformat()
     }
-    supabase.table('reminders').insert(reminder_doc).execute()
-    log_activity(current_user["id"], current_user["name"], "create", "reminder", reminder_id, {"client_id": data.client_id})
+    result = await db_execute(supabase.table('reminders').insert(reminder_doc))
+    schedule_reminder_wakeup(data.remind_at)
+    await log_activity(current_user["id"], current_user["name"], "create", "reminder", reminder_id, {"client_id": data.client_id})
     
-    result = supabase.table('reminders').select('*').eq('id', reminder_id).limit(1).execute()
     return result.data[0]
 
 @app.put("/api/reminders/{reminder_id}")
 async def update_reminder(reminder_id: str, data: ReminderUpdate, current_user: dict = Depends(get_current_user)):
     update_data = {k: v for k, v in data.model_dump().items() if v is not None}
     if update_data:
-        supabase.table('reminders').update(update_data).eq('id', reminder_id).execute()
-        log_activity(current_user["id"], current_user["name"], "update", "reminder", reminder_id, update_data)
-    
-    result = supabase.table('reminders').select('*').eq('id', reminder_id).limit(1).execute()
+        result = await db_execute(supabase.table('reminders').update(update_data).eq('id', reminder_id))
+        if data.remind_at:
+            schedule_reminder_wakeup(data.remind_at)
+        await log_activity(current_user["id"], current_user["name"], "update", "reminder", reminder_id, update_data)
+    else:
+        result = await db_execute(supabase.table('reminders').select('*').eq('id', reminder_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=404, detail="Reminder not found")
     return result.data[0]
 
 @app.delete("/api/reminders/{reminder_id}")
 async def delete_reminder(reminder_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('reminders').select('*').eq('id', reminder_id).limit(1).execute()
+    result = await db_execute(supabase.table('reminders').delete().eq('id', reminder_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Reminder not found")
     
-    supabase.table('reminders').delete().eq('id', reminder_id).execute()
-    log_activity(current_user["id"], current_user["name"], "delete", "reminder", reminder_id, {})
+    await log_activity(current_user["id"], current_user["name"], "delete", "reminder", reminder_id, {})
     return {"message": "Reminder deleted"}
 
 # ==================== NOTIFICATIONS ENDPOINTS ====================
 
 @app.get("/api/notifications")
-async def get_notifications(current_user: dict = Depends(get_current_user)):
-    result = supabase.table('notifications').select('*').eq('user_id', current_user["id"]).order('created_at', desc=True).execute()
-    return result.data
+async def get_notifications(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    query = supabase.table('notifications').select('*').eq('user_id', current_user["id"])
+    result = await db_execute(paginate_query(query, 'created_at', limit, cursor))
+    return paginate_rows(result.data, 'created_at', limit, response)
 
 @app.get("/api/notifications/unread-count")
 async def get_unread_count(current_user: dict = Depends(get_current_user)):
-    result = supabase.table('notifications').select('count', count='exact').eq('user_id', current_user["id"]).eq('is_read', False).execute()
+    result = await db_execute(supabase.table('notifications').select('count', count='exact').eq('user_id', current_user["id"]).eq('is_read', False))
     return {"count": result.count or 0}
 
 @app.put("/api/notifications/{notification_id}/read")
 async def mark_notification_read(notification_id: str, current_user: dict = Depends(get_current_user)):
-    supabase.table('notifications').update({'is_read': True}).eq('id', notification_id).execute()
+    await db_execute(supabase.table('notifications').update({'is_read': True}).eq('id', notification_id))
     return {"message": "Notification marked as read"}
 
 @app.put("/api/notifications/read-all")
 async def mark_all_read(current_user: dict = Depends(get_current_user)):
-    supabase.table('notifications').update({'is_read': True}).eq('user_id', current_user["id"]).eq('is_read', False).execute()
+    await db_execute(supabase.table('notifications').update({'is_read': True}).eq('user_id', current_user["id"]).eq('is_read', False))
     return {"message": "All notifications marked as read"}
 
 @app.get("/api/notifications/check-reminders")
 async def check_reminders(current_user: dict = Depends(get_current_user)):
     """Check for due reminders"""
-    now = datetime.now(timezone.utc).isoformat()
-    result = supabase.table('reminders').select('*').eq('user_id', current_user["id"]).lt('remind_at', now).eq('is_completed', False).eq('notified', False).execute()
-    
-    due_reminders = result.data or []
-    for reminder in due_reminders:
-        client = supabase.table('clients').select('name').eq('id', reminder['client_id']).limit(1).execute()
-        client_name = client.data[0]['name'] if client.data else 'Unknown'
-        
-        supabase.table('notifications').insert({
-            'id': new_uuid(),
-            'user_id': current_user["id"],
-            'type': 'reminder',
-            'title': 'Reminder Due',
-            'message': f"Reminder for {client_name}: {reminder['text']}",
-            'entity_type': 'reminder',
-            'entity_id': reminder['id'],
-            'is_read': False,
-            'created_at': datetime.now(timezone.utc).isoformat()
-        }).execute()
-        
-        supabase.table('reminders').update({'notified': True}).eq('id', reminder['id']).execute()
-    
-    return {"checked": len(due_reminders)}
+    result = await db_execute(supabase.rpc('process_due_reminders', {'uid': current_user["id"]}))
+    return {"checked": result.data or 0}
 
 @app.post("/api/notifications/send-telegram-reminders")
 async def send_telegram_reminders_manual(current_user: dict = Depends(get_current_user)):
@@ -1576,17 +1960,15 @@ async def telegram_status(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    # Count users with Telegram linked
-    linked_result = supabase.table('users').select('count', count='exact').neq('telegram_id', None).execute()
-    linked_users = linked_result.count or 0
-    
-    # Count pending reminders
     now = datetime.now(timezone.utc).isoformat()
-    pending_result = supabase.table('reminders').select('count', count='exact').lt('remind_at', now).eq('is_completed', False).eq('telegram_sent', False).execute()
+    # Linked users, pending reminders and sent reminders, counted concurrently
+    linked_result, pending_result, sent_result = await asyncio.gather(
+        db_execute(supabase.table('users').select('count', count='exact').neq('telegram_id', None)),
+        db_execute(supabase.table('reminders').select('count', count='exact').lt('remind_at', now).eq('is_completed', False).eq('telegram_sent', False)),
+        db_execute(supabase.table('reminders').select('count', count='exact').eq('telegram_sent', True)),
+    )
+    linked_users = linked_result.count or 0
     pending_reminders = pending_result.count or 0
-    
-    # Recent sent
-    sent_result = supabase.table('reminders').select('count', count='exact').eq('telegram_sent', True).execute()
     total_sent = sent_result.count or 0
     
     return {
@@ -1601,15 +1983,14 @@ async def telegram_status(current_user: dict = Depends(get_current_user)):
 
 @app.get("/api/statuses")
 async def get_statuses(current_user: dict = Depends(get_current_user)):
-    result = supabase.table('statuses').select('*').order('sort_order').execute()
-    return result.data
+    return await get_catalog('statuses')
 
 @app.post("/api/statuses")
 async def create_status(data: StatusCreate, current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    existing = supabase.table('statuses').select('*').eq('name', data.name).limit(1).execute()
+    existing = await db_execute(supabase.table('statuses').select('*').eq('name', data.name).limit(1))
     if existing.data:
         raise HTTPException(status_code=400, detail="Status with this name already exists")
     
@@ -1622,10 +2003,10 @@ async def create_status(data: StatusCreate, current_user: dict = Depends(get_cur
         'is_default': False,
         'created_at': datetime.now(timezone.utc).isoformat()
     }
-    supabase.table('statuses').insert(status_doc).execute()
-    log_activity(current_user["id"], current_user["name"], "create", "status", status_id, {"name": data.name})
+    result = await db_execute(supabase.table('statuses').insert(status_doc))
+    invalidate_catalog('statuses')
+    await log_activity(current_user["id"], current_user["name"], "create", "status", status_id, {"name": data.name})
     
-    result = supabase.table('statuses').select('*').eq('id', status_id).limit(1).execute()
     return result.data[0]
 
 @app.put("/api/statuses/{status_id}")
@@ -1638,10 +2019,11 @@ async def update_status(status_id: str, data: StatusUpdate, current_user: dict =
         update_data['sort_order'] = update_data.pop('order')
     
     if update_data:
-        supabase.table('statuses').update(update_data).eq('id', status_id).execute()
-        log_activity(current_user["id"], current_user["name"], "update", "status", status_id, update_data)
-    
-    result = supabase.table('statuses').select('*').eq('id', status_id).limit(1).execute()
+        result = await db_execute(supabase.table('statuses').update(update_data).eq('id', status_id))
+        invalidate_catalog('statuses')
+        await log_activity(current_user["id"], current_user["name"], "update", "status", status_id, update_data)
+    else:
+        result = await db_execute(supabase.table('statuses').select('*').eq('id', status_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=404, detail="Status not found")
     return result.data[0]
@@ -1651,36 +2033,42 @@ async def delete_status(status_id: str, current_user: dict = Depends(get_current
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    result = supabase.table('statuses').select('*').eq('id', status_id).limit(1).execute()
+    result = await db_execute(supabase.table('statuses').delete().eq('id', status_id).not_.is_('is_default', 'true'))
     if not result.data:
+        # Nothing deleted: either no such status or it is the default one
+        existing = await db_execute(supabase.table('statuses').select('id').eq('id', status_id).limit(1))
+        if existing.data:
+            raise HTTPException(status_code=400, detail="Cannot delete default status")
         raise HTTPException(status_code=404, detail="Status not found")
     
-    if result.data[0].get('is_default'):
-        raise HTTPException(status_code=400, detail="Cannot delete default status")
-    
-    supabase.table('statuses').delete().eq('id', status_id).execute()
-    log_activity(current_user["id"], current_user["name"], "delete", "status", status_id, {})
+    invalidate_catalog('statuses')
+    await log_activity(current_user["id"], current_user["name"], "delete", "status", status_id, {})
     return {"message": "Status deleted"}
 
 # ==================== ACTIVITY LOG ====================
 
 @app.get("/api/activity-log")
 async def get_activity_log(
+    response: Response,
     limit: int = 100,
+    cursor: Optional[str] = None,
     entity_type: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
+    # Clamped rather than rejected: this endpoint took any limit before it
+    # was paginated; larger requests now continue via X-Next-Cursor
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
     query = supabase.table('activity_log').select('*')
     if entity_type:
         query = query.eq('entity_type', entity_type)
-    result = query.order('created_at', desc=True).limit(limit).execute()
-    return result.data
+    result = await db_execute(paginate_query(query, 'created_at', limit, cursor))
+    return paginate_rows(result.data, 'created_at', limit, response)
 
 # ==================== AUDIO FILES ENDPOINTS ====================
 
 @app.get("/api/audio/{client_id}")
 async def get_client_audio_files(client_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('audio_files').select('*').eq('client_id', client_id).order('created_at', desc=True).execute()
+    result = await db_execute(supabase.table('audio_files').select('*').eq('client_id', client_id).order('created_at', desc=True))
     return result.data
 
 @app.post("/api/audio/upload")
@@ -1697,9 +2085,14 @@ async def upload_audio(
     filename = f"{client_id}_{timestamp}_{file.filename}"
     filepath = os.path.join(UPLOAD_DIR, filename)
     
-    content = await file.read()
-    with open(filepath, "wb") as f:
-        f.write(content)
+    # Copy the spooled upload to disk in 1 MiB chunks in a worker thread,
+    # instead of reading it all into memory and writing on the event loop
+    def save_upload():
+        with open(filepath, "wb") as f:
+            shutil.copyfileobj(file.file, f, AUDIO_COPY_CHUNK_SIZE)
+    
+    await file.seek(0)
+    await asyncio.to_thread(save_upload)
     
     audio_id = new_uuid()
     audio_doc = {
@@ -1711,10 +2104,9 @@ async def upload_audio(
         'content_type': file.content_type,
         'created_at': datetime.now(timezone.utc).isoformat()
     }
-    supabase.table('audio_files').insert(audio_doc).execute()
-    log_activity(current_user["id"], current_user["name"], "upload", "audio", audio_id, {"client_id": client_id})
+    result = await db_execute(supabase.table('audio_files').insert(audio_doc))
+    await log_activity(current_user["id"], current_user["name"], "upload", "audio", audio_id, {"client_id": client_id})
     
-    result = supabase.table('audio_files').select('*').eq('id', audio_id).limit(1).execute()
     return result.data[0]
 
 @app.get("/api/audio/file/{audio_id}")
@@ -1731,7 +2123,7 @@ async def get_audio_file(audio_id: str, token: Optional[str] = None):
     else:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    result = supabase.table('audio_files').select('*').eq('id', audio_id).limit(1).execute()
+    result = await db_execute(supabase.table('audio_files').select('*').eq('id', audio_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=404, detail="Audio file not found")
     
@@ -1763,7 +2155,7 @@ async def stream_audio_public(audio_id: str, token: str):
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     
-    result = supabase.table('audio_files').select('*').eq('id', audio_id).limit(1).execute()
+    result = await db_execute(supabase.table('audio_files').select('*').eq('id', audio_id).limit(1))
     if not result.data:
         raise HTTPException(status_code=404, detail="Audio file not found")
     
@@ -1786,17 +2178,16 @@ async def stream_audio_public(audio_id: str, token: str):
 
 @app.delete("/api/audio/{audio_id}")
 async def delete_audio(audio_id: str, current_user: dict = Depends(get_current_user)):
-    result = supabase.table('audio_files').select('*').eq('id', audio_id).limit(1).execute()
+    result = await db_execute(supabase.table('audio_files').delete().eq('id', audio_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Audio file not found")
     
     audio = result.data[0]
     filepath = os.path.join(UPLOAD_DIR, audio["filename"])
     if os.path.exists(filepath):
-        os.remove(filepath)
+        await asyncio.to_thread(os.remove, filepath)
     
-    supabase.table('audio_files').delete().eq('id', audio_id).execute()
-    log_activity(current_user["id"], current_user["name"], "delete", "audio", audio_id, {"filename": audio["original_name"]})
+    await log_activity(current_user["id"], current_user["name"], "delete", "audio", audio_id, {"filename": audio["original_name"]})
     return {"message": "Audio deleted"}
 
 # ==================== EXPORT ENDPOINTS ====================
@@ -1806,7 +2197,7 @@ async def export_clients(format: str = "csv", current_user: dict = Depends(get_c
     query = supabase.table('clients').select('*')
     if current_user["role"] != "admin":
         query = query.eq('manager_id', current_user["id"])
-    result = query.order('created_at', desc=True).execute()
+    result = await db_execute(query.order('created_at', desc=True))
     clients = result.data or []
     
     if format == "csv":
@@ -1839,7 +2230,12 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
     query = supabase.table('clients').select('*').eq('archived', False)
     if current_user["role"] != "admin":
         query = query.eq('manager_id', current_user["id"])
-    result = query.execute()
+    # The overdue count does not depend on the clients, so fetch it alongside
+    now = datetime.now(timezone.utc).isoformat()
+    result, overdue_result = await asyncio.gather(
+        db_execute(query),
+        db_execute(supabase.table('reminders').select('count', count='exact').eq('user_id', current_user["id"]).lt('remind_at', now).eq('is_completed', False)),
+    )
     clients = result.data or []
     
     today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
@@ -1853,23 +2249,22 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
     # Payment stats - convert all to UZS
     client_ids = [c['id'] for c in clients]
     if client_ids:
-        payments = supabase.table('payments').select('*').in_('client_id', client_ids).execute().data or []
+        payments = (await db_execute(supabase.table('payments').select('*').in_('client_id', client_ids))).data or []
     else:
         payments = []
     
     # Convert payments to UZS
+    rates = await get_exchange_rates()
     total_paid_uzs = sum(
-        convert_to_uzs(p.get('amount', 0), p.get('currency', 'UZS')) 
+        convert_to_uzs(p.get('amount', 0), p.get('currency', 'UZS'), rates) 
         for p in payments if p.get('status') == 'paid'
     )
     total_pending_uzs = sum(
-        convert_to_uzs(p.get('amount', 0), p.get('currency', 'UZS')) 
+        convert_to_uzs(p.get('amount', 0), p.get('currency', 'UZS'), rates) 
         for p in payments if p.get('status') == 'pending'
     )
     
     # Overdue reminders
-    now = datetime.now(timezone.utc).isoformat()
-    overdue_result = supabase.table('reminders').select('count', count='exact').eq('user_id', current_user["id"]).lt('remind_at', now).eq('is_completed', False).execute()
     overdue_reminders = overdue_result.count or 0
     
     return {
@@ -1882,7 +2277,7 @@ async def get_dashboard_stats(current_user: dict = Depends(get_current_user)):
         "total_pending": total_pending_uzs,
         "overdue_reminders": overdue_reminders,
         "currency": "UZS",  # Always display in UZS
-        "exchange_rates": get_exchange_rates()
+        "exchange_rates": rates
     }
 
 @app.get("/api/dashboard/recent-clients")
@@ -1890,19 +2285,19 @@ async def get_recent_clients(current_user: dict = Depends(get_current_user)):
     query = supabase.table('clients').select('*').eq('archived', False)
     if current_user["role"] != "admin":
         query = query.eq('manager_id', current_user["id"])
-    result = query.order('created_at', desc=True).limit(5).execute()
+    result = await db_execute(query.order('created_at', desc=True).limit(5))
     return result.data
 
 @app.get("/api/dashboard/recent-notes")
 async def get_recent_notes(current_user: dict = Depends(get_current_user)):
     if current_user["role"] == "admin":
-        notes_result = supabase.table('notes').select('*').order('created_at', desc=True).limit(5).execute()
+        notes_result = await db_execute(supabase.table('notes').select('*').order('created_at', desc=True).limit(5))
     else:
         # Get user's client IDs
-        clients = supabase.table('clients').select('id').eq('manager_id', current_user["id"]).execute().data or []
+        clients = (await db_execute(supabase.table('clients').select('id').eq('manager_id', current_user["id"]))).data or []
         client_ids = [c['id'] for c in clients]
         if client_ids:
-            notes_result = supabase.table('notes').select('*').in_('client_id', client_ids).order('created_at', desc=True).limit(5).execute()
+            notes_result = await db_execute(supabase.table('notes').select('*').in_('client_id', client_ids).order('created_at', desc=True).limit(5))
         else:
             return []
     
@@ -1911,7 +2306,7 @@ async def get_recent_notes(current_user: dict = Depends(get_current_user)):
     # Add client names
     client_ids = list(set(n['client_id'] for n in notes))
     if client_ids:
-        clients = supabase.table('clients').select('id,name').in_('id', client_ids).execute().data or []
+        clients = (await db_execute(supabase.table('clients').select('id,name').in_('id', client_ids))).data or []
         client_map = {c['id']: c['name'] for c in clients}
         for note in notes:
             note['client_name'] = client_map.get(note['client_id'], 'Unknown')
@@ -1924,9 +2319,13 @@ async def get_manager_stats(current_user: dict = Depends(get_current_user)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    managers = supabase.table('users').select('id,name,role').execute().data or []
-    clients = supabase.table('clients').select('id,manager_id,status').execute().data or []
-    payments = supabase.table('payments').select('client_id,amount,status').execute().data or []
+    managers, clients_result, payments_result = await asyncio.gather(
+        get_catalog('users'),
+        db_execute(supabase.table('clients').select('id,manager_id,status')),
+        db_execute(supabase.table('payments').select('client_id,amount,status')),
+    )
+    clients = clients_result.data or []
+    payments = payments_result.data or []
     
     # Group clients by manager
     manager_clients = {}
@@ -1980,9 +2379,14 @@ async def get_analytics(months: int = 6, current_user: dict = Depends(get_curren
     end_date = datetime.now(timezone.utc)
     start_date = end_date - timedelta(days=months * 30)
     
-    clients = supabase.table('clients').select('*').execute().data or []
-    payments = supabase.table('payments').select('*').execute().data or []
-    tariffs = supabase.table('tariffs').select('*').execute().data or []
+    # Only the columns the monthly and per-tariff aggregates read
+    clients_result, payments_result, tariffs = await asyncio.gather(
+        db_execute(supabase.table('clients').select('status,created_at,tariff_id')),
+        db_execute(supabase.table('payments').select('amount,status,payment_date')),
+        get_catalog('tariffs'),
+    )
+    clients = clients_result.data or []
+    payments = payments_result.data or []
     
     monthly_data = []
     current = start_date
@@ -2045,7 +2449,7 @@ async def get_analytics(months: int = 6, current_user: dict = Depends(get_curren
             "deals_change": deals_change,
             "deals_change_pct": round(deals_change_pct, 1)
         },
-        "currency": get_system_currency()
+        "currency": await get_system_currency()
     }
 
 if __name__ == "__main__":
@@ -8,6 +8,9 @@
 -- Enable UUID extension (usually already enabled in Supabase)
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Trigram matching for ILIKE '%...%' client search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- ============================================================
 -- 1. USERS TABLE
 -- ============================================================
@@ -23,6 +26,7 @@ CREATE TABLE IF NOT EXISTS users (
     telegram_username VARCHAR(100),
     telegram_first_name VARCHAR(100),
     telegram_linked_at TIMESTAMPTZ,
+    unread_notifications INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
@@ -187,18 +191,148 @@ CREATE TABLE IF NOT EXISTS notifications (
 -- ============================================================
 -- INDEXES FOR PERFORMANCE
 -- ============================================================
-CREATE INDEX IF NOT EXISTS idx_clients_manager ON clients(manager_id);
 CREATE INDEX IF NOT EXISTS idx_clients_status ON clients(status);
 CREATE INDEX IF NOT EXISTS idx_clients_phone ON clients(phone);
 CREATE INDEX IF NOT EXISTS idx_clients_archived ON clients(archived);
-CREATE INDEX IF NOT EXISTS idx_payments_client ON payments(client_id);
+CREATE INDEX IF NOT EXISTS idx_clients_manager_created ON clients(manager_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_clients_archived_manager_created ON clients(archived, manager_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_clients_created ON clients(created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_payments_client_date ON payments(client_id, payment_date DESC);
+CREATE INDEX IF NOT EXISTS idx_payments_date ON payments(payment_date DESC);
 CREATE INDEX IF NOT EXISTS idx_reminders_client ON reminders(client_id);
 CREATE INDEX IF NOT EXISTS idx_reminders_remind_at ON reminders(remind_at);
-CREATE INDEX IF NOT EXISTS idx_reminders_user ON reminders(user_id);
-CREATE INDEX IF NOT EXISTS idx_notes_client ON notes(client_id);
+CREATE INDEX IF NOT EXISTS idx_reminders_user_remind_at ON reminders(user_id, remind_at);
+CREATE INDEX IF NOT EXISTS idx_reminders_telegram_due ON reminders(remind_at)
+    WHERE is_completed = FALSE AND telegram_sent = FALSE;
+CREATE INDEX IF NOT EXISTS idx_notes_client_created ON notes(client_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audio_files_client_created ON audio_files(client_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_created ON notifications(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_unread ON notifications(user_id) WHERE is_read = FALSE;
 CREATE INDEX IF NOT EXISTS idx_activity_log_created ON activity_log(created_at DESC);
-CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-CREATE INDEX IF NOT EXISTS idx_users_telegram_id ON users(telegram_id);
+CREATE INDEX IF NOT EXISTS idx_clients_tariff ON clients(tariff_id);
+CREATE INDEX IF NOT EXISTS idx_clients_group ON clients(group_id);
+
+-- Email lookups use the UNIQUE constraint's index
+DROP INDEX IF EXISTS idx_users_email;
+-- A Telegram account links to at most one user; most users have none
+DROP INDEX IF EXISTS idx_users_telegram_id;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_telegram_id_unique ON users(telegram_id) WHERE telegram_id IS NOT NULL;
+
+-- Client search: name.ilike.%q% / phone.ilike.%q% can use these GIN indexes
+CREATE INDEX IF NOT EXISTS idx_clients_name_trgm ON clients USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_clients_phone_trgm ON clients USING gin (phone gin_trgm_ops);
+-- Digits-only phone, so "+998 90 123" finds "998901234567" whatever the formatting
+ALTER TABLE clients ADD COLUMN IF NOT EXISTS phone_norm TEXT
+    GENERATED ALWAYS AS (regexp_replace(phone, '\D', '', 'g')) STORED;
+CREATE INDEX IF NOT EXISTS idx_clients_phone_norm_trgm ON clients USING gin (phone_norm gin_trgm_ops);
+
+-- ============================================================
+-- FUNCTIONS (called via supabase.rpc)
+-- ============================================================
+CREATE OR REPLACE FUNCTION sum_payments(p_status TEXT DEFAULT NULL)
+RETURNS NUMERIC
+LANGUAGE sql STABLE AS $$
+    SELECT COALESCE(SUM(amount), 0)
+    FROM payments
+    WHERE p_status IS NULL OR status = p_status;
+$$;
+
+-- Case-insensitive substring search on client name/phone; q is matched
+-- literally (LIKE wildcards escaped) and served by the trigram indexes
+CREATE OR REPLACE FUNCTION search_clients(q TEXT, mgr UUID DEFAULT NULL)
+RETURNS SETOF clients
+LANGUAGE sql STABLE AS $$
+    SELECT *
+    FROM clients
+    WHERE (mgr IS NULL OR manager_id = mgr)
+      AND (
+          name ILIKE '%' || replace(replace(replace(q, '\', '\\'), '%', '\%'), '_', '\_') || '%'
+          OR phone ILIKE '%' || replace(replace(replace(q, '\', '\\'), '%', '\%'), '_', '\_') || '%'
+          OR (regexp_replace(q, '\D', '', 'g') <> ''
+              AND phone_norm LIKE '%' || regexp_replace(q, '\D', '', 'g') || '%')
+      );
+$$;
+
+-- Row counts of the main tables in one round trip (admin database status)
+CREATE OR REPLACE FUNCTION get_table_counts()
+RETURNS JSONB
+LANGUAGE sql STABLE AS $$
+    SELECT jsonb_build_object(
+        'users', (SELECT COUNT(*) FROM users),
+        'clients', (SELECT COUNT(*) FROM clients),
+        'payments', (SELECT COUNT(*) FROM payments),
+        'reminders', (SELECT COUNT(*) FROM reminders),
+        'notes', (SELECT COUNT(*) FROM notes),
+        'statuses', (SELECT COUNT(*) FROM statuses),
+        'groups', (SELECT COUNT(*) FROM groups),
+        'tariffs', (SELECT COUNT(*) FROM tariffs)
+    );
+$$;
+
+-- Turn a user's due, un-notified reminders into notifications and mark them
+-- notified in one statement; returns how many reminders were processed
+CREATE OR REPLACE FUNCTION process_due_reminders(uid UUID)
+RETURNS INTEGER
+LANGUAGE sql AS $$
+    WITH due AS (
+        SELECT r.id, r.text, COALESCE(c.name, 'Unknown') AS client_name
+        FROM reminders r
+        LEFT JOIN clients c ON c.id = r.client_id
+        WHERE r.user_id = uid
+          AND r.remind_at < NOW()
+          AND r.is_completed = FALSE
+          AND r.notified = FALSE
+        FOR UPDATE OF r SKIP LOCKED
+    ), ins AS (
+        INSERT INTO notifications (user_id, type, title, message, entity_type, entity_id, is_read)
+        SELECT uid, 'reminder', 'Reminder Due',
+               'Reminder for ' || client_name || ': ' || text,
+               'reminder', id::text, FALSE
+        FROM due
+    ), upd AS (
+        UPDATE reminders SET notified = TRUE
+        WHERE id IN (SELECT id FROM due)
+        RETURNING 1
+    )
+    SELECT COUNT(*)::int FROM upd;
+$$;
+
+-- ============================================================
+-- TRIGGERS
+-- ============================================================
+-- Keep users.unread_notifications in step with notifications.is_read so the
+-- unread badge is a primary-key lookup instead of a COUNT(*) per request
+ALTER TABLE users ADD COLUMN IF NOT EXISTS unread_notifications INTEGER NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION sync_unread_notifications()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        IF OLD.is_read = FALSE THEN
+            UPDATE users SET unread_notifications = GREATEST(unread_notifications - 1, 0)
+            WHERE id = OLD.user_id;
+        END IF;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        IF NEW.is_read = FALSE THEN
+            UPDATE users SET unread_notifications = unread_notifications + 1
+            WHERE id = NEW.user_id;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_notifications_unread ON notifications;
+CREATE TRIGGER trg_notifications_unread
+AFTER INSERT OR UPDATE OF is_read, user_id OR DELETE ON notifications
+FOR EACH ROW EXECUTE FUNCTION sync_unread_notifications();
+
+-- Backfill counters for existing rows
+UPDATE users u SET unread_notifications = (
+    SELECT COUNT(*) FROM notifications n WHERE n.user_id = u.id AND n.is_read = FALSE
+);
 
 -- ============================================================
 -- ROW LEVEL SECURITY (Optional - Enable if needed)
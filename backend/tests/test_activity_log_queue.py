@@ -0,0 +1,118 @@
+"""
+Activity Log Queue Tests (database.run_log_flusher, server.log_activity)
+Tests for:
+- The flusher writes queued entries in batches of at most LOG_BATCH_SIZE
+- Everything queued before the None sentinel is written before it exits
+- stop_log_flusher during a write, with _log_queue already cleared, writes
+  everything still queued
+- database.flush_on_shutdown drains through the same path
+- log_activity writes directly when no flusher is running
+
+The database write (insert_activity_logs) is replaced by a recorder.
+"""
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+server = pytest.importorskip("server")
+import database  # noqa: E402
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """Batches passed to insert_activity_logs"""
+    batches = []
+    monkeypatch.setattr(server, "insert_activity_logs", lambda entries: batches.append(list(entries)))
+    monkeypatch.setattr(server, "_log_queue", None)
+    return batches
+
+
+class TestActivityLogFlusher:
+    """run_log_flusher(queue, write) / stop_log_flusher(queue, task, write)"""
+
+    def test_batches_and_drains_before_sentinel(self, written):
+        count = database.LOG_BATCH_SIZE * 2 + 5
+
+        async def run():
+            queue = asyncio.Queue()
+            for i in range(count):
+                queue.put_nowait({"id": i})
+            queue.put_nowait(None)
+            await asyncio.wait_for(database.run_log_flusher(queue, server.write_activity_logs), 5)
+
+        asyncio.run(run())
+        assert [entry["id"] for batch in written for entry in batch] == list(range(count))
+        assert all(len(batch) <= database.LOG_BATCH_SIZE for batch in written)
+
+    def test_shutdown_during_write(self, monkeypatch, written):
+        started = []
+
+        def slow_insert(entries):
+            started.append(len(entries))
+            time.sleep(0.05)
+            written.append(list(entries))
+
+        monkeypatch.setattr(server, "insert_activity_logs", slow_insert)
+
+        async def run():
+            queue = asyncio.Queue()
+            server._log_queue = queue
+            task = asyncio.create_task(database.run_log_flusher(queue, server.write_activity_logs))
+            queue.put_nowait({"id": 1})
+            while not started:
+                await asyncio.sleep(0.01)
+            # What the lifespan handler does on shutdown
+            server._log_queue = None
+            queue.put_nowait({"id": 2})
+            await asyncio.wait_for(database.stop_log_flusher(queue, task, server.write_activity_logs), 5)
+
+        asyncio.run(run())
+        assert written == [[{"id": 1}], [{"id": 2}]]
+
+
+    def test_database_flush_on_shutdown(self, monkeypatch):
+        batches = []
+
+        async def record(entries):
+            batches.append(list(entries))
+
+        monkeypatch.setattr(database.SupabaseDB, "create_activity_logs_bulk", record)
+
+        async def run():
+            queue = asyncio.Queue()
+            monkeypatch.setattr(database, "_log_queue", queue)
+            monkeypatch.setattr(database, "_log_flusher_task",
+                                asyncio.create_task(database.run_log_flusher(queue, record)))
+            await database.SupabaseDB.create_activity_log({"id": 1})
+            await database.flush_on_shutdown()
+
+        asyncio.run(run())
+        assert batches == [[{"id": 1}]]
+        assert database._log_queue is None and database._log_flusher_task is None
+
+
+class TestLogActivity:
+    """log_activity()"""
+
+    def test_queues_when_flusher_running(self, written):
+        async def run():
+            queue = asyncio.Queue()
+            server._log_queue = queue
+            await server.log_activity("u1", "Admin", "create", "client", "c1", {"name": "Ann"})
+            return queue.get_nowait()
+
+        entry = asyncio.run(run())
+        assert written == []
+        assert (entry["action"], entry["entity_type"], entry["details"]) == ("create", "client", {"name": "Ann"})
+
+    def test_direct_write_without_flusher(self, written):
+        asyncio.run(server.log_activity("u1", "Admin", "delete", "client", "c1"))
+        assert len(written) == 1
+        assert written[0][0]["action"] == "delete"
+        assert written[0][0]["details"] == {}
@@ -0,0 +1,123 @@
+"""
+Lookup Cache Tests (database.py)
+Tests for:
+- Concurrent cold calls share one query
+- Per-key fill locks are released once the fill completes (success or error)
+- _invalidate() evicts a table's entries, including sub-prefixes, and nothing else
+- Callers get copies, never the cached object itself
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    database._cache.clear()
+    database._cache_locks.clear()
+    yield
+    database._cache.clear()
+    database._cache_locks.clear()
+
+
+def counting_lookup(prefix, result=None):
+    """A cached lookup that records every call that reaches the 'database'"""
+    calls = []
+
+    @database._cached(prefix)
+    async def lookup(*args):
+        calls.append(args)
+        await asyncio.sleep(0.01)
+        return result if result is not None else {"args": list(args)}
+
+    return lookup, calls
+
+
+class TestCachedLookup:
+    """_cached decorator"""
+
+    def test_concurrent_cold_calls_query_once(self):
+        lookup, calls = counting_lookup("statuses")
+
+        async def run():
+            return await asyncio.gather(*(lookup() for _ in range(10)))
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert all(result == {"args": []} for result in results)
+        assert database._cache_locks == {}
+
+    def test_locks_do_not_accumulate(self):
+        lookup, calls = counting_lookup("statuses")
+
+        async def run():
+            for i in range(50):
+                await lookup(f"id-{i}")
+
+        asyncio.run(run())
+        assert len(calls) == 50
+        assert database._cache_locks == {}
+
+    def test_failed_fill_releases_lock_and_retries(self):
+        attempts = []
+
+        @database._cached("groups")
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("database unavailable")
+            return ["ok"]
+
+        with pytest.raises(RuntimeError):
+            asyncio.run(flaky())
+        assert database._cache_locks == {}
+        assert asyncio.run(flaky()) == ["ok"]
+        assert len(attempts) == 2
+
+    def test_returns_copies(self):
+        lookup, _ = counting_lookup("tariffs", result=[{"name": "Basic"}])
+        first = asyncio.run(lookup())
+        first[0]["name"] = "changed"
+        assert asyncio.run(lookup()) == [{"name": "Basic"}]
+
+
+class TestInvalidate:
+    """_invalidate() after writes"""
+
+    def test_invalidate_refetches(self):
+        lookup, calls = counting_lookup("statuses")
+        asyncio.run(lookup())
+        asyncio.run(lookup())
+        assert len(calls) == 1
+
+        database._invalidate("statuses")
+        asyncio.run(lookup())
+        assert len(calls) == 2
+
+    def test_invalidate_covers_sub_prefixes_only(self):
+        all_statuses, all_calls = counting_lookup("statuses")
+        by_name, name_calls = counting_lookup("statuses:name")
+        groups, group_calls = counting_lookup("groups")
+        statuses_like, like_calls = counting_lookup("statuses_archive")
+
+        async def fill():
+            await all_statuses()
+            await by_name("new")
+            await groups()
+            await statuses_like()
+
+        asyncio.run(fill())
+        database._invalidate("statuses")
+        asyncio.run(fill())
+
+        assert len(all_calls) == 2
+        assert len(name_calls) == 2
+        assert len(group_calls) == 1
+        assert len(like_calls) == 1
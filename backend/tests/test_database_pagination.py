@@ -0,0 +1,122 @@
+"""
+Keyset Pagination Helper Tests (database.py)
+Tests for keyset_paginate / page_cursor:
+- The query orders by (column, id), NULLs last, and seeks with an id tiebreak
+- Walking the cursors visits every row once, including rows tied on the
+  sort column across a page boundary and rows where the column is NULL
+- Malformed cursors raise ValueError
+
+The PostgREST parameters are evaluated in memory, so no server is needed.
+"""
+import os
+import sys
+import uuid
+from urllib.parse import parse_qsl
+
+import pytest
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import database  # noqa: E402
+from postgrest import AsyncPostgrestClient  # noqa: E402
+
+
+def params(column, limit, cursor=None, desc=True):
+    query = AsyncPostgrestClient("http://127.0.0.1:54321").from_("payments").select("*")
+    query = database.keyset_paginate(query, column, limit, cursor, desc)
+    return dict(parse_qsl(str(query.request.params)))
+
+
+def matches(row, condition):
+    """Evaluate one PostgREST condition ("col.op.value" or "and(...)")"""
+    if condition.startswith("and("):
+        return all(matches(row, part) for part in split(condition[4:-1]))
+    column, op, value = condition.split(".", 2)
+    if op == "is":
+        return row[column] is None
+    if row[column] is None:
+        return False
+    return {"lt": row[column] < value, "gt": row[column] > value, "eq": row[column] == value}[op]
+
+
+def split(conditions):
+    """Split a PostgREST condition list on top-level commas"""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(conditions):
+        depth += ch == "("
+        depth -= ch == ")"
+        if ch == "," and depth == 0:
+            parts.append(conditions[start:i])
+            start = i + 1
+    return parts + [conditions[start:]]
+
+
+def run(rows, query):
+    """The rows PostgREST would return for `query` (parsed parameters)"""
+    if "or" in query:
+        rows = [row for row in rows if any(matches(row, c) for c in split(query["or"][1:-1]))]
+    for column, condition in query.items():
+        if column in ("select", "order", "or", "limit"):
+            continue
+        rows = [row for row in rows if matches(row, f"{column}.{condition}")]
+    for key in reversed(query["order"].split(",")):
+        column, direction, *_ = key.split(".")
+        present = sorted((r for r in rows if r[column] is not None), key=lambda r: r[column],
+                         reverse=direction == "desc")
+        rows = present + [r for r in rows if r[column] is None]
+    return rows[:int(query["limit"])]
+
+
+def walk(rows, column, limit, desc=True):
+    seen, cursor = [], None
+    while True:
+        page = run(rows, params(column, limit, cursor, desc))
+        seen.extend(row["id"] for row in page)
+        if len(page) < limit:
+            return seen
+        cursor = database.page_cursor(page[-1], column)
+
+
+def make_rows(dates):
+    return [{"id": str(uuid.uuid4()), "payment_date": date} for date in dates]
+
+
+class TestKeysetPaginate:
+    """keyset_paginate(query, column, limit, cursor, desc)"""
+
+    def test_orders_by_column_then_id(self):
+        query = params("payment_date", 10)
+        assert query["order"] == "payment_date.desc.nullslast,id.desc"
+        assert query["limit"] == "10"
+
+    def test_seek_has_id_tiebreak(self):
+        last_id = str(uuid.uuid4())
+        query = params("created_at", 10, f"2024-01-01|{last_id}", desc=False)
+        assert query["or"] == (
+            f"(created_at.gt.2024-01-01,and(created_at.eq.2024-01-01,id.gt.{last_id}),created_at.is.null)"
+        )
+
+    @pytest.mark.parametrize("desc", [True, False])
+    def test_walk_over_ties_and_nulls(self, desc):
+        # Imported rows share one timestamp; pages of 3 split the ties
+        rows = make_rows(["2024-01-01"] * 7 + ["2024-02-01", "2023-12-01"] + [None] * 4)
+        seen = walk(rows, "payment_date", 3, desc)
+        assert sorted(seen) == sorted(row["id"] for row in rows)
+        assert len(seen) == len(set(seen))
+
+    @pytest.mark.parametrize("cursor", ["garbage", "2024-01-01|not-a-uuid", f"|{uuid.uuid4()}",
+                                        f"a,b|{uuid.uuid4()}"])
+    def test_invalid_cursor(self, cursor):
+        with pytest.raises(ValueError):
+            params("created_at", 10, cursor)
+
+
+class TestPageCursor:
+    """page_cursor(row, column)"""
+
+    def test_value_and_id(self):
+        assert database.page_cursor({"id": "abc", "created_at": "2024-01-01"}, "created_at") == "2024-01-01|abc"
+
+    def test_null_value(self):
+        assert database.page_cursor({"id": "abc", "remind_at": None}, "remind_at") == "null|abc"
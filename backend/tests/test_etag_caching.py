@@ -0,0 +1,91 @@
+"""
+ETag / Conditional GET Tests
+Tests for:
+- Polled GET endpoints return a weak ETag with Cache-Control: private, no-cache
+- If-None-Match with the current ETag returns a bodiless 304
+- The 304 keeps the CORS headers of the full response
+- A write changes the ETag of the affected list
+- Non-ETag endpoints keep no-store
+"""
+import pytest
+import requests
+import os
+from datetime import datetime
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+ORIGIN = "https://crm-frontend.example"
+
+
+@pytest.fixture(scope="module")
+def headers():
+    """Auth headers for the admin user"""
+    response = requests.post(f"{BASE_URL}/api/auth/login", json={
+        "email": "admin@crm.local",
+        "password": "admin123"
+    })
+    assert response.status_code == 200, f"Login failed: {response.text}"
+    return {"Authorization": f"Bearer {response.json()['token']}", "Origin": ORIGIN}
+
+
+class TestETag:
+    """Conditional GETs on polled endpoints"""
+
+    @pytest.mark.parametrize("path", [
+        "/api/statuses",
+        "/api/settings",
+        "/api/notifications",
+        "/api/notifications/unread-count",
+    ])
+    def test_etag_and_304(self, headers, path):
+        response = requests.get(f"{BASE_URL}{path}", headers=headers)
+        assert response.status_code == 200
+        etag = response.headers.get("ETag")
+        assert etag and etag.startswith('W/"')
+        assert response.headers.get("Cache-Control") == "private, no-cache"
+
+        cached = requests.get(f"{BASE_URL}{path}", headers={**headers, "If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.content == b""
+        assert cached.headers.get("ETag") == etag
+        assert "Access-Control-Allow-Origin" in cached.headers
+        assert "Content-Type" not in cached.headers
+
+    def test_etag_same_for_gzip_and_identity(self, headers):
+        gzipped = requests.get(f"{BASE_URL}/api/clients", headers={**headers, "Accept-Encoding": "gzip"})
+        identity = requests.get(f"{BASE_URL}/api/clients", headers={**headers, "Accept-Encoding": "identity"})
+        assert gzipped.status_code == identity.status_code == 200
+        assert gzipped.headers["ETag"] == identity.headers["ETag"]
+
+        # Either representation revalidates against the other's tag
+        cached = requests.get(f"{BASE_URL}/api/clients", headers={
+            **headers, "Accept-Encoding": "identity", "If-None-Match": gzipped.headers["ETag"]
+        })
+        assert cached.status_code == 304
+
+    def test_stale_etag_returns_body(self, headers):
+        response = requests.get(f"{BASE_URL}/api/statuses", headers={**headers, "If-None-Match": 'W/"stale"'})
+        assert response.status_code == 200
+        assert isinstance(response.json(), list)
+
+    def test_write_changes_etag(self, headers):
+        before = requests.get(f"{BASE_URL}/api/clients", headers=headers)
+        phone = f"+998{datetime.now().strftime('%H%M%S%f')[:9]}"
+        created = requests.post(f"{BASE_URL}/api/clients", headers=headers, json={
+            "name": "TEST_ETag Client", "phone": phone, "source": "Test", "status": "new"
+        })
+        assert created.status_code == 200
+        try:
+            after = requests.get(f"{BASE_URL}/api/clients", headers={
+                **headers, "If-None-Match": before.headers["ETag"]
+            })
+            assert after.status_code == 200
+            assert after.headers["ETag"] != before.headers["ETag"]
+        finally:
+            requests.delete(f"{BASE_URL}/api/clients/{created.json()['id']}", headers=headers)
+
+    def test_other_endpoints_not_cached(self, headers):
+        response = requests.get(f"{BASE_URL}/api/reminders", headers=headers)
+        assert response.status_code == 200
+        assert "ETag" not in response.headers
+        assert "no-store" in response.headers.get("Cache-Control", "")
@@ -0,0 +1,94 @@
+"""
+Activity Log COPY Tests (migrate_data_to_supabase.py)
+Tests for copy_activity_log:
+- None becomes NULL while empty strings stay empty strings
+- details is serialized into the COPY stream without mutating the rows
+- Rows already loaded (same mongo_id) are skipped
+
+Set TEST_DATABASE_URL to a disposable PostgreSQL database. The table is
+created inside a throwaway schema, which is dropped afterwards.
+"""
+import os
+import sys
+import uuid
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+migration = pytest.importorskip("migrate_data_to_supabase")
+
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+
+@pytest.fixture
+def cursor(monkeypatch):
+    """Cursor on a throwaway schema; copy_activity_log connects to the same one"""
+    schema = f"copy_test_{uuid.uuid4().hex[:8]}"
+    conn = psycopg2.connect(DATABASE_URL)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path TO {schema}, public")
+    cur.execute("""
+        CREATE TABLE activity_log (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            mongo_id VARCHAR(24) UNIQUE,
+            user_id VARCHAR(50),
+            user_name VARCHAR(255),
+            action VARCHAR(100) NOT NULL,
+            entity_type VARCHAR(100),
+            entity_id VARCHAR(50),
+            details JSONB DEFAULT '{}',
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        )
+    """)
+    connect = psycopg2.connect
+    monkeypatch.setattr(psycopg2, "connect",
+                        lambda **kwargs: connect(DATABASE_URL, options=f"-c search_path={schema}"))
+    yield cur
+    cur.execute(f"DROP SCHEMA {schema} CASCADE")
+    conn.close()
+
+
+def log_row(mongo_id, **fields):
+    row = {
+        "id": str(uuid.uuid4()), "mongo_id": mongo_id, "user_id": "u1", "user_name": "Admin",
+        "action": "create", "entity_type": "client", "entity_id": "c1",
+        "details": {"name": "Ann"}, "created_at": "2024-01-01T00:00:00+00:00",
+    }
+    return {**row, **fields}
+
+
+class TestCopyActivityLog:
+    """copy_activity_log(rows)"""
+
+    def test_empty_strings_and_nulls(self, cursor):
+        rows = [
+            log_row("a" * 24, user_name="", entity_id="", action=""),
+            log_row("b" * 24, user_name=None, entity_id=None, details=None),
+        ]
+        assert migration.copy_activity_log(rows) == 2
+        cursor.execute("SELECT mongo_id, user_name, entity_id, action, details FROM activity_log ORDER BY mongo_id")
+        assert cursor.fetchall() == [
+            ("a" * 24, "", "", "", {"name": "Ann"}),
+            ("b" * 24, None, None, "create", None),
+        ]
+
+    def test_rows_not_mutated(self, cursor):
+        row = log_row("c" * 24, details={"fields": ["name", "phone"]})
+        migration.copy_activity_log([row])
+        assert row["details"] == {"fields": ["name", "phone"]}
+        cursor.execute("SELECT details FROM activity_log")
+        assert cursor.fetchone()[0] == {"fields": ["name", "phone"]}
+
+    def test_existing_rows_skipped(self, cursor):
+        migration.copy_activity_log([log_row("d" * 24)])
+        assert migration.copy_activity_log([log_row("d" * 24), log_row("e" * 24)]) == 1
+        cursor.execute("SELECT COUNT(*) FROM activity_log")
+        assert cursor.fetchone()[0] == 2
@@ -0,0 +1,152 @@
+"""
+MongoDB -> PostgreSQL Migration Script Tests
+============================================
+Runs the migrate_* functions of migrate_to_supabase.py against a real
+PostgreSQL database, fed from in-memory backup documents.
+
+Set TEST_DATABASE_URL to a disposable database; every test works
+inside its own schema, which is dropped afterwards.
+"""
+
+import os
+import sys
+import uuid
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import migrate_to_supabase as migration  # noqa: E402
+
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+BACKUP = {
+    "users": [
+        {"_id": "u1", "name": "Admin", "email": "Admin@CRM.local", "password": "x",
+         "role": "admin", "created_at": "2024-01-02T10:00:00Z"},
+        {"_id": "u2", "name": "Manager", "email": "manager@crm.local", "password": "y"},
+    ],
+    "statuses": [
+        {"_id": "s1", "name": "new", "color": "#3B82F6", "order": 1, "is_default": True},
+    ],
+    "groups": [
+        {"_id": "g1", "name": "Morning"},
+    ],
+    "tariffs": [
+        {"_id": "t1", "name": "Basic", "price": 99.5, "currency": "USD"},
+    ],
+    "clients": [
+        {"_id": "c1", "name": "Client", "phone": "+998 90 123-45-67",
+         "manager_id": "u1", "tariff_id": "t1", "group_id": "g1"},
+    ],
+    "payments": [
+        {"_id": "p1", "client_id": "c1", "user_id": "u1", "amount": 50, "date": "2024-02-01T00:00:00Z"},
+    ],
+    "reminders": [
+        {"_id": "r1", "client_id": "c1", "user_id": "u1", "text": "Call", "remind_at": "2024-03-01T09:00:00Z"},
+    ],
+    "notes": [
+        {"_id": "n1", "client_id": "c1", "user_id": "u1", "text": "First note"},
+    ],
+    "settings": [
+        {"key": "system", "currency": "UZS", "exchange_rates": {"USD": 12800}},
+    ],
+    "activity_log": [
+        {"_id": "a1", "user_id": "u1", "action": "create", "details": {"amount": 50}},
+    ],
+    "audio_files": [],
+}
+
+
+@pytest.fixture
+def conn(monkeypatch):
+    """Connection whose search_path points at a throwaway schema"""
+    schema = f"migration_test_{uuid.uuid4().hex[:8]}"
+    connection = psycopg2.connect(DATABASE_URL)
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE SCHEMA {schema}")
+        cursor.execute(f"SET search_path TO {schema}, public")
+    connection.commit()
+    monkeypatch.setattr(migration, "iter_backup_data", lambda name: iter(BACKUP.get(name, [])))
+    monkeypatch.setattr(migration, "RESUME", False)
+    migration.create_schema(connection)
+    yield connection
+    connection.rollback()
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP SCHEMA {schema} CASCADE")
+    connection.commit()
+    connection.close()
+
+
+def run_all(conn, id_maps):
+    for level in migration.migration_levels():
+        for table in level:
+            migration.MIGRATIONS[table][0](conn, id_maps)
+    conn.commit()
+
+
+def fetch(conn, sql):
+    with conn.cursor() as cursor:
+        cursor.execute(sql)
+        return cursor.fetchall()
+
+
+class TestInsertArrays:
+    """unnest INSERT path (PREPARE + EXECUTE with typed arrays)"""
+
+    def test_migrate_settings_inserts_jsonb(self, conn):
+        migration.migrate_settings(conn, {})
+        conn.commit()
+        rows = fetch(conn, "SELECT key, currency, data FROM settings")
+        assert len(rows) == 1
+        key, currency, data = rows[0]
+        assert (key, currency) == ("system", "UZS")
+        assert data["exchange_rates"] == {"USD": 12800}
+
+    def test_migrate_settings_resume_upserts(self, conn, monkeypatch):
+        migration.migrate_settings(conn, {})
+        conn.commit()
+        monkeypatch.setattr(migration, "RESUME", True)
+        monkeypatch.setitem(BACKUP, "settings", [{"key": "system", "currency": "USD"}])
+        migration.migrate_settings(conn, {})
+        conn.commit()
+        assert fetch(conn, "SELECT key, currency FROM settings") == [("system", "USD")]
+
+    def test_all_null_columns(self, conn):
+        # A chunk whose column is all None still lands in the typed column
+        insert = migration.unnest_insert_sql("groups", (
+            ("id", "uuid"), ("name", "varchar"), ("created_at", "timestamptz")
+        ))
+        rows = [(uuid.uuid4(), "A", None), (uuid.uuid4(), "B", None)]
+        with conn.cursor() as cursor:
+            count = migration.insert_arrays(cursor, "groups", insert, rows, "")
+        assert count == 2
+        assert fetch(conn, "SELECT COUNT(*) FROM groups WHERE created_at IS NULL") == [(2,)]
+
+    def test_lookup_tables_keep_generated_ids(self, conn):
+        id_maps = {table: {} for table in migration.ID_MAP_TABLES}
+        migration.migrate_users(conn, id_maps)
+        migration.migrate_tariffs(conn, id_maps)
+        conn.commit()
+        users = dict(fetch(conn, "SELECT mongo_id, id FROM users"))
+        assert users == id_maps["users"]
+        assert fetch(conn, "SELECT email FROM users WHERE mongo_id = 'u1'") == [("Admin@CRM.local",)]
+        assert fetch(conn, "SELECT price::float FROM tariffs") == [(99.5,)]
+
+
+class TestFullMigration:
+    """Every registered table, then indexes and verification"""
+
+    def test_full_run(self, conn):
+        id_maps = {table: {} for table in migration.ID_MAP_TABLES}
+        run_all(conn, id_maps)
+        migration.create_indexes(conn)
+        counts = migration.verify_migration(conn)
+        for table in ("users", "statuses", "groups", "tariffs", "clients",
+                      "payments", "reminders", "notes", "settings", "activity_log"):
+            assert counts[table] == len(BACKUP[table]), table
+        client = fetch(conn, "SELECT manager_id, tariff_id, group_id FROM clients")[0]
+        assert client == (id_maps["users"]["u1"], id_maps["tariffs"]["t1"], id_maps["groups"]["g1"])
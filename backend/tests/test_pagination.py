@@ -0,0 +1,129 @@
+"""
+Keyset Pagination Tests
+Tests for:
+- List endpoints stay unpaginated (plain list, no cursor) without ?limit=
+- ?limit= returns at most that many rows and an X-Next-Cursor header
+- Walking the cursors visits every row exactly once, including rows that
+  tie on the sort timestamp (descending payments, ascending reminders)
+- Malformed cursors are rejected with 400
+- /api/activity-log clamps large limits instead of rejecting them
+"""
+import pytest
+import requests
+import os
+from datetime import datetime
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+# Far outside real data so the tied rows below are the only ones at these
+# instants; reminders are in the future so the scheduler never sends them
+PAYMENT_TIE_AT = "1990-01-01T00:00:00+00:00"
+REMINDER_TIE_AT = "2990-01-01T00:00:00+00:00"
+MAX_UUID = "ffffffff-ffff-ffff-ffff-ffffffffffff"
+MIN_UUID = "00000000-0000-0000-0000-000000000000"
+
+
+@pytest.fixture(scope="module")
+def headers():
+    """Auth headers for the admin user"""
+    response = requests.post(f"{BASE_URL}/api/auth/login", json={
+        "email": "admin@crm.local",
+        "password": "admin123"
+    })
+    assert response.status_code == 200, f"Login failed: {response.text}"
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+@pytest.fixture(scope="module")
+def client_id(headers):
+    """A throwaway client; its payments and reminders are removed with it"""
+    phone = f"+998{datetime.now().strftime('%H%M%S%f')[:9]}"
+    response = requests.post(f"{BASE_URL}/api/clients", headers=headers, json={
+        "name": "TEST_Pagination Client", "phone": phone, "source": "Test", "status": "new"
+    })
+    assert response.status_code == 200
+    client_id = response.json()["id"]
+    yield client_id
+    requests.delete(f"{BASE_URL}/api/clients/{client_id}", headers=headers)
+
+
+def walk(headers, path, column, tie_at, cursor, limit):
+    """Follow X-Next-Cursor from `cursor` while rows stay at `tie_at`"""
+    seen = []
+    while cursor:
+        response = requests.get(f"{BASE_URL}{path}", headers=headers, params={"limit": limit, "cursor": cursor})
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page) <= limit
+        tied = [row for row in page if row[column] and row[column].startswith(tie_at[:19])]
+        seen.extend(row["id"] for row in tied)
+        if len(tied) < len(page):
+            break
+        cursor = response.headers.get("X-Next-Cursor")
+    return seen
+
+
+class TestPagination:
+    """Keyset pagination on list endpoints"""
+
+    def test_unpaginated_by_default(self, headers):
+        response = requests.get(f"{BASE_URL}/api/payments", headers=headers)
+        assert response.status_code == 200
+        assert isinstance(response.json(), list)
+        assert "X-Next-Cursor" not in response.headers
+
+    def test_limit_and_cursor_header(self, headers):
+        response = requests.get(f"{BASE_URL}/api/activity-log", headers=headers, params={"limit": 1})
+        assert response.status_code == 200
+        assert len(response.json()) <= 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor:
+            value, _, last_id = cursor.rpartition("|")
+            assert last_id == response.json()[0]["id"]
+            assert value
+
+    def test_payment_pages_with_tied_dates(self, headers, client_id):
+        created = []
+        for amount in range(1, 6):
+            response = requests.post(f"{BASE_URL}/api/payments", headers=headers, json={
+                "client_id": client_id, "amount": amount, "date": PAYMENT_TIE_AT
+            })
+            assert response.status_code == 200
+            created.append(response.json()["id"])
+
+        # Start just after the tie (descending), so the walk begins at the tied rows
+        seen = walk(headers, "/api/payments", "payment_date", PAYMENT_TIE_AT,
+                    f"1990-01-01T00:00:01+00:00|{MAX_UUID}", 2)
+        assert sorted(seen) == sorted(created)
+        assert len(seen) == len(set(seen))
+        # Ties are broken by id, in the same direction as the date
+        assert seen == sorted(seen, reverse=True)
+
+    def test_reminder_pages_with_tied_times(self, headers, client_id):
+        created = []
+        for i in range(5):
+            response = requests.post(f"{BASE_URL}/api/reminders", headers=headers, json={
+                "client_id": client_id, "text": f"TEST_Pagination {i}", "remind_at": REMINDER_TIE_AT
+            })
+            assert response.status_code == 200
+            created.append(response.json()["id"])
+
+        # Reminders page ascending: start just before the tie
+        seen = walk(headers, "/api/reminders", "remind_at", REMINDER_TIE_AT,
+                    f"2989-12-31T23:59:59+00:00|{MIN_UUID}", 2)
+        assert sorted(seen) == sorted(created)
+        assert seen == sorted(seen)
+
+    @pytest.mark.parametrize("cursor", ["garbage", "2024-01-01|not-a-uuid", f"|{MIN_UUID}", f"a,b|{MIN_UUID}"])
+    def test_invalid_cursor(self, headers, cursor):
+        response = requests.get(f"{BASE_URL}/api/payments", headers=headers, params={"limit": 10, "cursor": cursor})
+        assert response.status_code == 400
+
+    def test_page_size_capped(self, headers):
+        response = requests.get(f"{BASE_URL}/api/payments", headers=headers, params={"limit": 201})
+        assert response.status_code == 422
+
+    def test_activity_log_large_limit_clamped(self, headers):
+        response = requests.get(f"{BASE_URL}/api/activity-log", headers=headers, params={"limit": 500})
+        assert response.status_code == 200
+        assert len(response.json()) <= 200
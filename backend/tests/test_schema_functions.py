@@ -0,0 +1,139 @@
+"""
+Schema Function Tests (supabase_schema.sql)
+Tests for the functions the API calls through supabase.rpc:
+- process_due_reminders: due reminders become notifications in one call
+- search_clients: name/phone search, formatting-insensitive phone digits
+
+Set TEST_DATABASE_URL to a disposable PostgreSQL database (pg_trgm and
+uuid-ossp available). The schema is applied inside a throwaway schema,
+which is dropped afterwards.
+"""
+
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+from psycopg2.extras import register_uuid  # noqa: E402
+
+DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+SCHEMA_SQL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "supabase_schema.sql")
+
+pytestmark = pytest.mark.skipif(not DATABASE_URL, reason="TEST_DATABASE_URL not set")
+
+register_uuid()
+
+
+@pytest.fixture
+def cursor():
+    """Cursor on a fresh copy of the schema"""
+    schema = f"schema_test_{uuid.uuid4().hex[:8]}"
+    conn = psycopg2.connect(DATABASE_URL)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(f"CREATE SCHEMA {schema}")
+    cur.execute(f"SET search_path TO {schema}, public")
+    with open(SCHEMA_SQL) as f:
+        cur.execute(f.read())
+    yield cur
+    cur.execute(f"DROP SCHEMA {schema} CASCADE")
+    conn.close()
+
+
+def add_user(cur, name="Manager"):
+    user_id = uuid.uuid4()
+    cur.execute("INSERT INTO users (id, name, email, password) VALUES (%s, %s, %s, 'x')",
+                (user_id, name, f"{user_id}@crm.local"))
+    return user_id
+
+
+def add_client(cur, name, phone, manager_id=None):
+    client_id = uuid.uuid4()
+    cur.execute("INSERT INTO clients (id, name, phone, manager_id) VALUES (%s, %s, %s, %s)",
+                (client_id, name, phone, manager_id))
+    return client_id
+
+
+def add_reminder(cur, client_id, user_id, text, remind_at, **flags):
+    reminder_id = uuid.uuid4()
+    cur.execute(
+        "INSERT INTO reminders (id, client_id, user_id, text, remind_at, is_completed, notified)"
+        " VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        (reminder_id, client_id, user_id, text, remind_at,
+         flags.get("is_completed", False), flags.get("notified", False)),
+    )
+    return reminder_id
+
+
+class TestProcessDueReminders:
+    """process_due_reminders(uid)"""
+
+    def test_only_due_open_unnotified_reminders_of_the_user(self, cursor):
+        now = datetime.now(timezone.utc)
+        past, future = now - timedelta(hours=1), now + timedelta(hours=1)
+        user, other = add_user(cursor), add_user(cursor, "Other")
+        client = add_client(cursor, "Ann", "+998901234567", user)
+
+        due = add_reminder(cursor, client, user, "Call back", past)
+        add_reminder(cursor, client, user, "Later", future)
+        add_reminder(cursor, client, user, "Done", past, is_completed=True)
+        add_reminder(cursor, client, user, "Seen", past, notified=True)
+        other_due = add_reminder(cursor, client, other, "Not mine", past)
+
+        cursor.execute("SELECT process_due_reminders(%s)", (user,))
+        assert cursor.fetchone()[0] == 1
+
+        cursor.execute("SELECT type, title, message, entity_type, entity_id, is_read FROM notifications WHERE user_id = %s", (user,))
+        assert cursor.fetchall() == [
+            ("reminder", "Reminder Due", "Reminder for Ann: Call back", "reminder", str(due), False)
+        ]
+        cursor.execute("SELECT id FROM reminders WHERE notified ORDER BY text")
+        notified = {row[0] for row in cursor.fetchall()}
+        assert due in notified and other_due not in notified
+
+        # The unread counter trigger sees the inserted notification
+        cursor.execute("SELECT unread_notifications FROM users WHERE id = %s", (user,))
+        assert cursor.fetchone()[0] == 1
+
+    def test_second_call_is_a_no_op(self, cursor):
+        user = add_user(cursor)
+        client = add_client(cursor, "Bob", "+998901111111", user)
+        for i in range(3):
+            add_reminder(cursor, client, user, f"R{i}", datetime.now(timezone.utc) - timedelta(minutes=i + 1))
+
+        cursor.execute("SELECT process_due_reminders(%s)", (user,))
+        assert cursor.fetchone()[0] == 3
+        cursor.execute("SELECT process_due_reminders(%s)", (user,))
+        assert cursor.fetchone()[0] == 0
+        cursor.execute("SELECT COUNT(*) FROM notifications")
+        assert cursor.fetchone()[0] == 3
+
+
+class TestSearchClients:
+    """search_clients(q, mgr) and clients.phone_norm"""
+
+    def test_phone_norm_is_digits_only(self, cursor):
+        add_client(cursor, "Ann", "+998 (90) 123-45-67")
+        cursor.execute("SELECT phone_norm FROM clients")
+        assert cursor.fetchone()[0] == "998901234567"
+
+    def test_phone_digits_match_any_formatting(self, cursor):
+        ann = add_client(cursor, "Ann", "+998 (90) 123-45-67")
+        add_client(cursor, "Bob", "+998 91 765 43 21")
+        cursor.execute("SELECT id FROM search_clients(%s)", ("90 1234",))
+        assert [row[0] for row in cursor.fetchall()] == [ann]
+
+    def test_name_search_is_case_insensitive_and_literal(self, cursor):
+        ann = add_client(cursor, "Ann 100%", "+998901234567")
+        add_client(cursor, "Annette", "+998907654321")
+        cursor.execute("SELECT id FROM search_clients(%s)", ("ANN 100%",))
+        assert [row[0] for row in cursor.fetchall()] == [ann]
+
+    def test_manager_scope(self, cursor):
+        mine, theirs = add_user(cursor), add_user(cursor, "Other")
+        ann = add_client(cursor, "Ann", "+998901234567", mine)
+        add_client(cursor, "Ann", "+998901234568", theirs)
+        cursor.execute("SELECT id FROM search_clients(%s, %s)", ("Ann", mine))
+        assert [row[0] for row in cursor.fetchall()] == [ann]
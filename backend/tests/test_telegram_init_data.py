@@ -0,0 +1,87 @@
+"""
+Telegram WebApp initData Validation Tests (server.py)
+Tests for validate_telegram_init_data:
+- Correctly signed, fresh initData returns the Telegram user
+- Stale auth_date is rejected before the hash is checked
+- Missing/invalid auth_date, missing hash and a wrong hash are rejected
+"""
+import hashlib
+import hmac
+import json
+import os
+import sys
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+server = pytest.importorskip("server")
+
+BOT_TOKEN = "123456:TEST-token"
+USER = {"id": 42, "first_name": "Ann", "username": "ann"}
+
+
+def sign(fields: dict, bot_token: str = BOT_TOKEN) -> str:
+    """initData query string with the hash Telegram would compute"""
+    data_check_string = "\n".join(f"{k}={v}" for k, v in sorted(fields.items()))
+    secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    signature = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode({**fields, "hash": signature})
+
+
+def fields(auth_date=None):
+    return {
+        "auth_date": str(int(time.time()) if auth_date is None else auth_date),
+        "query_id": "AAF",
+        "user": json.dumps(USER, separators=(",", ":")),
+    }
+
+
+class TestValidateTelegramInitData:
+    """validate_telegram_init_data(init_data, bot_token)"""
+
+    def test_valid(self):
+        assert server.validate_telegram_init_data(sign(fields()), BOT_TOKEN) == USER
+
+    def test_expired(self):
+        init_data = sign(fields(auth_date=int(time.time()) - 86400 - 60))
+        with pytest.raises(ValueError, match="expired"):
+            server.validate_telegram_init_data(init_data, BOT_TOKEN)
+
+    def test_expired_checked_before_hash(self, monkeypatch):
+        # A stale payload is rejected without computing any HMAC
+        monkeypatch.setattr(server.hmac, "new", lambda *args, **kwargs: pytest.fail("HMAC computed"))
+        init_data = urlencode({**fields(auth_date=1), "hash": "0" * 64})
+        with pytest.raises(ValueError, match="expired"):
+            server.validate_telegram_init_data(init_data, BOT_TOKEN)
+
+    @pytest.mark.parametrize("auth_date", ["", "yesterday"])
+    def test_invalid_auth_date(self, auth_date):
+        init_data = sign({**fields(), "auth_date": auth_date})
+        with pytest.raises(ValueError):
+            server.validate_telegram_init_data(init_data, BOT_TOKEN)
+
+    def test_missing_auth_date(self):
+        init_data = sign({k: v for k, v in fields().items() if k != "auth_date"})
+        with pytest.raises(ValueError, match="expired"):
+            server.validate_telegram_init_data(init_data, BOT_TOKEN)
+
+    def test_missing_hash(self):
+        with pytest.raises(ValueError, match="Hash not found"):
+            server.validate_telegram_init_data(urlencode(fields()), BOT_TOKEN)
+
+    def test_wrong_bot_token(self):
+        with pytest.raises(ValueError, match="Invalid hash"):
+            server.validate_telegram_init_data(sign(fields(), "999:OTHER"), BOT_TOKEN)
+
+    def test_tampered_user(self):
+        init_data = sign(fields()).replace("ann", "bob")
+        with pytest.raises(ValueError, match="Invalid hash"):
+            server.validate_telegram_init_data(init_data, BOT_TOKEN)
+
+    def test_no_bot_token(self):
+        with pytest.raises(ValueError, match="not configured"):
+            server.validate_telegram_init_data(sign(fields()), "")